@@ -0,0 +1,42 @@
+"""
+Per-reply overhead of static keyboards.
+
+Compares building the reply markup on every call (the old behaviour) with
+returning the prebuilt instance.
+
+    python -m benchmarks.bench_keyboards
+"""
+import timeit
+
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+
+from bot.adapters.keyboards import get_table_menu_keyboard
+
+
+ROUNDS = 20_000
+
+
+def build_table_menu_keyboard():
+    keyboard = [
+        [KeyboardButton(text="➕ Добавить расход")],
+        [KeyboardButton(text="💰 Посмотреть баланс"), KeyboardButton(text="👥 Участники")],
+        [KeyboardButton(text="💳 Посчитать долги"), KeyboardButton(text="📊 Статистика")],
+        [KeyboardButton(text="💸 Погасить долг"), KeyboardButton(text="📋 История операций")],
+        [KeyboardButton(text="🚪 Покинуть стол")],
+        [KeyboardButton(text="🏠 Главное меню")],
+    ]
+    return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
+
+
+def per_call_us(stmt) -> float:
+    return timeit.timeit(stmt, number=ROUNDS) / ROUNDS * 1e6
+
+
+def main():
+    before = per_call_us(build_table_menu_keyboard)
+    after = per_call_us(get_table_menu_keyboard)
+    print(f"table menu markup: built per reply {before:.2f} us, prebuilt {after:.3f} us")
+
+
+if __name__ == "__main__":
+    main()
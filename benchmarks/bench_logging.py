@@ -0,0 +1,90 @@
+"""
+DAO call overhead of logging.
+
+Runs UserDao.find_one_or_none_by_id against a session stub that returns
+a row immediately, so the database does not drown the difference, with
+logging off, with a synchronous file sink that writes every DAO message
+(the old setup), with the queued, rate-limited pipeline, and with the
+pipeline and ``LOG_LEVELS={"bot.dao": "WARNING"}``.
+
+    python -m benchmarks.bench_logging
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+from loguru import logger
+from bot.config import settings
+from bot.dao.dao import UserDao
+from bot.dao.models import User
+from bot.infrastructure.logging_setup import ModuleLevelFilter, dao_logger
+
+
+CALLS = 5_000
+REPEATS = 7
+
+
+class StubResult:
+    def __init__(self, row):
+        self.row = row
+
+    def scalar_one_or_none(self):
+        return self.row
+
+
+class StubSession:
+    def __init__(self):
+        self.result = StubResult(User(id=1, telegram_id=1, first_name="Bench"))
+
+    async def execute(self, query):
+        return self.result
+
+
+async def dao_calls() -> float:
+    session = StubSession()
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        for _ in range(CALLS):
+            await UserDao.find_one_or_none_by_id(1, session)
+        best = min(best, time.perf_counter() - started)
+    await logger.complete()
+    return best / CALLS * 1e6
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        log_path = os.path.join(directory, "log.txt")
+
+        logger.remove()
+        dao_logger.configure(0, 0)
+        asyncio.run(dao_calls())
+        off = asyncio.run(dao_calls())
+
+        logger.add(log_path, format=settings.FORMAT_LOG, level="INFO", rotation=settings.LOG_ROTATION)
+        sync = asyncio.run(dao_calls())
+
+        logger.remove()
+        dao_logger.configure(10, 20)
+        logger.add(log_path, format=settings.FORMAT_LOG, level="INFO", rotation=settings.LOG_ROTATION,
+                   enqueue=True, filter=ModuleLevelFilter("INFO"))
+        pipeline = asyncio.run(dao_calls())
+
+        logger.remove()
+        dao_filter = ModuleLevelFilter("INFO", {"bot.dao": "WARNING"})
+        logger.add(log_path, format=settings.FORMAT_LOG, level=dao_filter.min_level,
+                   rotation=settings.LOG_ROTATION, enqueue=True, filter=dao_filter)
+        silenced = asyncio.run(dao_calls())
+
+        logger.remove()
+
+    print(f"UserDao.find_one_or_none_by_id, best of {REPEATS} x {CALLS} calls")
+    print(f"  logging off:                   {off:.1f} us per call")
+    print(f"  sync file sink, every message: {sync:.1f} us per call (+{sync - off:.1f})")
+    print(f"  queued, 10 msg/s per template: {pipeline:.1f} us per call (+{pipeline - off:.1f})")
+    print(f"  queued, bot.dao at WARNING:    {silenced:.1f} us per call (+{silenced - off:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Dispatch cost per update as the number of reply-keyboard commands grows.
+
+Feeds a message through a real Dispatcher where the commands are either
+registered as ``F.text == ...`` filters spread over three routers (the old
+layout) or as one TextCommandRouter. The worst case is measured: the text
+of the last registered button.
+
+    python -m benchmarks.bench_text_commands
+"""
+import asyncio
+import time
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import Chat, Message, Update, User
+
+from bot.adapters.text_commands import TextCommandRouter
+
+
+COMMAND_COUNTS = (5, 15, 50, 150)
+UPDATES = 2_000
+
+
+async def noop(message: Message):
+    return None
+
+
+def filter_dispatcher(texts) -> Dispatcher:
+    dp = Dispatcher()
+    routers = [Router(), Router(), Router()]
+    for i, text in enumerate(texts):
+        routers[i * len(routers) // len(texts)].message.register(noop, F.text == text)
+    for router in routers:
+        dp.include_router(router)
+    return dp
+
+
+def text_command_dispatcher(texts) -> Dispatcher:
+    dp = Dispatcher()
+    commands = TextCommandRouter()
+    for text in texts:
+        commands.command(text)(noop)
+    dp.include_router(commands)
+    return dp
+
+
+def make_update(text: str) -> Update:
+    return Update(
+        update_id=1,
+        message=Message(
+            message_id=1,
+            date=datetime.now(),
+            chat=Chat(id=1, type="private"),
+            from_user=User(id=1, is_bot=False, first_name="Bench"),
+            text=text,
+        ),
+    )
+
+
+async def per_update_us(dp: Dispatcher, bot: Bot, update: Update) -> float:
+    for _ in range(100):
+        await dp.feed_update(bot, update)
+    started = time.perf_counter()
+    for _ in range(UPDATES):
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / UPDATES * 1e6
+
+
+async def main():
+    bot = Bot(token="42:BENCH")
+    print(f"{'commands':>8} {'F.text filters, us':>20} {'dict lookup, us':>16}")
+    for count in COMMAND_COUNTS:
+        texts = [f"Кнопка {i}" for i in range(count)]
+        update = make_update(texts[-1])
+        filters = await per_update_us(filter_dispatcher(texts), bot, update)
+        lookup = await per_update_us(text_command_dispatcher(texts), bot, update)
+        print(f"{count:>8} {filters:>20.1f} {lookup:>16.1f}")
+    await bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+Per-span overhead of tracing.
+
+Times a traced use-case-style coroutine with tracing off, with the update
+not sampled, and with the update sampled and exported to a JSON file, so
+the sampling rate can be chosen from the cost of a span.
+
+    python -m benchmarks.bench_tracing
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+from bot.infrastructure.tracing import JsonFileExporter, trace_methods, tracer
+
+
+SPANS_PER_UPDATE = 10
+UPDATES = 5_000
+
+
+class Plain:
+    async def call(self) -> int:
+        return 1
+
+
+@trace_methods
+class Traced:
+    async def call(self) -> int:
+        return 1
+
+
+async def run_updates(use_case) -> float:
+    started = time.perf_counter()
+    for _ in range(UPDATES):
+        with tracer.start_trace("update"):
+            for _ in range(SPANS_PER_UPDATE):
+                await use_case.call()
+    return time.perf_counter() - started
+
+
+def per_span_us(elapsed: float, baseline: float) -> float:
+    return (elapsed - baseline) / (UPDATES * SPANS_PER_UPDATE) * 1e6
+
+
+def main():
+    tracer.configure(0.0, None)
+    baseline = asyncio.run(run_updates(Plain()))
+    unsampled = asyncio.run(run_updates(Traced()))
+
+    with tempfile.TemporaryDirectory() as directory:
+        exporter = JsonFileExporter(os.path.join(directory, "traces.jsonl"))
+        tracer.configure(1.0, exporter)
+        sampled = asyncio.run(run_updates(Traced()))
+        exporter.close()
+    tracer.configure(0.0, None)
+
+    print(f"{SPANS_PER_UPDATE} spans x {UPDATES} updates")
+    print(f"  not sampled: {per_span_us(unsampled, baseline):.3f} us per span")
+    print(f"  sampled + exported: {per_span_us(sampled, baseline):.2f} us per span (incl. root span)")
+    for rate in (0.01, 0.1):
+        cost = per_span_us(unsampled, baseline) * (1 - rate) + per_span_us(sampled, baseline) * rate
+        print(f"  sample rate {rate:.0%}: {cost:.3f} us per span on average")
+
+
+if __name__ == "__main__":
+    main()
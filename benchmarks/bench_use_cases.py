@@ -0,0 +1,209 @@
+"""
+Use-case latency, query counts and peak memory on synthetic tables.
+
+Every scenario is generated into a fresh SQLite file (see datagen.py), and
+each operation runs in its own session, the way a handler calls it.
+Results are written as JSON; with ``--baseline`` they are compared to an
+earlier run and the exit code is 1 if anything regressed.
+
+    python -m benchmarks.bench_use_cases --profile default --output bench.json
+    python -m benchmarks.bench_use_cases --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from benchmarks.datagen import Dataset, Scenario, generate
+from bot.dao.database import enable_savepoints
+from bot.infrastructure import query_tracking
+from bot.infrastructure.query_tracking import QueryCounter
+from bot.use_cases.expense_use_cases import ExpenseUseCase
+from bot.use_cases.table_use_cases import TableUseCase
+
+
+PROFILES: Dict[str, Tuple[Scenario, ...]] = {
+    "smoke": (
+        Scenario(2, 10, "equal"),
+        Scenario(10, 100, "uniform"),
+    ),
+    "default": (
+        Scenario(2, 10, "equal"),
+        Scenario(10, 1_000, "uniform"),
+        Scenario(50, 10_000, "skewed"),
+        Scenario(50, 10_000, "skewed", repayments=10_000),
+        Scenario(200, 10_000, "uniform"),
+    ),
+    "large": (
+        Scenario(2, 10, "equal"),
+        Scenario(50, 10_000, "skewed"),
+        Scenario(1_000, 10_000, "uniform"),
+        Scenario(1_000, 100_000, "skewed"),
+        Scenario(1_000, 100_000, "skewed", repayments=100_000),
+    ),
+}
+
+Operation = Callable[[AsyncSession, Dataset], Awaitable[Any]]
+
+OPERATIONS: Dict[str, Operation] = {
+    "calculate_debts": lambda s, d: ExpenseUseCase(s).calculate_debts(d.table_id),
+    "get_user_balance": lambda s, d: ExpenseUseCase(s).get_user_balance(d.table_id, d.user_ids[0]),
+    "get_table_operations[page=20]": lambda s, d: ExpenseUseCase(s).get_table_operations(d.table_id, limit=20),
+    "get_table_operations[all]": lambda s, d: ExpenseUseCase(s).get_table_operations(d.table_id),
+    "add_repayment": lambda s, d: ExpenseUseCase(s).add_repayment(d.table_id, d.user_ids[1], d.user_ids[0], 500),
+    "add_expense": lambda s, d: ExpenseUseCase(s).add_expense(
+        d.table_id, "Бенчмарк", 3_000, d.user_ids[:3], created_by_id=d.user_ids[0]
+    ),
+    "get_user_tables": lambda s, d: TableUseCase(s).get_user_tables(d.user_ids[0]),
+    "get_user_tables_balances": lambda s, d: TableUseCase(s).get_user_tables_balances(d.user_ids[0]),
+}
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def _measure(session_maker, dataset: Dataset, operation: Operation, repeats: int) -> Dict[str, Any]:
+    # Прогрев: кэш компиляции SQLAlchemy и страницы SQLite
+    async with session_maker() as session:
+        with QueryCounter() as queries:
+            await operation(session, dataset)
+
+    timings = []
+    for _ in range(repeats):
+        async with session_maker() as session:
+            started = time.perf_counter()
+            await operation(session, dataset)
+            timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    try:
+        async with session_maker() as session:
+            await operation(session, dataset)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "latency_ms": {
+            "median": round(statistics.median(timings), 3),
+            "p95": round(_percentile(timings, 0.95), 3),
+            "min": round(min(timings), 3),
+        },
+        "queries": queries.count,
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+async def run(scenarios: Tuple[Scenario, ...], repeats: int, seed: int) -> List[Dict[str, Any]]:
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for scenario in scenarios:
+            engine = enable_savepoints(
+                create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, scenario.name)}.sqlite3")
+            )
+            query_tracking.install(engine)
+            started = time.perf_counter()
+            dataset = await generate(engine, scenario, seed=seed)
+            print(f"{scenario.name}: generated in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+
+            session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            for name, operation in OPERATIONS.items():
+                measured = await _measure(session_maker, dataset, operation, repeats)
+                results.append({
+                    "scenario": scenario.name,
+                    "members": scenario.members,
+                    "items": scenario.items,
+                    "distribution": scenario.distribution,
+                    "operation": name,
+                    **measured,
+                })
+                print(
+                    f"  {name:<30} {measured['latency_ms']['median']:>10.2f} ms"
+                    f" {measured['queries']:>4} queries {measured['peak_memory_kb']:>10.1f} KiB",
+                    file=sys.stderr
+                )
+            await engine.dispose()
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions against the baseline: slower median beyond tolerance, or more queries."""
+    previous = {(r["scenario"], r["operation"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["scenario"], result["operation"]))
+        if before is None:
+            continue
+        key = f"{result['scenario']} {result['operation']}"
+        old_ms, new_ms = before["latency_ms"]["median"], result["latency_ms"]["median"]
+        ratio = new_ms / old_ms if old_ms else 1.0
+        print(f"  {key:<50} {old_ms:>10.2f} -> {new_ms:>10.2f} ms ({ratio:.2f}x)"
+              f"  queries {before['queries']} -> {result['queries']}")
+        if ratio > 1 + tolerance:
+            regressions.append(f"{key}: median {old_ms:.2f} -> {new_ms:.2f} ms")
+        if result["queries"] > before["queries"]:
+            regressions.append(f"{key}: queries {before['queries']} -> {result['queries']}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="default")
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare with results saved by an earlier --output")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown of the median before it counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(PROFILES[args.profile], args.repeats, args.seed))
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "profile": args.profile,
+            "repeats": args.repeats,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.baseline} ({baseline['meta']['created_at']}):")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
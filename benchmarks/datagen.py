@@ -0,0 +1,128 @@
+"""
+Synthetic tables for benchmarks.
+
+Builds one dining table with ``members`` users and ``items`` expenses,
+each shared by a random group of members with ratios drawn from a named
+distribution, ``repayments`` debt repayments between random members, plus
+extra tables the first member belongs to. Every table gets a ledger
+snapshot of its final balances. Rows are
+bulk-inserted with explicit ids, so a 100,000-item table takes seconds.
+"""
+import random
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from bot.dao.database import Base
+from bot.dao.models import User, DiningTable, TableUser, Item, TableItem, Transaction, UserItemConsumption
+from bot.use_cases.ledger_use_cases import LedgerUseCase
+
+
+CHUNK = 5_000
+
+RATIO_DISTRIBUTIONS: Dict[str, Callable[[random.Random], float]] = {
+    "equal": lambda rng: 1.0,
+    "uniform": lambda rng: rng.choice((0.5, 1.0, 1.5, 2.0, 2.5, 3.0)),
+    "skewed": lambda rng: round(min(rng.paretovariate(1.5), 10.0), 2),
+}
+
+
+@dataclass(frozen=True)
+class Scenario:
+    members: int
+    items: int
+    distribution: str = "uniform"
+    max_participants: int = 8
+    income_share: float = 0.2
+    tables_per_user: int = 20
+    repayments: int = 0
+
+    @property
+    def name(self) -> str:
+        name = f"m{self.members}_i{self.items}_{self.distribution}"
+        return f"{name}_r{self.repayments}" if self.repayments else name
+
+
+@dataclass(frozen=True)
+class Dataset:
+    scenario: Scenario
+    table_id: int
+    user_ids: List[int]
+
+
+async def _insert(conn, model, rows: List[dict]) -> None:
+    for start in range(0, len(rows), CHUNK):
+        await conn.execute(insert(model), rows[start:start + CHUNK])
+
+
+async def generate(engine: AsyncEngine, scenario: Scenario, seed: int = 0) -> Dataset:
+    if scenario.members < 2:
+        raise ValueError("A table needs at least two members")
+    rng = random.Random(seed)
+    ratio = RATIO_DISTRIBUTIONS[scenario.distribution]
+
+    user_ids = list(range(1, scenario.members + 1))
+    table_id = 1
+    extra_tables = range(table_id + 1, table_id + 1 + scenario.tables_per_user)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+        await _insert(conn, User, [
+            {"id": user_id, "telegram_id": 10_000 + user_id, "first_name": f"User {user_id}"}
+            for user_id in user_ids
+        ])
+        await _insert(conn, DiningTable, [
+            {"id": tid, "name": f"Table {tid}", "invite_code": f"BENCH{tid:04d}"}
+            for tid in (table_id, *extra_tables)
+        ])
+        await _insert(conn, TableUser, [
+            {"table_id": table_id, "user_id": user_id, "agree_to_close": False} for user_id in user_ids
+        ] + [
+            {"table_id": tid, "user_id": user_ids[0], "agree_to_close": False} for tid in extra_tables
+        ])
+
+        items, table_items, consumptions = [], [], []
+        for item_id in range(1, scenario.items + 1):
+            group_size = rng.randint(2, min(scenario.members, scenario.max_participants))
+            group = rng.sample(user_ids, group_size)
+            is_income = rng.random() < scenario.income_share
+            items.append({
+                "id": item_id,
+                "name": f"Item {item_id}",
+                "price": rng.randint(100, 10_000),
+                "is_income": is_income,
+                "created_by_id": group[0],
+            })
+            table_items.append({"table_id": table_id, "item_id": item_id})
+            consumptions.extend(
+                {"user_id": user_id, "item_id": item_id, "ratio": ratio(rng)} for user_id in group
+            )
+
+        await _insert(conn, Item, items)
+        await _insert(conn, TableItem, table_items)
+        await _insert(conn, UserItemConsumption, consumptions)
+
+        transactions = []
+        for transaction_id in range(1, scenario.repayments + 1):
+            user_from, user_to = rng.sample(user_ids, 2)
+            transactions.append({
+                "id": transaction_id,
+                "table_id": table_id,
+                "user_id_from": user_from,
+                "user_id_to": user_to,
+                "amount": rng.randint(100, 5_000),
+            })
+        await _insert(conn, Transaction, transactions)
+
+    # Данные вставлены мимо журнала: снимок даёт чтению балансов ту же
+    # отправную точку, что у стола, живущего с журналом
+    async with AsyncSession(engine) as session:
+        for tid in (table_id, *extra_tables):
+            await LedgerUseCase(session).take_snapshot(tid)
+        await session.commit()
+
+    return Dataset(scenario=scenario, table_id=table_id, user_ids=user_ids)
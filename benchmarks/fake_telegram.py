@@ -0,0 +1,86 @@
+"""
+Local stand-in for the Bot API.
+
+Every method is answered in-process (optionally after a fixed delay to
+model network latency) and recorded, so the bot can be driven end to end
+without Telegram.
+"""
+import asyncio
+import itertools
+from collections import Counter
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict, List, Optional, get_args
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods.base import TelegramMethod
+from aiogram.types import Chat, InlineKeyboardMarkup, Message, User
+
+
+BOT_USERNAME = "bill_separator_bench_bot"
+
+
+class FakeTelegramSession(BaseSession):
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: List[TelegramMethod] = []
+        self.sent: Dict[int, List[Message]] = {}
+        self._message_ids = itertools.count(1_000_000)
+
+    @property
+    def call_counts(self) -> Counter:
+        return Counter(call.__api_method__ for call in self.calls)
+
+    def last_message(self, chat_id: int) -> Optional[Message]:
+        messages = self.sent.get(chat_id)
+        return messages[-1] if messages else None
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls.append(method)
+        return self._respond(bot, method)
+
+    def _respond(self, bot: Bot, method: TelegramMethod) -> Any:
+        returning = method.__returning__
+        returns = set(get_args(returning)) or {returning}
+        if User in returns:
+            return User(id=bot.id, is_bot=True, first_name="Bench", username=BOT_USERNAME)
+        if Message in returns:
+            return self._message(method)
+        if bool in returns:
+            return True
+        raise NotImplementedError(f"FakeTelegramSession does not answer {method.__api_method__}")
+
+    def _message(self, method: TelegramMethod) -> Message:
+        chat_id = getattr(method, "chat_id", None) or 0
+        message_id = getattr(method, "message_id", None) or next(self._message_ids)
+        markup = getattr(method, "reply_markup", None)
+        message = Message(
+            message_id=message_id,
+            date=datetime.now(),
+            chat=Chat(id=chat_id, type="private"),
+            text=getattr(method, "text", None),
+            reply_markup=markup if isinstance(markup, InlineKeyboardMarkup) else None,
+        )
+        self.sent.setdefault(chat_id, []).append(message)
+        return message
+
+    async def stream_content(
+        self,
+        url: str,
+        headers: Optional[Dict[str, Any]] = None,
+        timeout: int = 30,
+        chunk_size: int = 65536,
+        raise_for_status: bool = True,
+    ) -> AsyncGenerator[bytes, None]:
+        raise NotImplementedError("FakeTelegramSession does not serve files")
+        yield b""
+
+    async def close(self) -> None:
+        return None
+
+
+def fake_bot(session: FakeTelegramSession, token: str = "42:FAKE") -> Bot:
+    return Bot(token=token, session=session)
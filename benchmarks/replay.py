@@ -0,0 +1,260 @@
+"""
+End-to-end replay and load harness.
+
+Feeds an update stream through the real dispatcher (every router,
+DatabaseMiddleware, metrics) with a FakeTelegramSession in place of the
+Bot API and a fresh SQLite database, then reports throughput, per-handler
+latency and outgoing API calls as JSON.
+
+The default stream is scripted: a user registers and creates a table,
+``--joins`` users register through the invite link, ``--payers`` of them
+pick the table and add ``--expenses`` expenses and payments, checking
+balance and debts every ``--balance-every`` expenses. ``--record`` saves
+the stream as JSON lines (one Telegram update per line); ``--replay``
+feeds such a file instead of the script. Values only known at run time
+are written as placeholders: ``{invite:0}`` for the first invite code the
+bot sent, ``{table:0}`` for the first table id in an inline keyboard.
+
+    python -m benchmarks.replay --joins 50 --expenses 1000
+    python -m benchmarks.replay --concurrency 32 --latency-ms 30
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from benchmarks.fake_telegram import FakeTelegramSession, fake_bot
+from bot.dao.database import Base, enable_savepoints
+from bot.infrastructure import query_tracking
+from bot.infrastructure.concurrency import ChatOrderedConcurrencyMiddleware
+from bot.infrastructure.metrics import handler_errors, handler_latency
+from bot.main import build_dispatcher
+
+
+PLACEHOLDER = re.compile(r"\{(invite|table):(\d+)\}")
+INVITE_CODE = re.compile(r"Код приглашения: <code>(\w+)</code>")
+TABLE_BUTTON = re.compile(r"^table_(\d+)$")
+
+
+@dataclass(frozen=True)
+class Step:
+    user_id: int
+    text: Optional[str] = None
+    callback_data: Optional[str] = None
+
+
+def standard_script(joins: int = 50, expenses: int = 1_000, payers: int = 5,
+                    balance_every: int = 50) -> Iterator[Step]:
+    owner = 1
+    members = [owner] + [owner + i for i in range(1, joins + 1)]
+
+    yield from _register(owner, "/start")
+    yield Step(owner, "➕ Создать стол")
+    yield Step(owner, "Ужин на всех")
+    for user_id in members[1:]:
+        yield from _register(user_id, "/start join_{invite:0}")
+
+    payers = members[:max(1, min(payers, len(members)))]
+    for user_id in payers:
+        yield Step(user_id, "🍽️ Мои столы")
+        yield Step(user_id, callback_data="table_{table:0}")
+
+    for i in range(expenses):
+        payer = payers[i % len(payers)]
+        is_payment = i % 2 == 1
+        yield Step(payer, "➕ Добавить расход")
+        yield Step(payer, callback_data="income" if is_payment else "expense")
+        yield Step(payer, f"Позиция {i + 1}")
+        yield Step(payer, str(100 + i % 900))
+        yield Step(payer, callback_data="split_me" if is_payment else "split_all")
+        if balance_every and (i + 1) % balance_every == 0:
+            yield Step(payer, "💰 Посмотреть баланс")
+            yield Step(payer, "💳 Посчитать долги")
+
+
+def _register(user_id: int, start: str) -> Iterator[Step]:
+    yield Step(user_id, start)
+    yield Step(user_id, f"+7999{user_id:07d}")
+    yield Step(user_id, "Сбер")
+
+
+class Harness:
+    def __init__(self, dp: Dispatcher, bot: Bot, session: FakeTelegramSession,
+                 concurrency: Optional[ChatOrderedConcurrencyMiddleware] = None):
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.concurrency = concurrency
+        self.recorded: List[Dict[str, Any]] = []
+        self.updates = 0
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._callback_ids = itertools.count(1)
+        self._values: Dict[str, List[str]] = {"invite": [], "table": []}
+        self._captured_calls = 0
+
+    async def run_script(self, steps: Iterable[Step]) -> None:
+        for step in steps:
+            await self.feed(self._build(step))
+
+    async def replay(self, updates: Iterable[Dict[str, Any]]) -> None:
+        for update in updates:
+            await self.feed(update)
+
+    async def feed(self, update: Dict[str, Any]) -> None:
+        """Feed one update, resolving placeholders against replies seen so far."""
+        self.recorded.append(update)
+        raw = json.dumps(update, ensure_ascii=False)
+        if PLACEHOLDER.search(raw):
+            raw = await self._resolve(raw)
+        payload = json.loads(raw)
+        payload["update_id"] = next(self._update_ids)
+        self.updates += 1
+        await self.dp.feed_update(self.bot, Update.model_validate(payload, context={"bot": self.bot}))
+
+    async def finish(self) -> None:
+        if self.concurrency is not None:
+            await self.concurrency.drain()
+
+    async def _resolve(self, raw: str) -> str:
+        def substitute(match: re.Match) -> str:
+            return self._values[match.group(1)][int(match.group(2))]
+
+        self._capture()
+        try:
+            return PLACEHOLDER.sub(substitute, raw)
+        except IndexError:
+            # Значение появится, когда обработаются предыдущие обновления
+            await self.finish()
+            self._capture()
+            return PLACEHOLDER.sub(substitute, raw)
+
+    def _capture(self) -> None:
+        for method in self.session.calls[self._captured_calls:]:
+            text = getattr(method, "text", None) or ""
+            for code in INVITE_CODE.findall(text):
+                if code not in self._values["invite"]:
+                    self._values["invite"].append(code)
+            markup = getattr(method, "reply_markup", None)
+            for row in getattr(markup, "inline_keyboard", None) or ():
+                for button in row:
+                    match = TABLE_BUTTON.match(button.callback_data or "")
+                    if match and match.group(1) not in self._values["table"]:
+                        self._values["table"].append(match.group(1))
+        self._captured_calls = len(self.session.calls)
+
+    def _build(self, step: Step) -> Dict[str, Any]:
+        user = {"id": step.user_id, "is_bot": False, "first_name": f"User {step.user_id}"}
+        chat = {"id": step.user_id, "type": "private"}
+        now = int(datetime.now().timestamp())
+        if step.callback_data is None:
+            return {"message": {
+                "message_id": next(self._message_ids), "date": now,
+                "chat": chat, "from": user, "text": step.text,
+            }}
+
+        last = self.session.last_message(step.user_id)
+        message = last.model_dump(mode="json", by_alias=True, exclude_none=True) if last else {
+            "message_id": next(self._message_ids), "date": now, "chat": chat, "text": "",
+        }
+        return {"callback_query": {
+            "id": str(next(self._callback_ids)), "from": user, "chat_instance": str(step.user_id),
+            "message": message, "data": step.callback_data,
+        }}
+
+
+def report(harness: Harness, elapsed: float) -> Dict[str, Any]:
+    handlers = {}
+    for (name,) in sorted(handler_latency.label_sets()):
+        counts = handler_latency.counts(name)
+        handlers[name] = {
+            "updates": sum(counts),
+            "p50_ms": round(handler_latency.quantile(0.5, counts) * 1000, 2),
+            "p95_ms": round(handler_latency.quantile(0.95, counts) * 1000, 2),
+            "errors": int(handler_errors.value(name)),
+        }
+    return {
+        "updates": harness.updates,
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(harness.updates / elapsed, 1) if elapsed else None,
+        "handlers": handlers,
+        "api_calls": dict(sorted(harness.session.call_counts.items())),
+        "api_calls_total": len(harness.session.calls),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = enable_savepoints(
+            create_async_engine(f"sqlite+aiosqlite:///{args.db or os.path.join(directory, 'e2e.sqlite3')}")
+        )
+        query_tracking.install(engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+        session = FakeTelegramSession(latency=args.latency_ms / 1000)
+        bot = fake_bot(session)
+        concurrency = ChatOrderedConcurrencyMiddleware(args.concurrency) if args.concurrency else None
+        dp = build_dispatcher(
+            session_maker=async_sessionmaker(engine, class_=AsyncSession),
+            concurrency=concurrency
+        )
+        harness = Harness(dp, bot, session, concurrency)
+
+        started = time.perf_counter()
+        if args.replay:
+            with open(args.replay, encoding="utf-8") as f:
+                await harness.replay(json.loads(line) for line in f if line.strip())
+        else:
+            await harness.run_script(standard_script(args.joins, args.expenses, args.payers, args.balance_every))
+        await harness.finish()
+        elapsed = time.perf_counter() - started
+
+        if args.record:
+            with open(args.record, "w", encoding="utf-8") as f:
+                for update in harness.recorded:
+                    f.write(json.dumps(update, ensure_ascii=False) + "\n")
+
+        await engine.dispose()
+        return report(harness, elapsed)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--joins", type=int, default=50)
+    parser.add_argument("--expenses", type=int, default=1_000)
+    parser.add_argument("--payers", type=int, default=5)
+    parser.add_argument("--balance-every", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="handle chats concurrently with this many updates in flight")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated Bot API latency")
+    parser.add_argument("--db", help="SQLite file to use instead of a temporary one")
+    parser.add_argument("--record", help="save the fed updates as JSON lines")
+    parser.add_argument("--replay", help="feed updates from a JSON lines file instead of the script")
+    parser.add_argument("--output", help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args))
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    return 1 if any(h["errors"] for h in result["handlers"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
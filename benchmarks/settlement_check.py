@@ -0,0 +1,315 @@
+"""
+Differential and property checks for balance and settlement engines.
+
+Generates random tables from a seed: every bill is consumed by a random
+group with random ratios and paid by one or two members, so balances sum
+to zero up to the truncation of each share; a few debts are repaid
+between random members. For every case
+
+* each balance engine must match the reference, ``_calculate_user_amount``
+  called per member plus the member's repayments;
+* each settlement engine must produce positive transfers from debtors to
+  creditors, at most n-1 of them for n non-zero balances, and leave only the
+  rounding remainder on one side; it may not need more transfers than the
+  reference ``_minimize_transfers``.
+
+Cases are loaded the way the use cases write them, including ledger
+events (with a snapshot every few events), so the ledger read is checked
+against the item aggregate and the per-member reference.
+
+Engines are registered in ``BALANCE_ENGINES`` and ``SETTLEMENT_ENGINES``;
+a faster implementation is added there and checked against the reference
+on thousands of cases. Timings are recorded per case and engine.
+
+    python -m benchmarks.settlement_check --cases 2000 --output cases.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from bot.dao.database import Base, enable_savepoints
+from bot.dao.models import User, DiningTable, TableUser, Item, TableItem, Transaction, UserItemConsumption
+from bot.use_cases.expense_use_cases import ExpenseUseCase
+from bot.use_cases.ledger_use_cases import EXPENSE_ADDED, REPAYMENT, LedgerUseCase, balance, expense_payload
+
+
+Transfer = Tuple[int, int, int]
+BalanceEngine = Callable[[ExpenseUseCase, int, List[int]], Awaitable[Dict[int, int]]]
+SettlementEngine = Callable[[Dict[int, int]], List[Transfer]]
+
+RATIOS = (0.5, 1.0, 1.0, 1.0, 1.5, 2.0, 3.0)
+SNAPSHOT_EVERY = 3
+
+
+@dataclass(frozen=True)
+class Bill:
+    price: int
+    # индекс участника -> доля
+    consumers: Dict[int, float]
+    payers: Tuple[int, ...]
+
+
+@dataclass(frozen=True)
+class Case:
+    seed: int
+    members: int
+    bills: Tuple[Bill, ...]
+    # (индекс плательщика, индекс получателя, сумма)
+    repayments: Tuple[Tuple[int, int, int], ...] = ()
+
+    @property
+    def shares(self) -> int:
+        """Rows whose amount is truncated: the bound on the balance sum."""
+        return sum(len(bill.consumers) + len(bill.payers) for bill in self.bills)
+
+
+@dataclass
+class CaseResult:
+    case: Case
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+    transfers: int = 0
+    violations: List[str] = field(default_factory=list)
+
+
+def random_case(seed: int, max_members: int = 8, max_bills: int = 15) -> Case:
+    rng = random.Random(seed)
+    members = rng.randint(2, max_members)
+    bills = []
+    for _ in range(rng.randint(0, max_bills)):
+        group = rng.sample(range(members), rng.randint(1, members))
+        payers = tuple(rng.sample(range(members), rng.choice((1, 1, 1, 2))))
+        bills.append(Bill(
+            price=rng.choice((rng.randint(1, 100), rng.randint(100, 10_000), rng.randint(10_000, 1_000_000))),
+            consumers={member: rng.choice(RATIOS) for member in group},
+            payers=payers,
+        ))
+    repayments = tuple(
+        (*rng.sample(range(members), 2), rng.randint(1, 5_000)) for _ in range(rng.randint(0, 3))
+    )
+    return Case(seed=seed, members=members, bills=tuple(bills), repayments=repayments)
+
+
+def random_balances(rng: random.Random, members: int, imbalance: int = 0) -> Dict[int, int]:
+    """Balances of ``members`` users summing to ``imbalance``."""
+    balances = {user_id: rng.randint(-10_000, 10_000) for user_id in range(1, members)}
+    balances[members] = imbalance - sum(balances.values())
+    return balances
+
+
+_telegram_ids = itertools.count(1_000_000)
+
+
+async def load_case(session: AsyncSession, case: Case) -> Tuple[int, List[int]]:
+    """Insert the case as a new table with its ledger events; returns the table id and member ids."""
+    ledger = LedgerUseCase(session, snapshot_every=SNAPSHOT_EVERY)
+    users = [User(telegram_id=next(_telegram_ids), first_name=f"Member {i}") for i in range(case.members)]
+    table = DiningTable(name=f"Case {case.seed}", invite_code=f"CASE{next(_telegram_ids)}")
+    session.add_all([*users, table])
+    await session.flush()
+    user_ids = [user.id for user in users]
+    session.add_all(TableUser(table_id=table.id, user_id=user_id) for user_id in user_ids)
+
+    async def add_item(name: str, price: int, is_income: bool, consumers: Dict[int, float]) -> None:
+        item = Item(name=name, price=price, is_income=is_income)
+        session.add(item)
+        await session.flush()
+        session.add(TableItem(table_id=table.id, item_id=item.id))
+        session.add_all(
+            UserItemConsumption(user_id=user_ids[member], item_id=item.id, ratio=ratio)
+            for member, ratio in consumers.items()
+        )
+        await session.flush()
+        members = [user_ids[member] for member in consumers]
+        await ledger.append(table.id, EXPENSE_ADDED, expense_payload(
+            item.id, name, price, is_income, members, list(consumers.values())
+        ))
+
+    for number, bill in enumerate(case.bills):
+        await add_item(f"Bill {number}", bill.price, False, bill.consumers)
+        await add_item(f"Payment {number}", bill.price, True, {member: 1.0 for member in bill.payers})
+
+    for payer, recipient, amount in case.repayments:
+        transaction = Transaction(
+            table_id=table.id, user_id_from=user_ids[payer], user_id_to=user_ids[recipient], amount=amount
+        )
+        session.add(transaction)
+        await session.flush()
+        await ledger.append(table.id, REPAYMENT, {
+            'transaction_id': transaction.id, 'from': user_ids[payer], 'to': user_ids[recipient], 'amount': amount
+        })
+    return table.id, user_ids
+
+
+async def _reference_balances(usecase: ExpenseUseCase, table_id: int, user_ids: List[int]) -> Dict[int, int]:
+    balances = {}
+    for user_id in user_ids:
+        income = await usecase._calculate_user_amount(user_id, table_id, True)
+        expenses = await usecase._calculate_user_amount(user_id, table_id, False)
+        balances[user_id] = income - expenses
+
+    result = await usecase.session.execute(
+        select(Transaction.user_id_from, Transaction.user_id_to, Transaction.amount)
+        .filter(Transaction.table_id == table_id)
+    )
+    for user_from, user_to, amount in result.all():
+        balances[user_from] += amount
+        balances[user_to] -= amount
+    return balances
+
+
+async def _aggregate_balances(usecase: ExpenseUseCase, table_id: int, user_ids: List[int]) -> Dict[int, int]:
+    amounts = await usecase.ledger.aggregate_amounts(table_id)
+    return {user_id: balance(amounts.get(user_id)) for user_id in user_ids}
+
+
+async def _ledger_balances(usecase: ExpenseUseCase, table_id: int, user_ids: List[int]) -> Dict[int, int]:
+    amounts = await usecase._calculate_amounts(table_id)
+    return {user_id: balance(amounts.get(user_id)) for user_id in user_ids}
+
+
+BALANCE_ENGINES: Dict[str, BalanceEngine] = {
+    "reference": _reference_balances,
+    "aggregate": _aggregate_balances,
+    "ledger": _ledger_balances,
+}
+
+SETTLEMENT_ENGINES: Dict[str, SettlementEngine] = {
+    "reference": ExpenseUseCase(None)._minimize_transfers,
+}
+
+
+def settlement_violations(balances: Dict[int, int], transfers: List[Transfer]) -> List[str]:
+    """Invariants every transfer plan must satisfy; empty if the plan is valid."""
+    violations = []
+    remaining = dict(balances)
+    for debtor, creditor, amount in transfers:
+        if amount <= 0:
+            violations.append(f"non-positive transfer {debtor}->{creditor}: {amount}")
+        if balances.get(debtor, 0) >= 0 or balances.get(creditor, 0) <= 0:
+            violations.append(f"transfer {debtor}->{creditor} goes against the balances")
+        remaining[debtor] = remaining.get(debtor, 0) + amount
+        remaining[creditor] = remaining.get(creditor, 0) - amount
+
+    imbalance = sum(balances.values())
+    if not (all(v >= 0 for v in remaining.values()) or all(v <= 0 for v in remaining.values())):
+        violations.append(f"balances left on both sides: {remaining}")
+    elif sum(abs(v) for v in remaining.values()) != abs(imbalance):
+        violations.append(f"left {remaining} for an imbalance of {imbalance}")
+
+    nonzero = sum(1 for v in balances.values() if v)
+    if len(transfers) > max(0, nonzero - 1):
+        violations.append(f"{len(transfers)} transfers for {nonzero} non-zero balances")
+    return violations
+
+
+def check_settlement(balances: Dict[int, int], result: CaseResult) -> None:
+    reference = None
+    for name, engine in SETTLEMENT_ENGINES.items():
+        started = time.perf_counter()
+        transfers = engine(dict(balances))
+        result.timings_ms[f"settle:{name}"] = (time.perf_counter() - started) * 1000
+        result.violations.extend(f"settle:{name}: {v}" for v in settlement_violations(balances, transfers))
+        if reference is None:
+            reference = transfers
+            result.transfers = len(transfers)
+        elif len(transfers) > len(reference):
+            result.violations.append(f"settle:{name}: {len(transfers)} transfers, reference needs {len(reference)}")
+
+
+async def check_case(session: AsyncSession, case: Case) -> CaseResult:
+    """Run every engine on the case; the session is left with the case's rows flushed."""
+    result = CaseResult(case)
+    table_id, user_ids = await load_case(session, case)
+    usecase = ExpenseUseCase(session)
+
+    reference = None
+    for name, engine in BALANCE_ENGINES.items():
+        started = time.perf_counter()
+        balances = await engine(usecase, table_id, user_ids)
+        result.timings_ms[f"balance:{name}"] = (time.perf_counter() - started) * 1000
+        if reference is None:
+            reference = balances
+        elif balances != reference:
+            result.violations.append(f"balance:{name}: {balances} != reference {reference}")
+
+    if abs(sum(reference.values())) > case.shares:
+        result.violations.append(f"balances sum to {sum(reference.values())}, rounding allows {case.shares}")
+    check_settlement(reference, result)
+    return result
+
+
+async def run(cases: int, seed: int, max_members: int, max_bills: int) -> List[CaseResult]:
+    engine = enable_savepoints(create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    results = []
+    for case_seed in range(seed, seed + cases):
+        async with session_maker() as session:
+            results.append(await check_case(session, random_case(case_seed, max_members, max_bills)))
+            await session.rollback()
+    await engine.dispose()
+    return results
+
+
+def summary(results: List[CaseResult]) -> Dict[str, Dict[str, float]]:
+    timings: Dict[str, List[float]] = {}
+    for result in results:
+        for name, ms in result.timings_ms.items():
+            timings.setdefault(name, []).append(ms)
+    return {
+        name: {"median_ms": round(statistics.median(values), 3), "max_ms": round(max(values), 3)}
+        for name, values in sorted(timings.items())
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=2_000)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first case; case i uses seed + i")
+    parser.add_argument("--max-members", type=int, default=8)
+    parser.add_argument("--max-bills", type=int, default=15)
+    parser.add_argument("--output", help="write per-case timings and violations as JSON")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args.cases, args.seed, args.max_members, args.max_bills))
+    failed = [r for r in results if r.violations]
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "summary": summary(results),
+                "cases": [{
+                    "seed": r.case.seed,
+                    "members": r.case.members,
+                    "bills": len(r.case.bills),
+                    "transfers": r.transfers,
+                    "timings_ms": {name: round(ms, 3) for name, ms in r.timings_ms.items()},
+                    "violations": r.violations,
+                } for r in results],
+            }, f, ensure_ascii=False, indent=2)
+
+    for name, stats in summary(results).items():
+        print(f"  {name:<24} median {stats['median_ms']:>8.3f} ms  max {stats['max_ms']:>8.3f} ms")
+    print(f"{len(results)} cases, {len(failed)} failed")
+    for result in failed[:10]:
+        print(f"  seed {result.case.seed}:")
+        for violation in result.violations:
+            print(f"    {violation}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
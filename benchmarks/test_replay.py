@@ -0,0 +1,40 @@
+import json
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from benchmarks.fake_telegram import FakeTelegramSession, fake_bot
+from benchmarks.replay import Harness, report, standard_script
+from bot.dao.database import Base, enable_savepoints
+from bot.dao.models import TableItem, TableUser
+from bot.main import build_dispatcher
+
+
+@pytest.mark.asyncio
+async def test_scripted_stream_runs_through_real_dispatcher(tmp_path):
+    engine = enable_savepoints(create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'e2e.sqlite3'}"))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session = FakeTelegramSession()
+    dp = build_dispatcher(session_maker=async_sessionmaker(engine, class_=AsyncSession))
+    harness = Harness(dp, fake_bot(session), session)
+
+    await harness.run_script(standard_script(joins=3, expenses=6, payers=2, balance_every=3))
+    result = report(harness, elapsed=1.0)
+
+    async with AsyncSession(engine) as db:
+        members = await db.scalar(select(func.count(TableUser.id)))
+        items = await db.scalar(select(func.count(TableItem.id)))
+    await engine.dispose()
+
+    assert members == 4
+    assert items == 6
+    assert all(handler["errors"] == 0 for handler in result["handlers"].values())
+    assert result["handlers"]["calculate_debts_handler"]["updates"] == 2
+    assert result["api_calls"]["getMe"] == 1
+    assert result["api_calls_total"] == len(session.calls)
+
+    recorded = json.dumps(harness.recorded, ensure_ascii=False)
+    assert "/start join_{invite:0}" in recorded
+    assert "table_{table:0}" in recorded
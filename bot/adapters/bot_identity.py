@@ -0,0 +1,11 @@
+from aiogram import Bot
+
+
+def build_invite_link(bot_username: str, invite_code: str) -> str:
+    return f"https://t.me/{bot_username}?start=join_{invite_code}"
+
+
+async def get_invite_link(bot: Bot, invite_code: str) -> str:
+    # Bot.me() кэширует ответ getMe на экземпляре бота
+    me = await bot.me()
+    return build_invite_link(me.username, invite_code)
@@ -0,0 +1,36 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+from bot.adapters.keyboards import get_main_menu_keyboard
+from bot.use_cases.ledger_use_cases import TableClosedError
+
+
+CLOSED_TABLE_TEXT = "🔒 Этот стол уже закрыт. Выберите другой стол в «Мои столы»."
+
+
+class ClosedTableMiddleware(BaseMiddleware):
+    """
+    Answers any handler that hits a closed table and leaves that table.
+
+    The current table lives in FSM data, so members who still have a
+    table open when it gets closed would otherwise keep writing to it.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        except TableClosedError:
+            state = data.get("state")
+            if state is not None:
+                await state.clear()
+            if isinstance(event, CallbackQuery):
+                await event.answer(CLOSED_TABLE_TEXT, show_alert=True)
+            else:
+                await event.answer(CLOSED_TABLE_TEXT, reply_markup=get_main_menu_keyboard())
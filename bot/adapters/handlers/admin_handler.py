@@ -0,0 +1,100 @@
+import html
+
+from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.types import Message
+
+from bot.config import settings
+from bot.dao.database import engine
+from bot.infrastructure import diagnostics
+from bot.infrastructure.metrics import handler_latency
+from bot.infrastructure.profiling import SamplingProfiler
+
+
+router = Router()
+router.message.filter(F.from_user.id.in_(settings.ADMIN_IDS))
+
+throughput = diagnostics.ThroughputMeter()
+
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject, profiler: SamplingProfiler):
+    action = (command.args or "").strip().lower()
+
+    if action == "on":
+        profiler.enable()
+    elif action == "off":
+        profiler.disable()
+    elif action:
+        await message.answer("Использование: /profile on | off")
+        return
+
+    status = "включён" if profiler.enabled else "выключен"
+    await message.answer(
+        f"🔬 Профилировщик {status}\n\n"
+        f"Порог: {profiler.threshold * 1000:.0f} мс\n"
+        f"Не больше {profiler.max_dumps_per_minute} профилей в минуту\n"
+        f"Каталог: <code>{profiler.directory}</code>",
+        parse_mode="HTML"
+    )
+
+
+def _ms(seconds) -> str:
+    return "—" if seconds is None else f"{seconds * 1000:.0f} мс"
+
+
+@router.message(Command("perf"))
+async def cmd_perf(message: Message, command: CommandObject, fsm_storage: BaseStorage):
+    action = (command.args or "").strip().lower()
+
+    if action == "mem off":
+        diagnostics.stop_memory_tracing()
+        await message.answer("🧠 Трассировка памяти выключена")
+        return
+    if action == "mem":
+        top = diagnostics.memory_top()
+        if top is None:
+            await message.answer(
+                "🧠 Трассировка памяти включена. Повтори /perf mem, чтобы получить снимок, "
+                "и /perf mem off, чтобы выключить."
+            )
+        else:
+            # Имена вроде <frozen importlib._bootstrap_external> Telegram принял бы за разметку
+            await message.answer(
+                "🧠 <b>Топ аллокаций:</b>\n\n" + "\n".join(html.escape(line) for line in top), parse_mode="HTML"
+            )
+        return
+    if action:
+        await message.answer("Использование: /perf | /perf mem | /perf mem off")
+        return
+
+    total = sum(handler_latency.merged_counts())
+    overall, recent = throughput.read(total)
+    percentiles = diagnostics.latency_percentiles(handler_latency)
+
+    lines = [
+        "📈 <b>Состояние бота</b>",
+        "",
+        f"Аптайм: {diagnostics.format_duration(diagnostics.uptime())}",
+        f"Обновлений: {total} ({overall * 60:.1f}/мин"
+        + (f", с прошлого /perf {recent * 60:.1f}/мин)" if recent is not None else ")"),
+        "Задержка: " + ", ".join(f"p{q * 100:g} {_ms(value)}" for q, value in percentiles.items()),
+        f"Пул БД: {diagnostics.pool_status(engine)}",
+    ]
+
+    fsm_contexts = diagnostics.fsm_context_count(fsm_storage)
+    if fsm_contexts is not None:
+        lines.append(f"FSM-контекстов в памяти: {fsm_contexts}")
+
+    slowest = diagnostics.slowest_handlers(handler_latency)
+    if slowest:
+        lines += ["", "<b>Медленные обработчики (p95):</b>"]
+        lines += [f"{name}: {_ms(p95)} ({count})" for name, count, p95 in slowest]
+
+    caches = diagnostics.cache_hit_rates()
+    if caches:
+        lines += ["", "<b>Кэши:</b>"]
+        lines += [f"{name}: {rate:.0%} попаданий из {lookups}" for name, (rate, lookups) in caches.items()]
+
+    await message.answer("\n".join(lines), parse_mode="HTML")
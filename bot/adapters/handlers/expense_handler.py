@@ -9,15 +9,20 @@ from bot.adapters.keyboards import (
     get_transaction_type_keyboard,
     get_split_method_keyboard,
     get_participants_keyboard,
-    get_creditors_keyboard
+    get_creditors_keyboard,
+    get_invite_keyboard
 )
+from bot.adapters import participant_picker as picker
+from bot.adapters.bot_identity import get_invite_link
+from bot.adapters.text_commands import text_commands
 from bot.adapters.states import ExpenseStates, PaymentStates
+from bot.adapters.throttling import participants_markup_throttler
 from bot.use_cases.expense_use_cases import ExpenseUseCase
 
 router = Router()
 
 
-@router.message(F.text == "➕ Добавить расход")
+@text_commands.command("➕ Добавить расход")
 async def add_expense_start(message: Message, state: FSMContext):
     data = await state.get_data()
     current_table_id = data.get("current_table_id")
@@ -212,50 +217,133 @@ async def split_custom_selected(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     table_users = data.get("table_users", [])
     
-    await state.update_data(selected_participants=[])
+    await state.update_data(
+        participants_mask=picker.encode_mask(0),
+        participants_page=0,
+        participants_view=None,
+    )
     await state.set_state(ExpenseStates.selecting_participants)
     
     await callback.message.edit_text(
         "Выберите участников для разделения суммы:\n"
-        "(Нажмите 'Готово' когда закончите выбор)",
-        reply_markup=get_participants_keyboard(table_users, [])
+        "(Отправьте начало имени для поиска, нажмите 'Готово' когда закончите выбор)",
+        reply_markup=get_participants_keyboard(table_users, 0)
     )
     await callback.answer()
 
 
-@router.callback_query(ExpenseStates.selecting_participants, F.data.startswith("participant_"))
+@router.callback_query(ExpenseStates.selecting_participants, F.data.startswith(picker.TOGGLE))
 async def toggle_participant(callback: CallbackQuery, state: FSMContext):
-    user_id = int(callback.data.split("_")[1])
+    index = int(callback.data[len(picker.TOGGLE):])
     data = await state.get_data()
-    selected = data.get("selected_participants", [])
     table_users = data.get("table_users", [])
     
-    if user_id in selected:
-        selected.remove(user_id)
-    else:
-        selected.append(user_id)
+    if index >= len(table_users):
+        await callback.answer()
+        return
     
-    await state.update_data(selected_participants=selected)
+    mask = picker.toggle(picker.decode_mask(data.get("participants_mask")), index)
+    
+    await state.update_data(participants_mask=picker.encode_mask(mask))
+    await callback.answer()
+    await _render_participants(callback, data, mask=mask)
+
+
+@router.callback_query(
+    ExpenseStates.selecting_participants,
+    F.data.in_([picker.SELECT_ALL, picker.SELECT_NONE, picker.INVERT])
+)
+async def bulk_toggle_participants(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    table_users = data.get("table_users", [])
+    mask = picker.decode_mask(data.get("participants_mask"))
+    visible = picker.view_mask(data.get("participants_view"), len(table_users))
     
-    await callback.message.edit_reply_markup(
-        reply_markup=get_participants_keyboard(table_users, selected)
+    if callback.data == picker.SELECT_ALL:
+        mask = picker.select_all(mask, visible)
+    elif callback.data == picker.SELECT_NONE:
+        mask = picker.select_none(mask, visible)
+    else:
+        mask = picker.invert(mask, visible)
+    
+    await state.update_data(participants_mask=picker.encode_mask(mask))
+    await callback.answer()
+    await _render_participants(callback, data, mask=mask)
+
+
+@router.callback_query(ExpenseStates.selecting_participants, F.data.startswith(picker.PAGE))
+async def change_participants_page(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    table_users = data.get("table_users", [])
+    page = picker.clamp_page(
+        int(callback.data[len(picker.PAGE):]), data.get("participants_view"), len(table_users)
     )
+    
+    await state.update_data(participants_page=page)
+    await callback.answer()
+    await _render_participants(callback, data, page=page)
+
+
+@router.callback_query(ExpenseStates.selecting_participants, F.data == picker.NOOP)
+async def participants_page_indicator(callback: CallbackQuery):
     await callback.answer()
 
 
+@router.message(ExpenseStates.selecting_participants)
+async def search_participants(message: Message, state: FSMContext):
+    if message.text == "❌ Отмена":
+        await state.clear()
+        await message.answer("Операция отменена.", reply_markup=get_table_menu_keyboard())
+        return
+    
+    data = await state.get_data()
+    table_users = data.get("table_users", [])
+    view = picker.filter_by_prefix(table_users, message.text or "")
+    mask = picker.decode_mask(data.get("participants_mask"))
+    
+    await state.update_data(participants_view=view, participants_page=0)
+    
+    if view is None:
+        text = "Показаны все участники:"
+    elif view:
+        text = f"Найдено участников: {len(view)}. Отправьте * чтобы показать всех."
+    else:
+        text = "Никого не найдено. Отправьте * чтобы показать всех."
+    
+    await message.answer(text, reply_markup=get_participants_keyboard(table_users, mask, 0, view))
+
+
+async def _render_participants(callback: CallbackQuery, data, mask=None, page=None):
+    table_users = data.get("table_users", [])
+    if mask is None:
+        mask = picker.decode_mask(data.get("participants_mask"))
+    if page is None:
+        page = data.get("participants_page", 0)
+    
+    message = callback.message
+    markup = get_participants_keyboard(table_users, mask, page, data.get("participants_view"))
+    await participants_markup_throttler.submit(
+        (message.chat.id, message.message_id),
+        lambda: message.edit_reply_markup(reply_markup=markup)
+    )
+
+
 @router.callback_query(ExpenseStates.selecting_participants, F.data == "participants_done")
 async def participants_done(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    selected = data.get("selected_participants", [])
+    table_users = data.get("table_users", [])
+    mask = picker.decode_mask(data.get("participants_mask"))
+    selected = picker.selected_user_ids(table_users, mask)
     
     if not selected:
         await callback.answer("Выберите хотя бы одного участника!", show_alert=True)
         return
     
+    participants_markup_throttler.forget((callback.message.chat.id, callback.message.message_id))
+    await state.update_data(selected_participants=selected)
     await state.set_state(ExpenseStates.entering_ratios)
     
-    table_users = data.get("table_users", [])
-    selected_names = [name for uid, name in table_users if uid in selected]
+    selected_names = [table_users[i][1] for i in picker.selected_indices(mask)]
     
     await callback.message.edit_text(
         f"Выбрано участников: {len(selected)}\n\n"
@@ -328,7 +416,7 @@ async def ratios_entered(message: Message, state: FSMContext, session: AsyncSess
     )
 
 
-@router.message(F.text == "💰 Посмотреть баланс")
+@text_commands.command("💰 Посмотреть баланс")
 async def view_balance(message: Message, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     current_table_id = data.get("current_table_id")
@@ -359,6 +447,10 @@ async def view_balance(message: Message, state: FSMContext, session: AsyncSessio
     text = "💰 Ваш баланс:\n\n"
     text += f"Расходы: {balance_data['expenses']/100:.2f} ₽\n"
     text += f"Оплаты: {balance_data['income']/100:.2f} ₽\n"
+    if balance_data['repaid']:
+        text += f"Погашено долгов: {balance_data['repaid']/100:.2f} ₽\n"
+    if balance_data['received']:
+        text += f"Получено погашений: {balance_data['received']/100:.2f} ₽\n"
     text += f"Баланс: {balance_data['balance']/100:.2f} ₽\n\n"
     
     if debts:
@@ -390,7 +482,7 @@ async def view_balance(message: Message, state: FSMContext, session: AsyncSessio
     
     await message.answer(text, reply_markup=get_table_menu_keyboard())
 
-@router.message(F.text == "💳 Посчитать долги")
+@text_commands.command("💳 Посчитать долги")
 async def calculate_debts_handler(message: Message, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     current_table_id = data.get("current_table_id")
@@ -438,7 +530,7 @@ async def calculate_debts_handler(message: Message, state: FSMContext, session:
 
 
 
-@router.message(F.text == "👥 Участники")
+@text_commands.command("👥 Участники")
 async def view_participants(message: Message, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     current_table_id = data.get("current_table_id")
@@ -476,9 +568,7 @@ async def view_participants(message: Message, state: FSMContext, session: AsyncS
         await message.answer("В этом столе пока нет участников.")
         return
     
-    bot = message.bot
-    bot_username = (await bot.me()).username
-    invite_link = f"https://t.me/{bot_username}?start=join_{invite_code}"
+    invite_link = await get_invite_link(message.bot, invite_code)
     
     text = f"🍽️ <b>Стол: {table_name}</b>\n\n"
     text += "👥 <b>Участники:</b>\n\n"
@@ -493,10 +583,10 @@ async def view_participants(message: Message, state: FSMContext, session: AsyncS
     text += f"🔑 <b>Код приглашения:</b> <code>{invite_code}</code>\n\n"
     text += "<i>Отправьте ссылку или код друзьям, чтобы они присоединились к столу</i>"
     
-    await message.answer(text, parse_mode="HTML", reply_markup=get_table_menu_keyboard())
+    await message.answer(text, parse_mode="HTML", reply_markup=get_invite_keyboard())
 
 
-@router.message(F.text == "📊 Статистика")
+@text_commands.command("📊 Статистика")
 async def view_statistics(message: Message, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     current_table_id = data.get("current_table_id")
@@ -535,7 +625,7 @@ async def view_statistics(message: Message, state: FSMContext, session: AsyncSes
     await message.answer(text, reply_markup=get_table_menu_keyboard())
 
 
-@router.message(F.text == "📋 История операций")
+@text_commands.command("📋 История операций")
 async def view_operations_history(message: Message, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     current_table_id = data.get("current_table_id")
@@ -654,7 +744,7 @@ async def view_operations_history(message: Message, state: FSMContext, session:
         await message.answer(text, parse_mode="HTML", reply_markup=get_table_menu_keyboard())
 
 
-@router.message(F.text == "💸 Погасить долг")
+@text_commands.command("💸 Погасить долг")
 async def repay_debt_start(message: Message, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     current_table_id = data.get("current_table_id")
@@ -779,14 +869,7 @@ async def payment_amount_entered(message: Message, state: FSMContext, session: A
         return
     
     expense_use_case = ExpenseUseCase(session)
-    await expense_use_case.add_expense(
-        table_id=current_table_id,
-        item_name=f"Погашение долга",
-        price=amount,
-        user_ids=[user.id],
-        is_income=True,
-        created_by_id=user.id
-    )
+    await expense_use_case.add_repayment(current_table_id, user.id, selected_creditor_id, amount)
     
     result = await session.execute(
         select(User).filter_by(id=selected_creditor_id)
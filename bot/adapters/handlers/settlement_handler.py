@@ -0,0 +1,121 @@
+from aiogram import Router, F
+from aiogram.types import Message, CallbackQuery
+from aiogram.fsm.context import FSMContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.adapters.keyboards import get_main_menu_keyboard, get_settle_all_keyboard
+from bot.adapters.text_commands import text_commands
+from bot.dao.models import User
+from bot.domain.entities import SettlementPlan
+from bot.use_cases.settlement_use_cases import SettlementUseCase
+
+router = Router()
+
+
+async def _get_user(session: AsyncSession, telegram_id: int):
+    result = await session.execute(select(User).filter_by(telegram_id=telegram_id))
+    return result.scalar_one_or_none()
+
+
+async def _format_plan(session: AsyncSession, plan: SettlementPlan) -> str:
+    other_ids = {plan.counterparty(d) for debts in plan.table_debts.values() for d in debts}
+    result = await session.execute(select(User).filter(User.id.in_(other_ids)))
+    names = {
+        u.id: u.first_name or u.username or f"User {u.telegram_id}"
+        for u in result.scalars().all()
+    }
+    paid, received = plan.part(received=False), plan.part(received=True)
+
+    lines = [f"🤝 Взаимозачёт по {len(plan.table_debts)} столам:\n"]
+    for debtor, creditor, amount in plan.transfers:
+        if debtor == plan.user_id:
+            lines.append(f"• Вы → {names[creditor]}: {amount/100:.2f} ₽")
+        else:
+            lines.append(f"• {names[debtor]} → Вам: {amount/100:.2f} ₽")
+    for other_id in plan.offsets:
+        lines.append(f"• Вы ⇄ {names[other_id]}: долги взаимно погашаются, переводить ничего не нужно")
+
+    lines.append("")
+    if paid.transfers:
+        lines.append("После своих переводов нажмите «Я перевёл» — ваши долги будут записаны как погашенные.")
+    elif paid.table_debts:
+        lines.append("Нажмите «Записать взаимозачёт», чтобы погасить эти долги во всех столах.")
+    if received.transfers:
+        lines.append("Когда деньги придут, нажмите «Мне перевели» — долги перед вами будут отмечены как полученные.")
+    return "\n".join(lines)
+
+
+def _plan_keyboard(plan: SettlementPlan):
+    paid = plan.part(received=False)
+    return get_settle_all_keyboard(
+        pays=bool(paid.transfers), offsets=bool(paid.table_debts), receives=bool(plan.part(received=True).transfers)
+    )
+
+
+@text_commands.command("🤝 Рассчитаться по всем столам")
+async def settle_all_start(message: Message, state: FSMContext, session: AsyncSession):
+    user = await _get_user(session, message.from_user.id)
+    if not user:
+        await message.answer("Ошибка: пользователь не найден. Используйте /start")
+        return
+
+    plan = await SettlementUseCase(session).get_plan(user.id)
+    if not plan.table_debts:
+        await message.answer("✅ У вас нет долгов ни в одном столе!", reply_markup=get_main_menu_keyboard())
+        return
+
+    await state.update_data(settle_all=[list(r) for r in plan.repayments])
+    await message.answer(await _format_plan(session, plan), reply_markup=_plan_keyboard(plan))
+
+
+@router.callback_query(F.data == "settle_all_paid")
+async def settle_all_paid(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    await _settle_all_confirm(callback, state, session, received=False)
+
+
+@router.callback_query(F.data == "settle_all_received")
+async def settle_all_received(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    await _settle_all_confirm(callback, state, session, received=True)
+
+
+async def _settle_all_confirm(callback: CallbackQuery, state: FSMContext, session: AsyncSession, received: bool):
+    data = await state.get_data()
+    expected = data.get("settle_all")
+    if expected is None:
+        await callback.answer("Расчёт устарел, запросите его заново", show_alert=True)
+        return
+
+    user = await _get_user(session, callback.from_user.id)
+    if not user:
+        await callback.answer("Ошибка: пользователь не найден", show_alert=True)
+        return
+
+    usecase = SettlementUseCase(session)
+    part = await usecase.settle_all(user.id, received, expected_repayments=expected)
+    plan = await usecase.get_plan(user.id)
+    if part is None:
+        # Пока пользователь переводил деньги, в столах появились новые операции
+        header = "⚠️ Долги изменились, проверьте новый расчёт."
+        done = "✅ Долги уже погашены."
+    else:
+        header = f"✅ Погашения записаны в {len(part.table_debts)} столах."
+        done = f"✅ Погашения записаны в {len(part.table_debts)} столах!"
+
+    if not plan.table_debts:
+        await state.update_data(settle_all=None)
+        await callback.message.edit_text(done)
+    else:
+        # Осталась вторая часть расчёта или новые долги
+        await state.update_data(settle_all=[list(r) for r in plan.repayments])
+        await callback.message.edit_text(
+            f"{header}\n\n" + await _format_plan(session, plan), reply_markup=_plan_keyboard(plan)
+        )
+    await callback.answer()
+
+
+@router.callback_query(F.data == "settle_all_cancel")
+async def settle_all_cancel(callback: CallbackQuery, state: FSMContext):
+    await state.update_data(settle_all=None)
+    await callback.message.edit_text("Взаимозачёт отменён.")
+    await callback.answer()
@@ -9,7 +9,8 @@ from bot.adapters.keyboards import get_main_menu_keyboard, get_yes_no_keyboard
 from bot.use_cases.user_use_cases import UserUseCase
 from bot.use_cases.table_use_cases import TableUseCase
 from bot.adapters.states import RegistrationState
-from bot.dao.models import User, TableUser
+from bot.dao.models import User
+from bot.domain.entities import JoinStatus
 
 
 router = Router()
@@ -64,39 +65,30 @@ async def cmd_start(message: Message, session: AsyncSession, state: FSMContext):
         return
 
     if invite_code:
-        table_use_case = TableUseCase(session)
-        table = await table_use_case.get_table_by_code(invite_code)
-
-        if not table:
+        try:
+            result = await TableUseCase(session).join_by_code(invite_code, message.from_user.id)
+        except Exception as e:
             await message.answer(
-                "❌ Стол с таким кодом не найден.\n\n"
-                "Возможно, ссылка устарела или код введен неверно.",
+                f"❌ Ошибка при присоединении к столу: {str(e)}",
                 reply_markup=get_main_menu_keyboard()
             )
             return
 
-        result = await session.execute(
-            select(TableUser).filter_by(table_id=table.id, user_id=user.id)
-        )
-        existing = result.scalar_one_or_none()
-
-        if existing:
+        if result.status is JoinStatus.JOINED:
             await message.answer(
-                f"ℹ️ Вы уже являетесь участником стола '{table.name}'!",
+                f"✅ Вы успешно присоединились к столу '{result.table.name}'!\n\n"
+                f"Теперь вы можете добавлять расходы и просматривать баланс.",
                 reply_markup=get_main_menu_keyboard()
             )
-            return
-
-        try:
-            await table_use_case.join_table(table.id, user.id)
+        elif result.status is JoinStatus.ALREADY_MEMBER:
             await message.answer(
-                f"✅ Вы успешно присоединились к столу '{table.name}'!\n\n"
-                f"Теперь вы можете добавлять расходы и просматривать баланс.",
+                f"ℹ️ Вы уже являетесь участником стола '{result.table.name}'!",
                 reply_markup=get_main_menu_keyboard()
             )
-        except Exception as e:
+        else:
             await message.answer(
-                f"❌ Ошибка при присоединении к столу: {str(e)}",
+                "❌ Стол с таким кодом не найден.\n\n"
+                "Возможно, ссылка устарела или код введен неверно.",
                 reply_markup=get_main_menu_keyboard()
             )
         return
@@ -165,31 +157,19 @@ async def enter_bank(message: Message, state: FSMContext, session: AsyncSession)
     await state.clear()
 
     if pending_invite_code:
-        stmt = select(User).filter_by(telegram_id=message.from_user.id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
-
-        table_use_case = TableUseCase(session)
-        table = await table_use_case.get_table_by_code(pending_invite_code)
+        try:
+            result = await TableUseCase(session).join_by_code(pending_invite_code, message.from_user.id)
+        except Exception:
+            result = None
 
-        if table and user:
-            result = await session.execute(
-                select(TableUser).filter_by(table_id=table.id, user_id=user.id)
+        if result is not None and result.joined:
+            await message.answer(
+                f"🎉 Регистрация завершена!\n\n"
+                f"✅ Вы успешно присоединились к столу '{result.table.name}'!\n\n"
+                f"Теперь вы можете добавлять расходы и просматривать баланс.",
+                reply_markup=get_main_menu_keyboard()
             )
-            existing = result.scalar_one_or_none()
-
-            if not existing:
-                try:
-                    await table_use_case.join_table(table.id, user.id)
-                    await message.answer(
-                        f"🎉 Регистрация завершена!\n\n"
-                        f"✅ Вы успешно присоединились к столу '{table.name}'!\n\n"
-                        f"Теперь вы можете добавлять расходы и просматривать баланс.",
-                        reply_markup=get_main_menu_keyboard()
-                    )
-                    return
-                except Exception:
-                    pass
+            return
 
     await message.answer(
         "🎉 Регистрация завершена!\n\n"
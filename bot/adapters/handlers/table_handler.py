@@ -4,7 +4,13 @@ from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.adapters.keyboards import get_main_menu_keyboard, get_cancel_keyboard, get_tables_inline_keyboard, get_table_menu_keyboard
+from bot.adapters.bot_identity import get_invite_link
+from bot.adapters.text_commands import text_commands
 from bot.adapters.states import TableStates
+from bot.domain.entities import JoinStatus
+from bot.use_cases.archive_use_cases import ArchiveUseCase
+from bot.use_cases.closing_use_cases import TableClosingUseCase
+from bot.use_cases.invite_code_use_cases import InviteCodeUseCase
 from bot.use_cases.table_use_cases import TableUseCase
 from bot.use_cases.user_use_cases import UserUseCase
 from pydantic import BaseModel
@@ -16,7 +22,7 @@ class UserFilter(BaseModel):
     telegram_id: int
 
 
-@router.message(F.text == "➕ Создать стол")
+@text_commands.command("➕ Создать стол")
 async def create_table_start(message: Message, state: FSMContext):
     await state.set_state(TableStates.waiting_for_table_name)
     await message.answer(
@@ -49,9 +55,7 @@ async def create_table_finish(message: Message, state: FSMContext, session: Asyn
     table_use_case = TableUseCase(session)
     table_id, invite_code = await table_use_case.create_table(table_name, user.id)
     
-    bot = message.bot
-    bot_username = (await bot.me()).username
-    invite_link = f"https://t.me/{bot_username}?start=join_{invite_code}"
+    invite_link = await get_invite_link(message.bot, invite_code)
     
     await state.clear()
     await message.answer(
@@ -64,7 +68,7 @@ async def create_table_finish(message: Message, state: FSMContext, session: Asyn
     )
 
 
-@router.message(F.text == "🔗 Присоединиться к столу")
+@text_commands.command("🔗 Присоединиться к столу")
 async def join_table_start(message: Message, state: FSMContext):
     await state.set_state(TableStates.waiting_for_table_id)
     await message.answer(
@@ -81,63 +85,75 @@ async def join_table_finish(message: Message, state: FSMContext, session: AsyncS
         return
     
     invite_code = message.text.strip().upper()
-    
-    user_use_case = UserUseCase(session)
-    from sqlalchemy import select
-    from bot.dao.models import User
-    
-    result = await session.execute(
-        select(User).filter_by(telegram_id=message.from_user.id)
-    )
-    user = result.scalar_one_or_none()
 
-    if not user:
+    try:
+        result = await TableUseCase(session).join_by_code(invite_code, message.from_user.id)
+    except Exception:
+        await message.answer(
+            f"❌ Ошибка при присоединении к столу, попробуйте ещё раз",
+            reply_markup=get_main_menu_keyboard()
+        )
+        return
+
+    if result.status is JoinStatus.USER_NOT_FOUND:
         await message.answer("Ошибка: пользователь не найден. Используйте /start")
         return
-    user_id = user.id
-    table_use_case = TableUseCase(session)
-    
-    table = await table_use_case.get_table_by_code(invite_code)
-    
-    if not table:
+
+    if result.status is JoinStatus.TABLE_NOT_FOUND:
         await message.answer(
             "❌ Стол с таким кодом не найден. Проверьте код и попробуйте снова.",
             reply_markup=get_cancel_keyboard()
         )
         return
-    
-    table_id = table.id
-    table_name = table.name
-    
-    from bot.dao.models import TableUser
-    result = await session.execute(
-        select(TableUser).filter_by(table_id=table_id, user_id=user_id)
-    )
-    existing = result.scalar_one_or_none()
-    
-    if existing:
-        await state.clear()
+
+    await state.clear()
+    if result.status is JoinStatus.ALREADY_MEMBER:
         await message.answer(
             "❌ Вы уже являетесь участником этого стола!",
             reply_markup=get_main_menu_keyboard()
         )
         return
-    
-    try:
-        await table_use_case.join_table(table_id, user_id)
-        await state.clear()
-        await message.answer(
-            f"✅ Вы успешно присоединились к столу '{table_name}'!",
-            reply_markup=get_main_menu_keyboard()
-        )
-    except Exception as e:
+
+    await message.answer(
+        f"✅ Вы успешно присоединились к столу '{result.table.name}'!",
+        reply_markup=get_main_menu_keyboard()
+    )
+
+
+def _format_amount(amount: int) -> str:
+    return f"{amount/100:+.2f} ₽" if amount else "0.00 ₽"
+
+
+async def _answer_tables_dashboard(message: Message, session: AsyncSession, user_id: int):
+    table_use_case = TableUseCase(session)
+    tables = await table_use_case.get_user_tables_balances(user_id)
+
+    if not tables:
         await message.answer(
-            f"❌ Ошибка при присоединении к столу, попробуйте ещё раз",
+            "У вас пока нет столов.\n"
+            "Создайте новый или присоединитесь к существующему!",
             reply_markup=get_main_menu_keyboard()
         )
+        return
+
+    owed = sum(t.balance for t in tables if t.balance > 0)
+    owes = -sum(t.balance for t in tables if t.balance < 0)
+    text = "Ваши столы:\n\n"
+    if owed:
+        text += f"🟢 Вам должны: {owed/100:.2f} ₽\n"
+    if owes:
+        text += f"🔴 Вы должны: {owes/100:.2f} ₽\n"
+    if not owed and not owes:
+        text += "✅ Все долги погашены\n"
 
+    tables_list = [(t.table.id, f"{t.table.name} · {_format_amount(t.balance)}") for t in tables]
+    await message.answer(
+        text,
+        reply_markup=get_tables_inline_keyboard(tables_list)
+    )
 
-@router.message(F.text == "🍽️ Мои столы")
+
+@text_commands.command("🍽️ Мои столы")
 async def my_tables(message: Message, session: AsyncSession):
     from sqlalchemy import select
     from bot.dao.models import User
@@ -151,27 +167,14 @@ async def my_tables(message: Message, session: AsyncSession):
         await message.answer("Ошибка: пользователь не найден. Используйте /start")
         return
     
-    table_use_case = TableUseCase(session)
-    tables = await table_use_case.get_user_tables(user.id)
-    
-    if not tables:
-        await message.answer(
-            "У вас пока нет столов.\n"
-            "Создайте новый или присоединитесь к существующему!",
-            reply_markup=get_main_menu_keyboard()
-        )
-        return
-    
-    tables_list = [(t.id, t.name) for t in tables]
-    await message.answer(
-        "Ваши столы:",
-        reply_markup=get_tables_inline_keyboard(tables_list)
-    )
+    await _answer_tables_dashboard(message, session, user.id)
 
 
 @router.callback_query(F.data.startswith("table_"))
-async def select_table(callback: CallbackQuery, state: FSMContext):
+async def select_table(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     table_id = int(callback.data.split("_")[1])
+    # Позиции давно неактивного стола возвращаются из архива при открытии
+    await ArchiveUseCase(session).restore(table_id)
     await state.update_data(current_table_id=table_id)
     
     await callback.message.edit_text(
@@ -183,7 +186,7 @@ async def select_table(callback: CallbackQuery, state: FSMContext):
     )
 
 
-@router.message(F.text == "🔙 Назад к столам")
+@text_commands.command("🔙 Назад к столам")
 async def back_to_tables(message: Message, state: FSMContext, session: AsyncSession):
     await state.update_data(current_table_id=None)
     
@@ -199,25 +202,10 @@ async def back_to_tables(message: Message, state: FSMContext, session: AsyncSess
         await message.answer("Ошибка: пользователь не найден. Используйте /start")
         return
     
-    table_use_case = TableUseCase(session)
-    tables = await table_use_case.get_user_tables(user.id)
-    
-    if not tables:
-        await message.answer(
-            "У вас пока нет столов.\n"
-            "Создайте новый или присоединитесь к существующему!",
-            reply_markup=get_main_menu_keyboard()
-        )
-        return
-    
-    tables_list = [(t.id, t.name) for t in tables]
-    await message.answer(
-        "Ваши столы:",
-        reply_markup=get_tables_inline_keyboard(tables_list)
-    )
+    await _answer_tables_dashboard(message, session, user.id)
 
 
-@router.message(F.text == "🚪 Покинуть стол")
+@text_commands.command("🚪 Покинуть стол")
 async def leave_table(message: Message, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     current_table_id = data.get("current_table_id")
@@ -272,7 +260,95 @@ async def leave_table(message: Message, state: FSMContext, session: AsyncSession
         )
 
 
-@router.message(F.text == "🏠 Главное меню")
+@text_commands.command("🔒 Закрыть стол")
+async def close_table(message: Message, state: FSMContext, session: AsyncSession):
+    data = await state.get_data()
+    current_table_id = data.get("current_table_id")
+
+    if not current_table_id:
+        await message.answer(
+            "Сначала выберите стол из списка 'Мои столы'",
+            reply_markup=get_main_menu_keyboard()
+        )
+        return
+
+    from sqlalchemy import select
+    from bot.dao.models import User
+
+    result = await session.execute(
+        select(User).filter_by(telegram_id=message.from_user.id)
+    )
+    user = result.scalar_one_or_none()
+
+    if not user:
+        await message.answer("Ошибка: пользователь не найден. Используйте /start")
+        return
+
+    vote = await TableClosingUseCase(session).agree_to_close(current_table_id, user.id)
+
+    if vote is None:
+        await state.clear()
+        await message.answer(
+            "❌ Не удалось закрыть стол. Возможно, вы уже не являетесь участником.",
+            reply_markup=get_main_menu_keyboard()
+        )
+        return
+
+    if not vote.closed:
+        await message.answer(
+            f"✅ Вы согласились закрыть стол.\n\n"
+            f"Согласны {vote.agreed} из {vote.total} участников. "
+            f"Стол закроется, когда согласятся все."
+        )
+        return
+
+    result = await session.execute(select(User).filter(User.id.in_(vote.balances)))
+    names = {
+        u.id: u.first_name or u.username or f"User {u.telegram_id}"
+        for u in result.scalars().all()
+    }
+    text = "🔒 Все участники согласились, стол закрыт.\n\nИтоговые балансы:\n"
+    for user_id, amount in sorted(vote.balances.items(), key=lambda x: x[1], reverse=True):
+        text += f"• {names.get(user_id, f'User {user_id}')}: {_format_amount(amount)}\n"
+
+    await state.clear()
+    await message.answer(text, reply_markup=get_main_menu_keyboard())
+
+
+@router.callback_query(F.data == "rotate_invite")
+async def rotate_invite(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    data = await state.get_data()
+    current_table_id = data.get("current_table_id")
+
+    if not current_table_id:
+        await callback.answer("Сначала выберите стол из списка 'Мои столы'", show_alert=True)
+        return
+
+    from sqlalchemy import select
+    from bot.dao.models import TableUser, User
+
+    result = await session.execute(
+        select(TableUser.id)
+        .join(User, User.id == TableUser.user_id)
+        .filter(TableUser.table_id == current_table_id, User.telegram_id == callback.from_user.id)
+    )
+    if result.scalar_one_or_none() is None:
+        await callback.answer("Вы не участник этого стола", show_alert=True)
+        return
+
+    invite_code = await InviteCodeUseCase(session).rotate(current_table_id)
+    invite_link = await get_invite_link(callback.bot, invite_code)
+
+    await callback.message.answer(
+        f"🔄 Старый код больше не действует.\n\n"
+        f"🔑 Новый код приглашения: <code>{invite_code}</code>\n\n"
+        f"🔗 Ссылка для присоединения:\n{invite_link}",
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@text_commands.command("🏠 Главное меню")
 async def main_menu(message: Message, state: FSMContext):
     await state.clear()
     await message.answer(
@@ -0,0 +1,96 @@
+import pytest
+from unittest.mock import AsyncMock
+from aiogram.filters import CommandObject
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Message
+
+from bot.adapters.handlers.admin_handler import cmd_profile, cmd_perf
+from bot.infrastructure.profiling import SamplingProfiler
+
+
+@pytest.fixture
+def message_mock():
+    msg = AsyncMock(spec=Message)
+    msg.answer = AsyncMock()
+    return msg
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    profiler = SamplingProfiler(str(tmp_path))
+    yield profiler
+    profiler.disable()
+
+
+@pytest.mark.asyncio
+async def test_profile_on_and_off(message_mock, profiler):
+    await cmd_profile(message_mock, CommandObject(command="profile", args="on"), profiler)
+    assert profiler.enabled
+    assert "включён" in message_mock.answer.call_args.args[0]
+
+    await cmd_profile(message_mock, CommandObject(command="profile", args="off"), profiler)
+    assert not profiler.enabled
+    assert "выключен" in message_mock.answer.call_args.args[0]
+
+
+@pytest.mark.asyncio
+async def test_profile_rejects_unknown_action(message_mock, profiler):
+    await cmd_profile(message_mock, CommandObject(command="profile", args="maybe"), profiler)
+
+    assert not profiler.enabled
+    message_mock.answer.assert_called_once_with("Использование: /profile on | off")
+
+
+@pytest.mark.asyncio
+async def test_perf_reports_latency_fsm_and_caches(message_mock, monkeypatch):
+    from aiogram.fsm.storage.base import StorageKey
+    from bot.adapters.handlers import admin_handler
+    from bot.infrastructure.metrics import Histogram, Counter
+
+    latency = Histogram("latency", "", ("handler",))
+    for _ in range(9):
+        latency.observe(0.02, "view_balance")
+    latency.observe(2.0, "calculate_debts")
+    cache = Counter("cache", "", ("cache", "result"))
+    cache.inc("invite_codes", "hit", amount=3)
+    cache.inc("invite_codes", "miss")
+    monkeypatch.setattr(admin_handler, "handler_latency", latency)
+    monkeypatch.setattr(admin_handler.diagnostics, "cache_requests", cache)
+
+    storage = MemoryStorage()
+    await storage.set_state(StorageKey(bot_id=1, chat_id=1, user_id=1), "ExpenseStates:choosing_type")
+    await storage.get_data(StorageKey(bot_id=1, chat_id=2, user_id=2))
+
+    await cmd_perf(message_mock, CommandObject(command="perf"), storage)
+
+    text = message_mock.answer.call_args.args[0]
+    assert "Обновлений: 10" in text
+    assert "FSM-контекстов в памяти: 1" in text
+    assert "calculate_debts: " in text.split("Медленные обработчики")[1].splitlines()[1]
+    assert "invite_codes: 75% попаданий из 4" in text
+
+
+@pytest.mark.asyncio
+async def test_perf_memory_snapshot_starts_tracing_on_demand(message_mock):
+    import tracemalloc
+
+    try:
+        await cmd_perf(message_mock, CommandObject(command="perf", args="mem"), MemoryStorage())
+        assert tracemalloc.is_tracing()
+        assert "включена" in message_mock.answer.call_args.args[0]
+
+        await cmd_perf(message_mock, CommandObject(command="perf", args="mem"), MemoryStorage())
+        assert "Топ аллокаций" in message_mock.answer.call_args.args[0]
+    finally:
+        await cmd_perf(message_mock, CommandObject(command="perf", args="mem off"), MemoryStorage())
+    assert not tracemalloc.is_tracing()
+
+
+@pytest.mark.asyncio
+async def test_perf_memory_snapshot_escapes_file_names(message_mock, monkeypatch):
+    from bot.adapters.handlers import admin_handler
+    monkeypatch.setattr(admin_handler.diagnostics, "memory_top", lambda: ["<frozen abc>:12 — 1.0 KiB в 3 блоках"])
+
+    await cmd_perf(message_mock, CommandObject(command="perf", args="mem"), MemoryStorage())
+
+    assert "&lt;frozen abc&gt;:12" in message_mock.answer.call_args.args[0]
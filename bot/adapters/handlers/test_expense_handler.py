@@ -1,27 +1,24 @@
+import asyncio
 import pytest
 import pytest_asyncio
 from unittest.mock import AsyncMock
-from aiogram.types import Message, CallbackQuery, User
+from aiogram.types import Message, CallbackQuery, User, Chat
 from aiogram.fsm.context import FSMContext
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 
 from bot.adapters.states import ExpenseStates
-from bot.dao.database import Base
-from bot.dao.models import User as UserModel, DiningTable, TableUser, Item, TableItem, UserItemConsumption
+from bot.dao.models import User as UserModel, DiningTable, TableUser, Item, TableItem, Transaction, UserItemConsumption
 from bot.use_cases.expense_use_cases import ExpenseUseCase
+from bot.adapters.handlers import expense_handler
 from bot.adapters.handlers.expense_handler import *
+from bot.adapters.throttling import MarkupEditThrottler
+from bot.infrastructure.query_budget import query_budget
 
 @pytest_asyncio.fixture
-async def async_session():
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:", echo=False, future=True)
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    async_session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
-    async with async_session_factory() as session:
-        yield session
-    await engine.dispose()
+async def async_session(db_session):
+    return db_session
 
 @pytest_asyncio.fixture
 def fsm_mock():
@@ -36,11 +33,19 @@ def fsm_mock():
 def message_mock():
     msg = AsyncMock(spec=Message)
     msg.from_user = User(id=1, is_bot=False, first_name="TestUser")
+    msg.chat = Chat(id=1, type="private")
+    msg.message_id = 1
     msg.answer = AsyncMock()
     msg.edit_text = AsyncMock()
     msg.edit_reply_markup = AsyncMock()
     return msg
 
+@pytest.fixture(autouse=True)
+def markup_throttler(monkeypatch):
+    throttler = MarkupEditThrottler()
+    monkeypatch.setattr(expense_handler, "participants_markup_throttler", throttler)
+    return throttler
+
 @pytest_asyncio.fixture
 def callback_mock(message_mock):
     cb = AsyncMock(spec=CallbackQuery)
@@ -173,16 +178,102 @@ async def test_split_custom_selected(callback_mock, fsm_mock, setup_table):
 async def test_toggle_participant(callback_mock, fsm_mock, setup_table):
     users, table = setup_table
     fsm_mock.get_data.return_value = {
-        "selected_participants": [users[0].id],
+        "participants_mask": "1",
         "table_users": [(u.id, u.first_name) for u in users]
     }
-    callback_mock.data = f"participant_{users[1].id}"
+    callback_mock.data = "pp:t:1"
     callback_mock.message.edit_reply_markup = AsyncMock()
     await toggle_participant(callback_mock, fsm_mock)
-    fsm_mock.update_data.assert_awaited()
+    fsm_mock.update_data.assert_awaited_with(participants_mask="3")
     callback_mock.message.edit_reply_markup.assert_awaited()
 
 
+@pytest.mark.asyncio
+async def test_toggle_participant_coalesces_edits(callback_mock, fsm_mock, setup_table, markup_throttler):
+    users, table = setup_table
+    table_users = [(u.id, u.first_name) for u in users]
+    callback_mock.message.edit_reply_markup = AsyncMock()
+
+    for index in range(len(users)):
+        fsm_mock.get_data.return_value = {"participants_mask": "0", "table_users": table_users}
+        callback_mock.data = f"pp:t:{index}"
+        await toggle_participant(callback_mock, fsm_mock)
+
+    assert callback_mock.message.edit_reply_markup.await_count == 1
+    await asyncio.sleep(markup_throttler.interval + 0.1)
+    assert callback_mock.message.edit_reply_markup.await_count == 2
+
+    last_markup = callback_mock.message.edit_reply_markup.call_args.kwargs["reply_markup"]
+    assert last_markup.inline_keyboard[2][0].text.startswith("✅")
+
+
+@pytest.mark.asyncio
+async def test_abandoned_pickers_are_not_kept_by_throttler():
+    throttler = MarkupEditThrottler(interval=0.05)
+    for message_id in range(3):
+        await throttler.submit((1, message_id), AsyncMock())
+
+    await asyncio.sleep(throttler.interval + 0.01)
+    await throttler.submit((1, 99), AsyncMock())
+
+    assert list(throttler._last_sent) == [(1, 99)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("action, expected", [
+    ("pp:all", "7"),
+    ("pp:none", "0"),
+    ("pp:inv", "6"),
+])
+async def test_bulk_toggle_participants(callback_mock, fsm_mock, setup_table, action, expected):
+    users, table = setup_table
+    fsm_mock.get_data.return_value = {
+        "participants_mask": "1",
+        "table_users": [(u.id, u.first_name) for u in users]
+    }
+    callback_mock.data = action
+    callback_mock.message.edit_reply_markup = AsyncMock()
+    await bulk_toggle_participants(callback_mock, fsm_mock)
+    fsm_mock.update_data.assert_awaited_with(participants_mask=expected)
+    callback_mock.message.edit_reply_markup.assert_awaited()
+
+
+@pytest.mark.asyncio
+async def test_bulk_toggle_respects_search_view(callback_mock, fsm_mock, setup_table):
+    users, table = setup_table
+    fsm_mock.get_data.return_value = {
+        "participants_mask": "1",
+        "participants_view": [2],
+        "table_users": [(u.id, u.first_name) for u in users]
+    }
+    callback_mock.data = "pp:all"
+    await bulk_toggle_participants(callback_mock, fsm_mock)
+    fsm_mock.update_data.assert_awaited_with(participants_mask="5")
+
+
+@pytest.mark.asyncio
+async def test_search_participants_filters_by_prefix(message_mock, fsm_mock):
+    table_users = [(i, f"Guest{i}") for i in range(20)] + [(100, "Anna")]
+    fsm_mock.get_data.return_value = {"participants_mask": "0", "table_users": table_users}
+    message_mock.text = "an"
+    await search_participants(message_mock, fsm_mock)
+    fsm_mock.update_data.assert_awaited_with(participants_view=[20], participants_page=0)
+    markup = message_mock.answer.call_args.kwargs["reply_markup"]
+    assert markup.inline_keyboard[0][0].callback_data == "pp:t:20"
+
+
+@pytest.mark.asyncio
+async def test_participants_done_uses_mask(callback_mock, fsm_mock, setup_table):
+    users, table = setup_table
+    fsm_mock.get_data.return_value = {
+        "participants_mask": "5",
+        "table_users": [(u.id, u.first_name) for u in users]
+    }
+    await participants_done(callback_mock, fsm_mock)
+    fsm_mock.update_data.assert_awaited_with(selected_participants=[users[0].id, users[2].id])
+    fsm_mock.set_state.assert_awaited_with(ExpenseStates.entering_ratios)
+
+
 @pytest.mark.asyncio
 async def test_participants_done_no_selection(callback_mock, fsm_mock, setup_table):
     _, table = setup_table
@@ -237,6 +328,7 @@ async def test_view_balance(async_session, message_mock, fsm_mock, setup_table):
 async def test_view_participants(async_session, message_mock, fsm_mock, setup_table):
     users, table = setup_table
     fsm_mock.get_data.return_value = {"current_table_id": table.id}
+    message_mock.bot.me = AsyncMock(return_value=AsyncMock(username="BotTest"))
     await view_participants(message_mock, fsm_mock, async_session)
     message_mock.answer.assert_awaited()
 
@@ -255,3 +347,53 @@ async def test_view_operations_history_empty(async_session, message_mock, fsm_mo
     fsm_mock.get_data.return_value = {"current_table_id": table.id}
     await view_operations_history(message_mock, fsm_mock, async_session)
     message_mock.answer.assert_awaited()
+
+
+@pytest.mark.asyncio
+async def test_view_operations_history_query_budget(async_session, message_mock, fsm_mock, setup_table):
+    users, table = setup_table
+    expense_use_case = ExpenseUseCase(async_session)
+    for i in range(5):
+        await expense_use_case.add_expense(
+            table.id, f"Item {i}", 100, [u.id for u in users], created_by_id=users[0].id
+        )
+    fsm_mock.get_data.return_value = {"current_table_id": table.id}
+
+    with query_budget(async_session, 3, "view_operations_history"):
+        await view_operations_history(message_mock, fsm_mock, async_session)
+
+    message_mock.answer.assert_awaited()
+
+
+@pytest.mark.asyncio
+async def test_calculate_debts_handler_query_budget(async_session, message_mock, fsm_mock, setup_table):
+    users, table = setup_table
+    expense_use_case = ExpenseUseCase(async_session)
+    await expense_use_case.add_expense(table.id, "Pizza", 900, [u.id for u in users])
+    await expense_use_case.add_expense(table.id, "Bill", 900, [users[0].id], is_income=True)
+    fsm_mock.get_data.return_value = {"current_table_id": table.id}
+
+    with query_budget(async_session, 3, "calculate_debts_handler"):
+        await calculate_debts_handler(message_mock, fsm_mock, async_session)
+
+    assert "Всего переводов: 2" in message_mock.answer.call_args[0][0]
+
+
+@pytest.mark.asyncio
+async def test_payment_amount_entered_records_transaction(async_session, message_mock, fsm_mock, setup_table):
+    users, table = setup_table
+    expense_use_case = ExpenseUseCase(async_session)
+    await expense_use_case.add_expense(table.id, "Pizza", 900, [u.id for u in users])
+    await expense_use_case.add_expense(table.id, "Bill", 900, [users[1].id], is_income=True)
+    message_mock.text = "3"
+    fsm_mock.get_data.return_value = {
+        "current_table_id": table.id, "selected_creditor_id": users[1].id, "max_amount": 300
+    }
+
+    await payment_amount_entered(message_mock, fsm_mock, async_session)
+
+    result = await async_session.execute(select(Transaction))
+    transaction = result.scalar_one()
+    assert (transaction.user_id_from, transaction.user_id_to, transaction.amount) == (users[0].id, users[1].id, 300)
+    assert await expense_use_case.calculate_debts(table.id) == [(users[2].id, users[1].id, 300)]
+    assert "записано" in message_mock.answer.call_args[0][0]
@@ -0,0 +1,70 @@
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock
+from aiogram.types import Message, CallbackQuery, User
+from aiogram.fsm.context import FSMContext
+
+from bot.dao.models import User as UserModel
+from bot.adapters.handlers.settlement_handler import settle_all_paid, settle_all_start
+from bot.use_cases.expense_use_cases import ExpenseUseCase
+from bot.use_cases.table_use_cases import TableUseCase
+
+
+@pytest_asyncio.fixture
+def fsm_mock():
+    state = AsyncMock(spec=FSMContext)
+    state.get_data = AsyncMock(return_value={})
+    state.update_data = AsyncMock()
+    return state
+
+
+@pytest_asyncio.fixture
+def message_mock():
+    msg = AsyncMock(spec=Message)
+    msg.from_user = User(id=1, is_bot=False, first_name="Alice")
+    msg.answer = AsyncMock()
+    msg.edit_text = AsyncMock()
+    return msg
+
+
+@pytest_asyncio.fixture
+def callback_mock(message_mock):
+    cb = AsyncMock(spec=CallbackQuery)
+    cb.from_user = User(id=1, is_bot=False, first_name="Alice")
+    cb.message = message_mock
+    cb.answer = AsyncMock()
+    return cb
+
+
+@pytest_asyncio.fixture
+async def cancelling_tables(db_session):
+    alice, bob = UserModel(telegram_id=1, first_name="Alice"), UserModel(telegram_id=2, first_name="Bob")
+    db_session.add_all([alice, bob])
+    await db_session.commit()
+    usecase = ExpenseUseCase(db_session)
+    # Боб должен Алисе 100 в одном столе, Алиса Бобу 100 в другом
+    for name, payer in (("Breakfast", alice), ("Lunch", bob)):
+        table_id, _ = await TableUseCase(db_session).create_table(name, alice.id)
+        await TableUseCase(db_session).join_table(table_id, bob.id)
+        await usecase.add_expense(table_id, "Food", 200, [alice.id, bob.id])
+        await usecase.add_expense(table_id, "Bill", 200, [payer.id], is_income=True)
+
+
+def _buttons(markup):
+    return [button.callback_data for row in markup.inline_keyboard for button in row]
+
+
+@pytest.mark.asyncio
+async def test_debts_that_cancel_out_are_offered_as_an_offset(
+    message_mock, callback_mock, fsm_mock, db_session, cancelling_tables
+):
+    await settle_all_start(message_mock, fsm_mock, db_session)
+
+    assert "Вы ⇄ Bob" in message_mock.answer.call_args.args[0]
+    assert _buttons(message_mock.answer.call_args.kwargs["reply_markup"]) == ["settle_all_paid", "settle_all_cancel"]
+
+    fsm_mock.get_data.return_value = {"settle_all": fsm_mock.update_data.call_args.kwargs["settle_all"]}
+    await settle_all_paid(callback_mock, fsm_mock, db_session)
+
+    message_mock.edit_text.assert_awaited_once_with("✅ Погашения записаны в 2 столах!")
+    fsm_mock.update_data.assert_awaited_with(settle_all=None)
@@ -3,24 +3,17 @@ import pytest_asyncio
 from unittest.mock import AsyncMock
 from aiogram.types import Message, User
 from aiogram.fsm.context import FSMContext
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from bot.adapters.handlers.start_handler import cmd_start, cmd_help, back_to_main_menu
-from bot.dao.database import Base
 from bot.dao.models import User as UserModel, DiningTable, TableUser
+from bot.domain.entities import JoinResult, JoinStatus, TableEntity
 from bot.use_cases.user_use_cases import UserUseCase
 
 @pytest_asyncio.fixture
-async def async_session():
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:", echo=False, future=True)
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    async_session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
-    async with async_session_factory() as session:
-        yield session
-    await engine.dispose()
+async def async_session(db_session):
+    return db_session
 
 
 @pytest_asyncio.fixture
@@ -69,8 +62,7 @@ async def test_cmd_start_with_join_success(message_mock, fsm_mock, async_session
 
     from bot.adapters.handlers import start_handler
     table_use_case_mock = AsyncMock()
-    table_use_case_mock.get_table_by_code = AsyncMock(return_value=table)
-    table_use_case_mock.join_table = AsyncMock()
+    table_use_case_mock.join_by_code = AsyncMock(return_value=JoinResult(JoinStatus.JOINED, TableEntity("Table1", table.id)))
     monkeypatch.setattr(start_handler, "TableUseCase", lambda session: table_use_case_mock)
 
     message_mock.text = "/start join_INV123"
@@ -84,7 +76,7 @@ async def test_cmd_start_with_join_table_not_found(message_mock, fsm_mock, async
     monkeypatch.setattr(UserUseCase, "get_or_create_user", AsyncMock())
     from bot.adapters.handlers import start_handler
     table_use_case_mock = AsyncMock()
-    table_use_case_mock.get_table_by_code = AsyncMock(return_value=None)
+    table_use_case_mock.join_by_code = AsyncMock(return_value=JoinResult(JoinStatus.TABLE_NOT_FOUND))
     monkeypatch.setattr(start_handler, "TableUseCase", lambda session: table_use_case_mock)
 
     message_mock.text = "/start join_INV999"
@@ -105,7 +97,9 @@ async def test_cmd_start_with_join_already_member(message_mock, fsm_mock, async_
     monkeypatch.setattr(UserUseCase, "get_or_create_user", AsyncMock())
     from bot.adapters.handlers import start_handler
     table_use_case_mock = AsyncMock()
-    table_use_case_mock.get_table_by_code = AsyncMock(return_value=table)
+    table_use_case_mock.join_by_code = AsyncMock(
+        return_value=JoinResult(JoinStatus.ALREADY_MEMBER, TableEntity("Table1", table.id))
+    )
     monkeypatch.setattr(start_handler, "TableUseCase", lambda session: table_use_case_mock)
 
     message_mock.text = "/start join_INV123"
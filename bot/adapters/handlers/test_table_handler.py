@@ -3,23 +3,17 @@ import pytest_asyncio
 from unittest.mock import AsyncMock
 from aiogram.types import Message, CallbackQuery, User
 from aiogram.fsm.context import FSMContext
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.adapters.states import TableStates
-from bot.dao.database import Base
 from bot.dao.models import User as UserModel, DiningTable, TableUser
+from bot.domain.entities import TableBalanceEntity, TableEntity
 from bot.adapters.handlers.table_handler import *
 
 @pytest_asyncio.fixture
-async def async_session():
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:", echo=False, future=True)
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    async_session_factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
-    async with async_session_factory() as session:
-        yield session
-    await engine.dispose()
+async def async_session(db_session):
+    return db_session
 
 
 @pytest_asyncio.fixture
@@ -74,10 +68,10 @@ async def test_create_table_finish_cancel(message_mock, fsm_mock, async_session)
 
 
 @pytest.mark.asyncio
-async def test_create_table_finish_success(message_mock, fsm_mock, async_session, setup_user_and_table):
+async def test_create_table_finish_success(message_mock, fsm_mock, async_session, setup_user_and_table, monkeypatch):
     user, _ = setup_user_and_table
     message_mock.text = "New Table"
-    TableUseCase.create_table = AsyncMock(return_value=(1, "INV999"))
+    monkeypatch.setattr(TableUseCase, "create_table", AsyncMock(return_value=(1, "INV999")))
     message_mock.bot.me = AsyncMock(return_value=AsyncMock(username="BotTest"))
 
     await create_table_finish(message_mock, fsm_mock, async_session)
@@ -101,54 +95,58 @@ async def test_join_table_finish_cancel(message_mock, fsm_mock, async_session):
 
 
 @pytest.mark.asyncio
-async def test_join_table_finish_success(message_mock, fsm_mock, async_session, setup_user_and_table):
+async def test_join_table_finish_success(message_mock, fsm_mock, async_session, setup_user_and_table, monkeypatch):
     user, table = setup_user_and_table
-    message_mock.text = "INV123"
-    TableUseCase.get_table_by_code = AsyncMock(return_value=table)
-    TableUseCase.join_table = AsyncMock()
+    message_mock.text = "inv123"
 
     await join_table_finish(message_mock, fsm_mock, async_session)
     fsm_mock.clear.assert_awaited()
-    message_mock.answer.assert_awaited()
+    assert "Table1" in message_mock.answer.call_args.args[0]
+    assert await async_session.scalar(select(TableUser.id).filter_by(table_id=table.id, user_id=user.id))
 
 
 @pytest.mark.asyncio
-async def test_my_tables_no_tables(message_mock, async_session, setup_user_and_table):
+async def test_my_tables_no_tables(message_mock, async_session, setup_user_and_table, monkeypatch):
     user, _ = setup_user_and_table
-    TableUseCase.get_user_tables = AsyncMock(return_value=[])
+    monkeypatch.setattr(TableUseCase, "get_user_tables_balances", AsyncMock(return_value=[]))
     await my_tables(message_mock, async_session)
     message_mock.answer.assert_awaited()
 
 
 @pytest.mark.asyncio
-async def test_my_tables_with_tables(message_mock, async_session, setup_user_and_table):
+async def test_my_tables_with_tables(message_mock, async_session, setup_user_and_table, monkeypatch):
     user, table = setup_user_and_table
-    TableUseCase.get_user_tables = AsyncMock(return_value=[table])
+    monkeypatch.setattr(TableUseCase, "get_user_tables_balances",
+                        AsyncMock(return_value=[TableBalanceEntity(table=TableEntity(name=table.name, id=table.id), balance=-1250)]))
     await my_tables(message_mock, async_session)
     message_mock.answer.assert_awaited()
+    assert "Вы должны: 12.50 ₽" in message_mock.answer.call_args.args[0]
+    markup = message_mock.answer.call_args.kwargs["reply_markup"]
+    assert markup.inline_keyboard[0][0].text == "🍽️ Table1 · -12.50 ₽"
 
 
 @pytest.mark.asyncio
-async def test_select_table(callback_mock, fsm_mock):
+async def test_select_table(callback_mock, fsm_mock, async_session):
     callback_mock.data = "table_1"
-    await select_table(callback_mock, fsm_mock)
+    await select_table(callback_mock, fsm_mock, async_session)
     fsm_mock.update_data.assert_awaited()
     callback_mock.message.edit_text.assert_awaited()
     callback_mock.message.answer.assert_awaited()
 
 
 @pytest.mark.asyncio
-async def test_back_to_tables_no_tables(message_mock, fsm_mock, async_session, setup_user_and_table):
+async def test_back_to_tables_no_tables(message_mock, fsm_mock, async_session, setup_user_and_table, monkeypatch):
     user, _ = setup_user_and_table
-    TableUseCase.get_user_tables = AsyncMock(return_value=[])
+    monkeypatch.setattr(TableUseCase, "get_user_tables_balances", AsyncMock(return_value=[]))
     await back_to_tables(message_mock, fsm_mock, async_session)
     message_mock.answer.assert_awaited()
 
 
 @pytest.mark.asyncio
-async def test_back_to_tables_with_tables(message_mock, fsm_mock, async_session, setup_user_and_table):
+async def test_back_to_tables_with_tables(message_mock, fsm_mock, async_session, setup_user_and_table, monkeypatch):
     user, table = setup_user_and_table
-    TableUseCase.get_user_tables = AsyncMock(return_value=[table])
+    monkeypatch.setattr(TableUseCase, "get_user_tables_balances",
+                        AsyncMock(return_value=[TableBalanceEntity(table=TableEntity(name=table.name, id=table.id), balance=-1250)]))
     await back_to_tables(message_mock, fsm_mock, async_session)
     message_mock.answer.assert_awaited()
 
@@ -158,3 +156,32 @@ async def test_main_menu(message_mock, fsm_mock):
     await main_menu(message_mock, fsm_mock)
     fsm_mock.clear.assert_awaited()
     message_mock.answer.assert_awaited()
+
+
+@pytest.mark.asyncio
+async def test_close_table_by_last_member_shows_final_balances(message_mock, fsm_mock, async_session,
+                                                               setup_user_and_table):
+    user, table = setup_user_and_table
+    async_session.add(TableUser(table_id=table.id, user_id=user.id))
+    await async_session.commit()
+    fsm_mock.get_data = AsyncMock(return_value={"current_table_id": table.id})
+
+    await close_table(message_mock, fsm_mock, async_session)
+
+    fsm_mock.clear.assert_awaited()
+    assert "стол закрыт" in message_mock.answer.call_args.args[0]
+
+
+@pytest.mark.asyncio
+async def test_rotate_invite_sends_new_code(callback_mock, fsm_mock, async_session, setup_user_and_table):
+    user, table = setup_user_and_table
+    async_session.add(TableUser(table_id=table.id, user_id=user.id))
+    await async_session.commit()
+    fsm_mock.get_data = AsyncMock(return_value={"current_table_id": table.id})
+    callback_mock.bot.me = AsyncMock(return_value=AsyncMock(username="BotTest"))
+
+    await rotate_invite(callback_mock, fsm_mock, async_session)
+
+    await async_session.refresh(table)
+    assert table.invite_code != "INV123"
+    assert table.invite_code in callback_mock.message.answer.call_args.args[0]
@@ -1,34 +1,48 @@
+from types import MappingProxyType
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 
+from bot.adapters import participant_picker as picker
 
-def get_main_menu_keyboard():
+
+def _build_main_menu_keyboard():
     keyboard = [
         [KeyboardButton(text="🍽️ Мои столы")],
         [KeyboardButton(text="➕ Создать стол"), KeyboardButton(text="🔗 Присоединиться к столу")],
+        [KeyboardButton(text="🤝 Рассчитаться по всем столам")],
     ]
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
 
 
-def get_table_menu_keyboard():
+def _build_table_menu_keyboard():
     keyboard = [
         [KeyboardButton(text="➕ Добавить расход")],
         [KeyboardButton(text="💰 Посмотреть баланс"), KeyboardButton(text="👥 Участники")],
         [KeyboardButton(text="💳 Посчитать долги"), KeyboardButton(text="📊 Статистика")],
         [KeyboardButton(text="💸 Погасить долг"), KeyboardButton(text="📋 История операций")],
-        [KeyboardButton(text="🚪 Покинуть стол")],
+        [KeyboardButton(text="🔒 Закрыть стол"), KeyboardButton(text="🚪 Покинуть стол")],
         [KeyboardButton(text="🏠 Главное меню")],
     ]
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
 
 
-def get_cancel_keyboard():
+def _build_cancel_keyboard():
     keyboard = [
         [KeyboardButton(text="❌ Отмена")],
     ]
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
 
 
-def get_transaction_type_keyboard():
+def _build_yes_no_keyboard():
+    return ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text="Да"), KeyboardButton(text="Нет")]
+        ],
+        resize_keyboard=True
+    )
+
+
+def _build_transaction_type_keyboard():
     keyboard = [
         [
             InlineKeyboardButton(text="💸 Расход", callback_data="expense"),
@@ -38,7 +52,7 @@ def get_transaction_type_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def get_split_method_keyboard():
+def _build_split_method_keyboard():
     """Keyboard for selecting how to split the amount"""
     keyboard = [
         [InlineKeyboardButton(text="👤 Только на меня", callback_data="split_me")],
@@ -48,26 +62,102 @@ def get_split_method_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def get_participants_keyboard(table_users, selected_ids):
+def _build_invite_keyboard():
+    keyboard = [
+        [InlineKeyboardButton(text="🔄 Новый код приглашения", callback_data="rotate_invite")],
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+# Keyboards that never change are built once at import; markup models are
+# frozen, so the same instance is safely shared between replies.
+STATIC_KEYBOARDS = MappingProxyType({
+    "main_menu": _build_main_menu_keyboard(),
+    "table_menu": _build_table_menu_keyboard(),
+    "cancel": _build_cancel_keyboard(),
+    "yes_no": _build_yes_no_keyboard(),
+    "transaction_type": _build_transaction_type_keyboard(),
+    "split_method": _build_split_method_keyboard(),
+    "invite": _build_invite_keyboard(),
+})
+
+
+def get_main_menu_keyboard():
+    return STATIC_KEYBOARDS["main_menu"]
+
+
+def get_table_menu_keyboard():
+    return STATIC_KEYBOARDS["table_menu"]
+
+
+def get_cancel_keyboard():
+    return STATIC_KEYBOARDS["cancel"]
+
+
+def get_yes_no_keyboard():
+    return STATIC_KEYBOARDS["yes_no"]
+
+
+def get_transaction_type_keyboard():
+    return STATIC_KEYBOARDS["transaction_type"]
+
+
+def get_split_method_keyboard():
+    return STATIC_KEYBOARDS["split_method"]
+
+
+def get_settle_all_keyboard(pays: bool, offsets: bool, receives: bool):
+    """Confirm buttons for the parts of a settlement across tables that the user has"""
+    keyboard = []
+    if pays:
+        keyboard.append([InlineKeyboardButton(text="✅ Я перевёл", callback_data="settle_all_paid")])
+    elif offsets:
+        keyboard.append([InlineKeyboardButton(text="🤝 Записать взаимозачёт", callback_data="settle_all_paid")])
+    if receives:
+        keyboard.append([InlineKeyboardButton(text="📥 Мне перевели", callback_data="settle_all_received")])
+    keyboard.append([InlineKeyboardButton(text="❌ Отмена", callback_data="settle_all_cancel")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def get_invite_keyboard():
+    return STATIC_KEYBOARDS["invite"]
+
+
+def get_participants_keyboard(table_users, mask, page=0, view=None):
     """
-    Keyboard for selecting participants
+    Paginated keyboard for selecting participants
     
     Args:
         table_users: List of tuples (user_id, user_name)
-        selected_ids: List of selected user IDs
+        mask: Bitset of selected roster indices
+        page: Page number to render
+        view: Roster indices matching the search prefix, None for the whole roster
     """
     keyboard = []
     
-    for user_id, user_name in table_users:
-        is_selected = user_id in selected_ids
-        button_text = f"{'✅' if is_selected else '☐'} {user_name}"
+    for index in picker.page_indices(view, len(table_users), page):
+        _, user_name = table_users[index]
+        button_text = f"{'✅' if picker.is_selected(mask, index) else '☐'} {user_name}"
         keyboard.append([
             InlineKeyboardButton(
                 text=button_text,
-                callback_data=f"participant_{user_id}"
+                callback_data=f"{picker.TOGGLE}{index}"
             )
         ])
     
+    pages = picker.page_count(view, len(table_users))
+    if pages > 1:
+        keyboard.append([
+            InlineKeyboardButton(text="◀️", callback_data=f"{picker.PAGE}{(page - 1) % pages}"),
+            InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=picker.NOOP),
+            InlineKeyboardButton(text="▶️", callback_data=f"{picker.PAGE}{(page + 1) % pages}"),
+        ])
+    
+    keyboard.append([
+        InlineKeyboardButton(text="☑️ Все", callback_data=picker.SELECT_ALL),
+        InlineKeyboardButton(text="⬜ Никого", callback_data=picker.SELECT_NONE),
+        InlineKeyboardButton(text="🔄 Инвертировать", callback_data=picker.INVERT),
+    ])
     keyboard.append([
         InlineKeyboardButton(text="✔️ Готово", callback_data="participants_done")
     ])
@@ -94,13 +184,6 @@ def get_tables_inline_keyboard(tables_list):
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
-def get_yes_no_keyboard():
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="Да"), KeyboardButton(text="Нет")]
-        ],
-        resize_keyboard=True
-    )
 
 def get_creditors_keyboard(creditors):
     keyboard = []
@@ -0,0 +1,96 @@
+"""
+Selection state for the participant picker.
+
+The selection is kept as a bitset over roster indices (bit i is set when
+``table_users[i]`` is selected) and stored in FSM data as a hex string,
+so a toggle never has to carry user ids in callback data.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+
+PAGE_SIZE = 8
+
+CALLBACK_PREFIX = "pp"
+TOGGLE = f"{CALLBACK_PREFIX}:t:"
+PAGE = f"{CALLBACK_PREFIX}:p:"
+SELECT_ALL = f"{CALLBACK_PREFIX}:all"
+SELECT_NONE = f"{CALLBACK_PREFIX}:none"
+INVERT = f"{CALLBACK_PREFIX}:inv"
+NOOP = f"{CALLBACK_PREFIX}:noop"
+
+
+def encode_mask(mask: int) -> str:
+    return format(mask, "x")
+
+
+def decode_mask(value: Optional[str]) -> int:
+    return int(value, 16) if value else 0
+
+
+def is_selected(mask: int, index: int) -> bool:
+    return (mask >> index) & 1 == 1
+
+
+def toggle(mask: int, index: int) -> int:
+    return mask ^ (1 << index)
+
+
+def view_mask(view: Optional[Sequence[int]], roster_size: int) -> int:
+    """Bits of the indices currently shown (the whole roster when not filtered)."""
+    if view is None:
+        return (1 << roster_size) - 1
+    mask = 0
+    for index in view:
+        mask |= 1 << index
+    return mask
+
+
+def select_all(mask: int, visible: int) -> int:
+    return mask | visible
+
+
+def select_none(mask: int, visible: int) -> int:
+    return mask & ~visible
+
+
+def invert(mask: int, visible: int) -> int:
+    return mask ^ visible
+
+
+def selected_indices(mask: int) -> List[int]:
+    indices = []
+    index = 0
+    while mask:
+        if mask & 1:
+            indices.append(index)
+        mask >>= 1
+        index += 1
+    return indices
+
+
+def selected_user_ids(table_users: Sequence[Tuple[int, str]], mask: int) -> List[int]:
+    return [table_users[i][0] for i in selected_indices(mask) if i < len(table_users)]
+
+
+def filter_by_prefix(table_users: Sequence[Tuple[int, str]], prefix: str) -> Optional[List[int]]:
+    """Roster indices whose name starts with ``prefix``; ``None`` means no filter."""
+    prefix = prefix.strip().casefold()
+    if not prefix or prefix == "*":
+        return None
+    return [i for i, (_, name) in enumerate(table_users) if (name or "").casefold().startswith(prefix)]
+
+
+def page_count(view: Optional[Sequence[int]], roster_size: int) -> int:
+    size = roster_size if view is None else len(view)
+    return max(1, (size + PAGE_SIZE - 1) // PAGE_SIZE)
+
+
+def page_indices(view: Optional[Sequence[int]], roster_size: int, page: int) -> Sequence[int]:
+    start = page * PAGE_SIZE
+    if view is None:
+        return range(start, min(start + PAGE_SIZE, roster_size))
+    return view[start:start + PAGE_SIZE]
+
+
+def clamp_page(page: int, view: Optional[Sequence[int]], roster_size: int) -> int:
+    return min(max(page, 0), page_count(view, roster_size) - 1)
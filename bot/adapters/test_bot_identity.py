@@ -0,0 +1,21 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from bot.adapters import bot_identity
+from bot.adapters.keyboards import get_main_menu_keyboard, get_table_menu_keyboard, get_cancel_keyboard
+
+
+def test_static_keyboards_are_shared_instances():
+    assert get_main_menu_keyboard() is get_main_menu_keyboard()
+    assert get_table_menu_keyboard() is get_table_menu_keyboard()
+    assert get_cancel_keyboard() is get_cancel_keyboard()
+
+
+@pytest.mark.asyncio
+async def test_invite_link_uses_bot_username():
+    bot = MagicMock()
+    bot.me = AsyncMock(return_value=MagicMock(username="SplitBot"))
+
+    link = await bot_identity.get_invite_link(bot, "ABC123")
+
+    assert link == "https://t.me/SplitBot?start=join_ABC123"
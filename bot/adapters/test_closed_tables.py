@@ -0,0 +1,55 @@
+import pytest
+from unittest.mock import AsyncMock
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery, Message, User
+
+from bot.adapters.closed_tables import CLOSED_TABLE_TEXT, ClosedTableMiddleware
+from bot.adapters.handlers.table_handler import close_table
+from bot.dao.models import User as UserModel
+from bot.use_cases.closing_use_cases import TableClosingUseCase
+from bot.use_cases.ledger_use_cases import TableClosedError
+from bot.use_cases.table_use_cases import TableUseCase
+
+
+def _state(data):
+    state = AsyncMock(spec=FSMContext)
+    state.get_data = AsyncMock(return_value=data)
+    state.clear = AsyncMock()
+    return state
+
+
+@pytest.mark.asyncio
+async def test_close_vote_on_a_closed_table_is_answered(db_session):
+    user = UserModel(telegram_id=1, first_name="Alice")
+    db_session.add(user)
+    await db_session.commit()
+    table_id, _ = await TableUseCase(db_session).create_table("Dinner", user.id)
+    await TableClosingUseCase(db_session).agree_to_close(table_id, user.id)
+
+    message = AsyncMock(spec=Message)
+    message.from_user = User(id=1, is_bot=False, first_name="Alice")
+    message.answer = AsyncMock()
+    state = _state({"current_table_id": table_id})
+
+    await ClosedTableMiddleware()(
+        lambda event, data: close_table(event, data["state"], data["session"]),
+        message, {"state": state, "session": db_session}
+    )
+
+    assert message.answer.call_args.args[0] == CLOSED_TABLE_TEXT
+    state.clear.assert_awaited()
+
+
+@pytest.mark.asyncio
+async def test_callback_on_a_closed_table_gets_an_alert():
+    callback = AsyncMock(spec=CallbackQuery)
+    callback.answer = AsyncMock()
+    state = _state({})
+
+    async def handler(event, data):
+        raise TableClosedError("Стол закрыт")
+
+    await ClosedTableMiddleware()(handler, callback, {"state": state})
+
+    callback.answer.assert_awaited_with(CLOSED_TABLE_TEXT, show_alert=True)
+    state.clear.assert_awaited()
@@ -0,0 +1,50 @@
+from bot.adapters import participant_picker as picker
+from bot.adapters.keyboards import get_participants_keyboard
+
+
+def test_mask_roundtrip_and_indices():
+    mask = 0
+    for index in (0, 3, 130):
+        mask = picker.toggle(mask, index)
+
+    assert picker.decode_mask(picker.encode_mask(mask)) == mask
+    assert picker.selected_indices(mask) == [0, 3, 130]
+
+
+def test_bulk_operations_on_whole_roster():
+    visible = picker.view_mask(None, 4)
+
+    assert picker.select_all(0b0010, visible) == 0b1111
+    assert picker.select_none(0b0110, visible) == 0
+    assert picker.invert(0b0110, visible) == 0b1001
+
+
+def test_filter_by_prefix_is_case_insensitive():
+    table_users = [(1, "Alice"), (2, "bob"), (3, "alex"), (4, None)]
+
+    assert picker.filter_by_prefix(table_users, "AL") == [0, 2]
+    assert picker.filter_by_prefix(table_users, "*") is None
+    assert picker.filter_by_prefix(table_users, "  ") is None
+
+
+def test_keyboard_renders_single_page_of_large_roster():
+    table_users = [(1000 + i, f"User{i}") for i in range(500)]
+    mask = picker.toggle(0, 17)
+
+    markup = get_participants_keyboard(table_users, mask, page=2)
+    rows = markup.inline_keyboard
+    toggles = [row[0] for row in rows if row[0].callback_data.startswith(picker.TOGGLE)]
+
+    assert len(toggles) == picker.PAGE_SIZE
+    assert toggles[0].callback_data == f"{picker.TOGGLE}{2 * picker.PAGE_SIZE}"
+    assert toggles[1].text.startswith("✅")
+    assert rows[len(toggles)][1].text == f"3/{picker.page_count(None, 500)}"
+    assert all(len(button.callback_data.encode()) <= 64 for row in rows for button in row)
+
+
+def test_clamp_page_for_filtered_view():
+    view = list(range(10))
+
+    assert picker.page_count(view, 500) == 2
+    assert picker.clamp_page(5, view, 500) == 1
+    assert picker.clamp_page(-1, view, 500) == 0
@@ -0,0 +1,83 @@
+import pytest
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Chat, Message, Update, User
+
+from bot.adapters.text_commands import TextCommandRouter
+
+
+class SampleStates(StatesGroup):
+    waiting = State()
+
+
+def make_update(text: str, update_id: int = 1) -> Update:
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=Chat(id=1, type="private"),
+            from_user=User(id=1, is_bot=False, first_name="Test"),
+            text=text,
+        ),
+    )
+
+
+@pytest.fixture
+def bot():
+    return Bot(token="42:TEST")
+
+
+@pytest.mark.asyncio
+async def test_command_is_dispatched_with_injected_kwargs(bot):
+    commands = TextCommandRouter()
+    calls = []
+
+    @commands.command("🏠 Главное меню")
+    async def main_menu(message: Message, state, extra):
+        calls.append((message.text, extra))
+
+    dp = Dispatcher()
+    dp.include_router(commands)
+    await dp.feed_update(bot, make_update("🏠 Главное меню"), extra="value")
+
+    assert calls == [("🏠 Главное меню", "value")]
+
+
+@pytest.mark.asyncio
+async def test_unknown_text_falls_through_to_state_handlers(bot):
+    commands = TextCommandRouter()
+    handled = []
+
+    @commands.command("➕ Создать стол")
+    async def create_table(message: Message):
+        handled.append("command")
+
+    fallback = Router()
+
+    @fallback.message(SampleStates.waiting)
+    async def waiting_for_name(message: Message):
+        handled.append("state")
+
+    dp = Dispatcher()
+    dp.include_router(commands)
+    dp.include_router(fallback)
+    await dp.fsm.get_context(bot, chat_id=1, user_id=1).set_state(SampleStates.waiting)
+
+    await dp.feed_update(bot, make_update("Ужин в ресторане"))
+    await dp.feed_update(bot, make_update("➕ Создать стол", update_id=2))
+
+    assert handled == ["state", "command"]
+
+
+def test_duplicate_command_is_rejected():
+    commands = TextCommandRouter()
+    async def cancel(message: Message):
+        pass
+
+    commands.command("❌ Отмена")(cancel)
+
+    with pytest.raises(ValueError):
+        commands.command("❌ Отмена")(cancel)
@@ -0,0 +1,47 @@
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional, Union
+
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.types import Message
+
+
+class TextCommandRouter(Router):
+    """
+    Router for reply-keyboard buttons.
+
+    Every button text maps to its handler in a dict, so an update is matched
+    with one lookup instead of evaluating an ``F.text == ...`` filter per
+    button. Include it before the other routers: texts that are not buttons
+    fall through to the state-based handlers.
+    """
+
+    def __init__(self, *, name: Optional[str] = None):
+        super().__init__(name=name)
+        self._commands: Dict[str, CallableObject] = {}
+        self.message.register(self._dispatch, self._match)
+
+    @property
+    def commands(self) -> Mapping[str, CallableObject]:
+        return MappingProxyType(self._commands)
+
+    def command(self, text: str) -> Callable:
+        def decorator(callback: Callable) -> Callable:
+            if text in self._commands:
+                raise ValueError(f"Text command {text!r} is already registered")
+            self._commands[text] = CallableObject(callback)
+            return callback
+
+        return decorator
+
+    async def _match(self, message: Message) -> Union[bool, Dict[str, Any]]:
+        command = self._commands.get(message.text)
+        if command is None:
+            return False
+        return {"text_command": command}
+
+    async def _dispatch(self, message: Message, text_command: CallableObject, **kwargs: Any) -> Any:
+        return await text_command.call(message, **kwargs)
+
+
+text_commands = TextCommandRouter(name="text_commands")
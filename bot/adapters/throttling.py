@@ -0,0 +1,82 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from aiogram.exceptions import TelegramBadRequest
+from loguru import logger
+
+
+EditCallback = Callable[[], Awaitable[object]]
+
+
+class MarkupEditThrottler:
+    """
+    Coalesces inline keyboard edits per message.
+
+    The first edit in a quiet window is sent immediately, edits arriving
+    inside the window replace each other and only the latest one is sent
+    when the window closes, so the final selection is always rendered.
+    """
+
+    def __init__(self, interval: float = 0.7):
+        self.interval = interval
+        self._last_sent: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._pending: Dict[Hashable, EditCallback] = {}
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    async def submit(self, key: Hashable, edit: EditCallback) -> None:
+        now = time.monotonic()
+        self._prune(now)
+        last_sent = self._last_sent.get(key)
+
+        if key not in self._tasks and (last_sent is None or now - last_sent >= self.interval):
+            self._mark_sent(key, now)
+            await self._send(edit)
+            return
+
+        self._pending[key] = edit
+        if key not in self._tasks:
+            delay = self.interval - (now - last_sent) if last_sent is not None else self.interval
+            self._tasks[key] = asyncio.create_task(self._flush_later(key, max(delay, 0.0)))
+
+    def forget(self, key: Hashable) -> None:
+        """Drop pending edits for a message that is no longer a picker."""
+        self._pending.pop(key, None)
+        self._last_sent.pop(key, None)
+        task: Optional[asyncio.Task] = self._tasks.pop(key, None)
+        if task:
+            task.cancel()
+
+    async def _flush_later(self, key: Hashable, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self._tasks.pop(key, None)
+        edit = self._pending.pop(key, None)
+        if edit:
+            self._mark_sent(key, time.monotonic())
+            await self._send(edit)
+
+    def _mark_sent(self, key: Hashable, now: float) -> None:
+        self._last_sent[key] = now
+        self._last_sent.move_to_end(key)
+
+    def _prune(self, now: float) -> None:
+        # Брошенные пикеры не вызывают forget(), поэтому чистим по времени
+        while self._last_sent:
+            key, sent = next(iter(self._last_sent.items()))
+            if now - sent < self.interval:
+                break
+            del self._last_sent[key]
+
+    @staticmethod
+    async def _send(edit: EditCallback) -> None:
+        try:
+            await edit()
+        except TelegramBadRequest as e:
+            # "message is not modified" and edits of deleted messages are harmless here
+            logger.debug(f"Пропущено обновление клавиатуры: {e}")
+
+
+participants_markup_throttler = MarkupEditThrottler()
@@ -1,12 +1,13 @@
 import os
 from typing import List, Dict
-from loguru import logger
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from bot.infrastructure.logging_setup import setup_logging
+
 
 class Settings(BaseSettings):
     BOT_TOKEN: str
@@ -14,7 +15,40 @@ class Settings(BaseSettings):
     BANK_TOKENS: Dict[str, str]
     FORMAT_LOG: str = "{time:YYYY-MM-DD at HH:mm:ss} | {level} | {message}"
     LOG_ROTATION: str = "10 MB"
+    LOG_LEVEL: str = "INFO"
+    # Уровни по модулям, например {"bot.dao": "WARNING"}
+    LOG_LEVELS: Dict[str, str] = {}
+    # Не больше N INFO-сообщений DAO в секунду на шаблон (0 — без ограничения)
+    LOG_DAO_RATE_LIMIT: float = 10
     DB_URL: str = 'sqlite+aiosqlite:///data/db.sqlite3'
+    # Срок действия кода приглашения в днях (0 — бессрочно)
+    INVITE_CODE_TTL_DAYS: int = 0
+    # Размер кэша код приглашения → стол (0 — без кэша)
+    INVITE_CODE_CACHE_SIZE: int = 10_000
+    # Размер кэша профилей пользователей из Telegram (0 — без кэша)
+    USER_PROFILE_CACHE_SIZE: int = 10_000
+    # Отдельная база для неактивных столов (пусто — архивация выключена)
+    ARCHIVE_DB_URL: str = ''
+    ARCHIVE_INACTIVE_DAYS: int = 180
+    ARCHIVE_BATCH_SIZE: int = 50
+    ARCHIVE_INTERVAL_MINUTES: float = 60
+    # 0 — обработка обновлений средствами aiogram, иначе лимит одновременных обновлений
+    UPDATES_CONCURRENCY_LIMIT: int = 0
+    # 0 — эндпоинт метрик Prometheus выключен
+    METRICS_PORT: int = 0
+    METRICS_HOST: str = "127.0.0.1"
+    # Staging: логировать обработчики, превысившие бюджет SQL-запросов (0 — выключено)
+    QUERY_BUDGET_DEFAULT: int = 0
+    QUERY_BUDGETS: Dict[str, int] = {}
+    # Запросы медленнее порога (мс) пишутся в отдельный лог (0 — выключено)
+    SLOW_QUERY_THRESHOLD_MS: float = 100
+    SLOW_QUERY_LOG_ROTATION: str = "10 MB"
+    # Доля обновлений, для которых пишется трассировка (0 — выключено, 1 — все)
+    TRACING_SAMPLE_RATE: float = 0.0
+    # Профилирование медленных обновлений (включается командой /profile on)
+    PROFILE_THRESHOLD_MS: float = 1000
+    PROFILE_SAMPLE_INTERVAL_MS: float = 5
+    PROFILE_MAX_DUMPS_PER_MINUTE: int = 5
     model_config = SettingsConfigDict(
         env_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".env")
     )
@@ -29,6 +63,17 @@ settings = Settings()
 # admins = settings.ADMIN_IDS
 
 log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log.txt")
-logger.add(log_file_path, format=settings.FORMAT_LOG, level="INFO", rotation=settings.LOG_ROTATION)
+slow_query_log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "slow_queries.log")
+traces_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces.jsonl")
+profiles_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+setup_logging(
+    log_file_path,
+    settings.FORMAT_LOG,
+    settings.LOG_ROTATION,
+    level=settings.LOG_LEVEL,
+    levels=settings.LOG_LEVELS,
+    dao_rate_limit=settings.LOG_DAO_RATE_LIMIT
+)
 database_url = settings.DB_URL
+archive_database_url = settings.ARCHIVE_DB_URL
 
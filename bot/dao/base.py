@@ -3,81 +3,92 @@ from pydantic import BaseModel
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.future import select
 from sqlalchemy import update as sqlalchemy_update, delete as sqlalchemy_delete, func
+from sqlalchemy.dialects import postgresql, sqlite
 from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.dao.database import Base
+from bot.infrastructure.logging_setup import dao_logger
+from bot.infrastructure.tracing import trace_methods
 
 # Объявляем типовой параметр T с ограничением, что это наследник Base
 T = TypeVar("T", bound=Base)
 
 
+def upsert(session: AsyncSession, model: Type[Base]):
+    """INSERT for the session's dialect, with on_conflict_do_nothing/on_conflict_do_update."""
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+@trace_methods
 class BaseDAO(Generic[T]):
     model: Type[T]
 
     @classmethod
     async def find_one_or_none_by_id(cls, data_id: int, session: AsyncSession):
         # Найти запись по ID
-        logger.info(f"Поиск {cls.model.__name__} с ID: {data_id}")
+        dao_logger.info("Поиск {} с ID: {}", cls.model.__name__, data_id)
         try:
             query = select(cls.model).filter_by(id=data_id)
             result = await session.execute(query)
             record = result.scalar_one_or_none()
             if record:
-                logger.info(f"Запись с ID {data_id} найдена.")
+                dao_logger.info("Запись с ID {} найдена.", data_id)
             else:
-                logger.info(f"Запись с ID {data_id} не найдена.")
+                dao_logger.info("Запись с ID {} не найдена.", data_id)
             return record
         except SQLAlchemyError as e:
-            logger.error(f"Ошибка при поиске записи с ID {data_id}: {e}")
+            logger.error("Ошибка при поиске записи с ID {}: {}", data_id, e)
             raise
 
     @classmethod
     async def find_one_or_none(cls, session: AsyncSession, filters: BaseModel):
         # Найти одну запись по фильтрам
         filter_dict = filters.model_dump(exclude_unset=True)
-        logger.info(f"Поиск одной записи {cls.model.__name__} по фильтрам: {filter_dict}")
+        dao_logger.info("Поиск одной записи {} по фильтрам: {}", cls.model.__name__, filter_dict)
         try:
             query = select(cls.model).filter_by(**filter_dict)
             result = await session.execute(query)
             record = result.scalar_one_or_none()
             if record:
-                logger.info(f"Запись найдена по фильтрам: {filter_dict}")
+                dao_logger.info("Запись найдена по фильтрам: {}", filter_dict)
             else:
-                logger.info(f"Запись не найдена по фильтрам: {filter_dict}")
+                dao_logger.info("Запись не найдена по фильтрам: {}", filter_dict)
             return record
         except SQLAlchemyError as e:
-            logger.error(f"Ошибка при поиске записи по фильтрам {filter_dict}: {e}")
+            logger.error("Ошибка при поиске записи по фильтрам {}: {}", filter_dict, e)
             raise
 
     @classmethod
     async def find_all(cls, session: AsyncSession, filters: BaseModel | None = None):
         # Найти все записи по фильтрам
         filter_dict = filters.model_dump(exclude_unset=True) if filters else {}
-        logger.info(f"Поиск всех записей {cls.model.__name__} по фильтрам: {filter_dict}")
+        dao_logger.info("Поиск всех записей {} по фильтрам: {}", cls.model.__name__, filter_dict)
         try:
             query = select(cls.model).filter_by(**filter_dict)
             result = await session.execute(query)
             records = result.scalars().all()
-            logger.info(f"Найдено {len(records)} записей.")
+            dao_logger.info("Найдено {} записей.", len(records))
             return records
         except SQLAlchemyError as e:
-            logger.error(f"Ошибка при поиске всех записей по фильтрам {filter_dict}: {e}")
+            logger.error("Ошибка при поиске всех записей по фильтрам {}: {}", filter_dict, e)
             raise
 
     @classmethod
     async def add(cls, session: AsyncSession, values: BaseModel):
         # Добавить одну запись
         values_dict = values.model_dump(exclude_unset=True)
-        logger.info(f"Добавление записи {cls.model.__name__} с параметрами: {values_dict}")
+        dao_logger.info("Добавление записи {} с параметрами: {}", cls.model.__name__, values_dict)
         new_instance = cls.model(**values_dict)
         session.add(new_instance)
         try:
             await session.flush()
-            logger.info(f"Запись {cls.model.__name__} успешно добавлена.")
+            dao_logger.info("Запись {} успешно добавлена.", cls.model.__name__)
         except SQLAlchemyError as e:
             await session.rollback()
-            logger.error(f"Ошибка при добавлении записи: {e}")
+            logger.error("Ошибка при добавлении записи: {}", e)
             raise e
         return new_instance
 
@@ -85,7 +96,7 @@ class BaseDAO(Generic[T]):
     async def delete(cls, session: AsyncSession, filters: BaseModel):
         # Удалить записи по фильтру
         filter_dict = filters.model_dump(exclude_unset=True)
-        logger.info(f"Удаление записей {cls.model.__name__} по фильтру: {filter_dict}")
+        dao_logger.info("Удаление записей {} по фильтру: {}", cls.model.__name__, filter_dict)
         if not filter_dict:
             logger.error("Нужен хотя бы один фильтр для удаления.")
             raise ValueError("Нужен хотя бы один фильтр для удаления.")
@@ -94,24 +105,24 @@ class BaseDAO(Generic[T]):
         try:
             result = await session.execute(query)
             await session.flush()
-            logger.info(f"Удалено {result.rowcount} записей.")
+            dao_logger.info("Удалено {} записей.", result.rowcount)
             return result.rowcount
         except SQLAlchemyError as e:
             await session.rollback()
-            logger.error(f"Ошибка при удалении записей: {e}")
+            logger.error("Ошибка при удалении записей: {}", e)
             raise e
 
     @classmethod
     async def count(cls, session: AsyncSession, filters: BaseModel | None = None):
         # Подсчитать количество записей
         filter_dict = filters.model_dump(exclude_unset=True) if filters else {}
-        logger.info(f"Подсчет количества записей {cls.model.__name__} по фильтру: {filter_dict}")
+        dao_logger.info("Подсчет количества записей {} по фильтру: {}", cls.model.__name__, filter_dict)
         try:
             query = select(func.count(cls.model.id)).filter_by(**filter_dict)
             result = await session.execute(query)
             count = result.scalar()
-            logger.info(f"Найдено {count} записей.")
+            dao_logger.info("Найдено {} записей.", count)
             return count
         except SQLAlchemyError as e:
-            logger.error(f"Ошибка при подсчете записей: {e}")
+            logger.error("Ошибка при подсчете записей: {}", e)
             raise
\ No newline at end of file
@@ -8,7 +8,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from bot.dao.base import BaseDAO
-from bot.dao.models import User, DiningTable, Item, TableItem, TableUser, Transaction, UserItemConsumption
+from bot.dao.models import (
+    User, DiningTable, Item, TableItem, TableUser, Transaction, UserItemConsumption, TableEvent, BalanceSnapshot,
+    TableSettlement, ArchivedTable, InviteCodeExpiry,
+)
 
 
 class UserDao(BaseDAO[User]):
@@ -33,4 +36,19 @@ class UserDao(BaseDAO[User]):
     model = User
 
 class UserItemConsumptionDao(BaseDAO[UserItemConsumption]):
-    model = UserItemConsumption
\ No newline at end of file
+    model = UserItemConsumption
+
+class TableEventDao(BaseDAO[TableEvent]):
+    model = TableEvent
+
+class BalanceSnapshotDao(BaseDAO[BalanceSnapshot]):
+    model = BalanceSnapshot
+
+class TableSettlementDao(BaseDAO[TableSettlement]):
+    model = TableSettlement
+
+class ArchivedTableDao(BaseDAO[ArchivedTable]):
+    model = ArchivedTable
+
+class InviteCodeExpiryDao(BaseDAO[InviteCodeExpiry]):
+    model = InviteCodeExpiry
@@ -1,8 +1,32 @@
 from datetime import datetime
-from bot.config import database_url
-from sqlalchemy import func, TIMESTAMP, Integer
+from bot.config import database_url, archive_database_url
+from sqlalchemy import event, func, TIMESTAMP, Integer
 from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase
-from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncEngine, async_sessionmaker, create_async_engine, AsyncSession
+
+
+def enable_savepoints(engine: AsyncEngine) -> AsyncEngine:
+    """
+    Make SAVEPOINT (session.begin_nested) work on SQLite; other dialects are left alone.
+
+    For test and benchmark engines only: every transaction then starts with
+    an explicit BEGIN, so even a read-only session holds a SHARED lock until
+    it ends and blocks writers in other sessions.
+    """
+    if engine.dialect.name != "sqlite":
+        return engine
+
+    # pysqlite открывает транзакции сам и ломает SAVEPOINT: отключаем это
+    # и начинаем транзакцию явно
+    @event.listens_for(engine.sync_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    return engine
 
 # Создание асинхронного движка для подключения к БД
 engine = create_async_engine(url=database_url)
@@ -10,6 +34,10 @@ engine = create_async_engine(url=database_url)
 # Создание фабрики сессий
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession)
 
+# База для неактивных столов, см. ArchiveUseCase
+archive_engine = create_async_engine(url=archive_database_url) if archive_database_url else None
+archive_session_maker = async_sessionmaker(archive_engine, class_=AsyncSession) if archive_engine else None
+
 # Базовый класс для моделей
 class Base(AsyncAttrs, DeclarativeBase):
     __abstract__ = True  # Этот класс не будет создавать отдельную таблицу
@@ -1,16 +1,27 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 from sqlalchemy import (
+    TIMESTAMP,
     BigInteger,
     Integer,
     Text,
     ForeignKey,
     Boolean,
     Float,
+    Index,
+    JSON,
+    event,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from bot.dao.database import Base
 
 
+# Строки этих таблиц уезжают в архив вместе со своими id. Без AUTOINCREMENT
+# SQLite выдаёт max(rowid) + 1 и после удаления новейших строк повторно
+# выдал бы id, которые ещё лежат в архиве
+MONOTONIC_IDS = {"sqlite_autoincrement": True}
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -68,8 +79,20 @@ class DiningTable(Base):
         return f"<DiningTable(id={self.id}, name='{self.name}', invite_code='{self.invite_code}')>"
 
 
+class InviteCodeExpiry(Base):
+    """Expiry of a table's current invite code; tables without a row have a code that never expires."""
+    __tablename__ = "invite_code_expiry"
+
+    table_id: Mapped[int] = mapped_column(ForeignKey("tables.id"), unique=True, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False)
+
+    def __repr__(self):
+        return f"<InviteCodeExpiry(table_id={self.table_id}, expires_at={self.expires_at})>"
+
+
 class Item(Base):
     __tablename__ = "items"
+    __table_args__ = MONOTONIC_IDS
 
     name: Mapped[str] = mapped_column(Text, nullable=False)
     price: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -92,6 +115,7 @@ class Item(Base):
 
 class TableItem(Base):
     __tablename__ = "table_items"
+    __table_args__ = MONOTONIC_IDS
 
     table_id: Mapped[int] = mapped_column(ForeignKey("tables.id"), nullable=False)
     item_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=False)
@@ -105,6 +129,7 @@ class TableItem(Base):
 
 class TableUser(Base):
     __tablename__ = "table_user"
+    __table_args__ = (Index("ux_table_user_table_id_user_id", "table_id", "user_id", unique=True),)
 
     table_id: Mapped[int] = mapped_column(ForeignKey("tables.id"), nullable=False)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
@@ -119,8 +144,9 @@ class TableUser(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = MONOTONIC_IDS
 
-    table_id: Mapped[Optional[int]] = mapped_column(ForeignKey("tables.id"))
+    table_id: Mapped[Optional[int]] = mapped_column(ForeignKey("tables.id"), index=True)
     user_id_from: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     user_id_to: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     amount: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -142,6 +168,7 @@ class Transaction(Base):
 
 class UserItemConsumption(Base):
     __tablename__ = "user_item_consumption"
+    __table_args__ = MONOTONIC_IDS
 
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     item_id: Mapped[int] = mapped_column(ForeignKey("items.id"), nullable=False)
@@ -152,3 +179,71 @@ class UserItemConsumption(Base):
 
     def __repr__(self):
         return f"<UserItemConsumption(user_id={self.user_id}, item_id={self.item_id}, ratio={self.ratio})>"
+
+
+class TableEvent(Base):
+    """Append-only log of everything that changed a table; rows are never updated or deleted."""
+    __tablename__ = "table_events"
+    __table_args__ = (Index("ix_table_events_table_id_id", "table_id", "id"), MONOTONIC_IDS)
+
+    table_id: Mapped[int] = mapped_column(ForeignKey("tables.id"), nullable=False)
+    kind: Mapped[str] = mapped_column(Text, nullable=False)
+    payload: Mapped[Dict[str, Any]] = mapped_column(JSON, nullable=False)
+    actor_id: Mapped[Optional[int]] = mapped_column(ForeignKey("users.id"), nullable=True)
+
+    def __repr__(self):
+        return f"<TableEvent(id={self.id}, table_id={self.table_id}, kind='{self.kind}')>"
+
+
+@event.listens_for(TableEvent, "before_update")
+@event.listens_for(TableEvent, "before_delete")
+def _forbid_event_changes(mapper, connection, target):
+    raise ValueError("События стола неизменяемы")
+
+
+class BalanceSnapshot(Base):
+    """Amounts of every member after all events of the table up to ``last_event_id``."""
+    __tablename__ = "balance_snapshots"
+    __table_args__ = (
+        Index("ix_balance_snapshots_table_id_last_event_id", "table_id", "last_event_id"), MONOTONIC_IDS
+    )
+
+    table_id: Mapped[int] = mapped_column(ForeignKey("tables.id"), nullable=False)
+    last_event_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    # {user_id: {"expenses": ..., "income": ..., "repaid": ..., "received": ...}}
+    balances: Mapped[Dict[str, Dict[str, int]]] = mapped_column(JSON, nullable=False)
+
+    def __repr__(self):
+        return f"<BalanceSnapshot(table_id={self.table_id}, last_event_id={self.last_event_id})>"
+
+
+class TableSettlement(Base):
+    """
+    Final state of a closed table.
+
+    Holds the frozen amounts of every member and the table's items,
+    consumptions and repayments in compact form; their rows are removed
+    from the hot tables when the table is closed.
+    """
+    __tablename__ = "table_settlements"
+
+    table_id: Mapped[int] = mapped_column(ForeignKey("tables.id"), unique=True, nullable=False)
+    last_event_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    # {user_id: {"expenses": ..., "income": ..., "repaid": ..., "received": ...}}
+    balances: Mapped[Dict[str, Dict[str, int]]] = mapped_column(JSON, nullable=False)
+    # [{"kind": "item"|"repayment", ...}], see TableClosingUseCase
+    history: Mapped[List[Dict[str, Any]]] = mapped_column(JSON, nullable=False)
+
+    def __repr__(self):
+        return f"<TableSettlement(table_id={self.table_id}, last_event_id={self.last_event_id})>"
+
+
+class ArchivedTable(Base):
+    """Marks a table whose items, repayments and old events live in the archive database."""
+    __tablename__ = "archived_tables"
+
+    table_id: Mapped[int] = mapped_column(ForeignKey("tables.id"), unique=True, nullable=False)
+    rows: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<ArchivedTable(table_id={self.table_id}, rows={self.rows})>"
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-from typing import Optional, List
+from enum import Enum
+from typing import Dict, Optional, List, Tuple
 from datetime import datetime
 
 
@@ -21,6 +22,30 @@ class TableEntity:
     created_at: Optional[datetime] = None
 
 
+@dataclass
+class TableBalanceEntity:
+    table: TableEntity
+    # Положительный, когда пользователю должны
+    balance: int
+
+
+class JoinStatus(str, Enum):
+    JOINED = "joined"
+    ALREADY_MEMBER = "already_member"
+    TABLE_NOT_FOUND = "table_not_found"
+    USER_NOT_FOUND = "user_not_found"
+
+
+@dataclass
+class JoinResult:
+    status: JoinStatus
+    table: Optional[TableEntity] = None
+
+    @property
+    def joined(self) -> bool:
+        return self.status is JoinStatus.JOINED
+
+
 @dataclass
 class ItemEntity:
     name: str
@@ -40,4 +65,65 @@ class ExpenseEntity:
 class DebtEntity:
     from_user: UserEntity
     to_user: UserEntity
-    amount: int
\ No newline at end of file
+    amount: int
+
+
+@dataclass
+class SettlementPlan:
+    user_id: int
+    # Переводы после взаимозачёта по парам: (от кого, кому, сумма)
+    transfers: List[Tuple[int, int, int]]
+    # Долги с участием пользователя по каждому столу, которые закрывает план
+    table_debts: Dict[int, List[Tuple[int, int, int]]]
+
+    def counterparty(self, debt: Tuple[int, int, int]) -> int:
+        debtor, creditor, _ = debt
+        return creditor if debtor == self.user_id else debtor
+
+    @property
+    def offsets(self) -> List[int]:
+        """Members whose debts with the user cancel out exactly, so no money changes hands."""
+        paying = {self.counterparty(t) for t in self.transfers}
+        return sorted({self.counterparty(d) for debts in self.table_debts.values() for d in debts} - paying)
+
+    @property
+    def repayments(self) -> List[Tuple[int, int, int, int]]:
+        """Every table debt of the plan as (table, debtor, creditor, amount)."""
+        return [(table_id, *debt) for table_id, debts in sorted(self.table_debts.items()) for debt in debts]
+
+    def part(self, received: bool) -> "SettlementPlan":
+        """
+        The transfers other members make to the user (``received``), or the
+        user's own transfers together with the offsets, and the table debts
+        they close.
+        """
+        payers = {debtor for debtor, creditor, _ in self.transfers if creditor == self.user_id}
+        table_debts = {}
+        for table_id, debts in self.table_debts.items():
+            kept = [d for d in debts if (self.counterparty(d) in payers) == received]
+            if kept:
+                table_debts[table_id] = kept
+        transfers = [t for t in self.transfers if (self.counterparty(t) in payers) == received]
+        return SettlementPlan(user_id=self.user_id, transfers=transfers, table_debts=table_debts)
+
+
+@dataclass
+class CloseVote:
+    agreed: int
+    total: int
+    # Итоговые балансы участников, если стол закрыт этим голосом
+    balances: Optional[Dict[int, int]] = None
+
+    @property
+    def closed(self) -> bool:
+        return self.balances is not None
+
+
+@dataclass
+class ArchiveReport:
+    tables: List[int]
+    # Перенесено строк по таблицам базы
+    rows: Dict[str, int]
+    # Байты живых страниц основной базы до и после переноса (None не для SQLite)
+    used_bytes_before: Optional[int] = None
+    used_bytes_after: Optional[int] = None
@@ -0,0 +1,86 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from loguru import logger
+
+
+class ChatOrderedConcurrencyMiddleware(BaseMiddleware):
+    """
+    Outer update middleware that handles different chats in parallel.
+
+    Each update is started in its own task, chained after the previous
+    update of the same chat, so FSM transitions of one chat never interleave.
+    At most ``limit`` updates are in flight (queued or running); when the
+    limit is reached the middleware blocks, which stalls the polling loop
+    until a slot frees up. Polling must run with ``handle_as_tasks=False``
+    so updates reach the middleware in the order Telegram sent them.
+    """
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError("Concurrency limit must be positive")
+        self.limit = limit
+        self._slots = asyncio.Semaphore(limit)
+        self._tails: Dict[Hashable, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        await self._slots.acquire()
+
+        key = self._chat_key(data)
+        previous = self._tails.get(key) if key is not None else None
+        task = asyncio.create_task(self._run(handler, event, data, previous, key))
+        if key is not None:
+            self._tails[key] = task
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def drain(self) -> None:
+        """Wait until every accepted update has been handled."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+        previous: Optional[asyncio.Task],
+        key: Optional[Hashable]
+    ) -> Any:
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            # FSM-мидлварь прочитала состояние ещё до ожидания слота и
+            # предыдущего обновления чата, которые могли его изменить
+            state = data.get("state")
+            if state is not None:
+                data["raw_state"] = await state.get_state()
+            return await handler(event, data)
+        except Exception as e:
+            logger.exception(f"Ошибка при обработке обновления чата {key}: {e}")
+        finally:
+            self._slots.release()
+            if key is not None and self._tails.get(key) is asyncio.current_task():
+                del self._tails[key]
+
+    @staticmethod
+    def _chat_key(data: Dict[str, Any]) -> Optional[Hashable]:
+        chat = data.get("event_chat")
+        if chat is not None:
+            return chat.id
+        user = data.get("event_from_user")
+        if user is not None:
+            return ("user", user.id)
+        return None
@@ -1,17 +1,22 @@
 from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from bot.dao.database import async_session_maker
+from bot.infrastructure.tracing import traced_middleware
 
 
 class DatabaseMiddleware(BaseMiddleware):
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession] = async_session_maker):
+        self.session_maker = session_maker
+
+    @traced_middleware("DatabaseMiddleware")
     async def __call__(
         self,
         handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        async with async_session_maker() as session:
+        async with self.session_maker() as session:
             data['session'] = session
             return await handler(event, data)
\ No newline at end of file
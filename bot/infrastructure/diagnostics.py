@@ -0,0 +1,113 @@
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from bot.infrastructure.metrics import Histogram, cache_requests
+
+
+STARTED_AT = time.monotonic()
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+def uptime() -> float:
+    return time.monotonic() - STARTED_AT
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    if days:
+        return f"{days} д {hours} ч {minutes} мин"
+    if hours:
+        return f"{hours} ч {minutes} мин"
+    return f"{minutes} мин {seconds} с"
+
+
+class ThroughputMeter:
+    """Updates per second overall and since the previous reading."""
+
+    def __init__(self):
+        self._last: Optional[Tuple[float, int]] = None
+
+    def read(self, total: int) -> Tuple[float, Optional[float]]:
+        now = time.monotonic()
+        overall = total / max(now - STARTED_AT, 1e-9)
+        recent = None
+        if self._last is not None:
+            last_time, last_total = self._last
+            recent = (total - last_total) / max(now - last_time, 1e-9)
+        self._last = (now, total)
+        return overall, recent
+
+
+def latency_percentiles(histogram: Histogram) -> Dict[float, Optional[float]]:
+    counts = histogram.merged_counts()
+    return {q: histogram.quantile(q, counts) for q in PERCENTILES}
+
+
+def slowest_handlers(histogram: Histogram, limit: int = 5) -> List[Tuple[str, int, float]]:
+    """Handlers with the highest p95 latency: (name, updates, p95 seconds)."""
+    rows = []
+    for labels in histogram.label_sets():
+        counts = histogram.counts(*labels)
+        rows.append((labels[0], sum(counts), histogram.quantile(0.95, counts)))
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows[:limit]
+
+
+def pool_status(engine: AsyncEngine) -> str:
+    pool = engine.sync_engine.pool
+    if all(hasattr(pool, attr) for attr in ("size", "checkedout", "overflow")):
+        return f"{pool.checkedout()} занято из {pool.size()} (overflow {pool.overflow()})"
+    return pool.status()
+
+
+def fsm_context_count(storage: BaseStorage) -> Optional[int]:
+    """Number of chats with a state or data in memory; None for other storages."""
+    if not isinstance(storage, MemoryStorage):
+        return None
+    return sum(1 for record in storage.storage.values() if record.state is not None or record.data)
+
+
+def cache_hit_rates() -> Dict[str, Tuple[float, int]]:
+    """Hit rate and lookup count per cache."""
+    lookups: Dict[str, Dict[str, float]] = {}
+    for (cache, result), value in cache_requests.samples().items():
+        lookups.setdefault(cache, {})[result] = value
+    rates = {}
+    for cache, results in sorted(lookups.items()):
+        total = results.get("hit", 0) + results.get("miss", 0)
+        rates[cache] = (results.get("hit", 0) / total if total else 0.0, int(total))
+    return rates
+
+
+def memory_top(limit: int = 10) -> Optional[List[str]]:
+    """
+    Top allocation sites since tracing started.
+
+    tracemalloc is off by default; the first call only starts it (and returns
+    None), so the bot pays for allocation tracing only after someone asks.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ))
+    return [
+        f"{stat.traceback[0].filename.rsplit('/', 2)[-1]}:{stat.traceback[0].lineno} "
+        f"— {stat.size / 1024:.1f} KiB в {stat.count} блоках"
+        for stat in snapshot.statistics("lineno")[:limit]
+    ]
+
+
+def stop_memory_tracing() -> None:
+    tracemalloc.stop()
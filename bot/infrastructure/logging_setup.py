@@ -0,0 +1,113 @@
+import sys
+import time
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from loguru import logger
+
+from bot.infrastructure.slow_query_log import SLOW_QUERY_EXTRA
+
+
+class ModuleLevelFilter:
+    """
+    Loguru filter with a minimum level per module prefix.
+
+    ``{"bot.dao": "WARNING"}`` silences INFO from ``bot.dao.base`` and
+    ``bot.dao.dao`` while other modules keep ``default_level``. The level of
+    every module name is resolved once and cached.
+    """
+
+    def __init__(self, default_level: str = "INFO", levels: Optional[Mapping[str, str]] = None,
+                 exclude_extra: Optional[str] = None):
+        self._levels = {name: logger.level(level).no for name, level in (levels or {}).items()}
+        self._levels[""] = logger.level(default_level).no
+        self.exclude_extra = exclude_extra
+        self._cache: Dict[Optional[str], int] = {}
+
+    @property
+    def min_level(self) -> int:
+        return min(self._levels.values())
+
+    def level_for(self, name: Optional[str]) -> int:
+        level = self._cache.get(name)
+        if level is None:
+            level = self._resolve(name or "")
+            self._cache[name] = level
+        return level
+
+    def _resolve(self, name: str) -> int:
+        while name not in self._levels:
+            name = name.rpartition(".")[0]
+        return self._levels[name]
+
+    def __call__(self, record: Dict[str, Any]) -> bool:
+        if self.exclude_extra is not None and self.exclude_extra in record["extra"]:
+            return False
+        return record["level"].no >= self.level_for(record["name"])
+
+
+class RateLimitedLogger:
+    """
+    INFO logging for hot paths, sampled by a token bucket per message template.
+
+    The decision is taken before loguru builds the record, so a dropped
+    message costs a dict lookup: no frame inspection, no formatting, no I/O.
+    The next message let through reports how many were dropped.
+    """
+
+    def __init__(self, rate: float = 0.0, burst: int = 20):
+        self.configure(rate, burst)
+
+    def configure(self, rate: float, burst: int) -> None:
+        """``rate`` messages per second per template; 0 disables sampling."""
+        self.rate = rate
+        self.burst = burst
+        # шаблон -> (токены, время последнего пополнения, пропущено)
+        self._buckets: Dict[str, Tuple[float, float, int]] = {}
+
+    def info(self, message: str, *args: Any) -> None:
+        if self.rate <= 0:
+            logger.opt(depth=1).info(message, *args)
+            return
+
+        now = time.monotonic()
+        tokens, updated, dropped = self._buckets.get(message, (self.burst, now, 0))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[message] = (tokens, now, dropped + 1)
+            return
+
+        self._buckets[message] = (tokens - 1, now, 0)
+        if dropped:
+            message = f"{message} (+{dropped} похожих пропущено)"
+        logger.opt(depth=1).info(message, *args)
+
+
+dao_logger = RateLimitedLogger()
+
+
+def setup_logging(
+    log_file_path: str,
+    format_log: str,
+    rotation: str,
+    level: str = "INFO",
+    levels: Optional[Mapping[str, str]] = None,
+    dao_rate_limit: float = 0.0,
+    dao_burst: int = 20,
+) -> None:
+    """
+    Replace loguru's default stderr handler with queued console and file sinks.
+
+    With ``enqueue=True`` records are handed to a background thread, so
+    formatting the line and writing it (including rotation) never blocks
+    the event loop. Call ``await logger.complete()`` on shutdown.
+    """
+    console_filter = ModuleLevelFilter(level, levels)
+    file_filter = ModuleLevelFilter(level, levels, exclude_extra=SLOW_QUERY_EXTRA)
+    # Уровень sink'а — минимальный из настроек: ниже него loguru отбрасывает
+    # запись до форматирования
+    logger.remove()
+    logger.add(sys.stderr, format=format_log, level=console_filter.min_level, enqueue=True,
+               filter=console_filter)
+    logger.add(log_file_path, format=format_log, level=file_filter.min_level, rotation=rotation,
+               enqueue=True, filter=file_filter)
+    dao_logger.configure(dao_rate_limit, dao_burst)
@@ -0,0 +1,195 @@
+import asyncio
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from loguru import logger
+
+from bot.infrastructure.request_context import handler_name
+
+# Приватный реестр asyncio «цикл → выполняемая задача», который сэмплер читает
+# из своего потока. Проверено на CPython 3.11 (образ из Dockerfile); в других
+# версиях его может не быть, тогда выполняемая задача ищется по стеку потока
+_current_tasks: Optional[Dict[asyncio.AbstractEventLoop, asyncio.Task]] = getattr(
+    asyncio.tasks, "_current_tasks", None
+)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _thread_stack(frame) -> List[str]:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_stack(task: asyncio.Task) -> List[str]:
+    """Frames of a suspended task, outermost first, following the ``await`` chain."""
+    stack = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(_frame_label(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    stack.append("[await]")
+    return stack
+
+
+class _Recording:
+    __slots__ = ("samples",)
+
+    def __init__(self):
+        self.samples: Counter = Counter()
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for individual updates.
+
+    While enabled, a daemon thread wakes every ``interval`` seconds and, for
+    each update being recorded, takes either the event loop thread's stack
+    (the update's task is running) or the task's ``await`` chain (it is
+    waiting on the database or Telegram). Updates slower than ``threshold``
+    are written as collapsed stacks (``a;b;c count``), the input format of
+    flamegraph.pl, speedscope and inferno; at most ``max_dumps_per_minute``.
+    While disabled the middleware adds one attribute check per update.
+    """
+
+    def __init__(self, directory: str, threshold: float = 1.0, interval: float = 0.005,
+                 max_dumps_per_minute: int = 5):
+        self.directory = directory
+        self.threshold = threshold
+        self.interval = interval
+        self.max_dumps_per_minute = max_dumps_per_minute
+        self._recordings: Dict[asyncio.Task, _Recording] = {}
+        self._dumped_at: Deque[float] = deque()
+        self._dump_seq = itertools.count(1)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None
+
+    def enable(self) -> None:
+        if self.enabled:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_forever, name="update-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Профилировщик включён: порог {self.threshold * 1000:.0f} мс")
+
+    def disable(self) -> None:
+        if not self.enabled:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._recordings.clear()
+        logger.info("Профилировщик выключен")
+
+    def start(self) -> Optional[_Recording]:
+        task = asyncio.current_task()
+        if task is None:
+            return None
+        recording = self._recordings[task] = _Recording()
+        return recording
+
+    def finish(self, recording: _Recording, name: str, elapsed: float) -> Optional[str]:
+        self._recordings.pop(asyncio.current_task(), None)
+        if elapsed < self.threshold or not recording.samples:
+            return None
+
+        now = time.monotonic()
+        while self._dumped_at and now - self._dumped_at[0] >= 60:
+            self._dumped_at.popleft()
+        if len(self._dumped_at) >= self.max_dumps_per_minute:
+            return None
+        self._dumped_at.append(now)
+        return self._dump(recording, name, elapsed)
+
+    def _dump(self, recording: _Recording, name: str, elapsed: float) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        safe_name = re.sub(r"[^\w.-]", "_", name)
+        file_name = f"{stamp}-{next(self._dump_seq)}_{safe_name}_{elapsed * 1000:.0f}ms.collapsed"
+        path = os.path.join(self.directory, file_name)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in recording.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.warning(f"Медленное обновление {name}: {elapsed * 1000:.0f} мс, профиль записан в {path}")
+        return path
+
+    def _sample_forever(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        if not self._recordings:
+            return
+        frame = sys._current_frames().get(self._loop_thread_id)
+        running = self._running_task(frame)
+        for task, recording in list(self._recordings.items()):
+            if task is running:
+                if frame is None:
+                    continue
+                stack = _thread_stack(frame)
+            else:
+                stack = _await_stack(task)
+            recording.samples[";".join(stack)] += 1
+
+    def _running_task(self, frame) -> Optional[asyncio.Task]:
+        if _current_tasks is not None:
+            return _current_tasks.get(self._loop)
+        # Без реестра ищем задачу, чья корутина есть в стеке потока цикла
+        on_stack = set()
+        while frame is not None:
+            on_stack.add(frame)
+            frame = frame.f_back
+        for task in list(self._recordings):
+            if getattr(task.get_coro(), "cr_frame", None) in on_stack:
+                return task
+        return None
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    """Inner middleware recording updates while the profiler is enabled."""
+
+    def __init__(self, profiler: SamplingProfiler):
+        self.profiler = profiler
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not self.profiler.enabled:
+            return await handler(event, data)
+
+        recording = self.profiler.start()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            if recording is not None:
+                self.profiler.finish(recording, handler_name(data), time.perf_counter() - started)
@@ -0,0 +1,80 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.infrastructure import query_tracking
+from bot.infrastructure.query_tracking import QueryCounter, caller_stack
+from bot.infrastructure.request_context import current_handler, handler_name
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudget(QueryCounter):
+    """
+    Fails (or, when not strict, logs) if more than ``limit`` statements run inside the block.
+
+    Stack traces are captured only for statements over the limit, so a
+    budget that holds costs no more than a plain counter.
+    """
+
+    def __init__(self, limit: int, name: Optional[str] = None, strict: bool = True):
+        super().__init__(keep_statements=True)
+        self.limit = limit
+        self.name = name
+        self.strict = strict
+        self.overflow_stacks: List[str] = []
+
+    def record(self, statement: str) -> None:
+        super().record(statement)
+        if self.count > self.limit:
+            self.overflow_stacks.append(caller_stack())
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        super().__exit__(exc_type, exc, tb)
+        if exc_type is not None or self.count <= self.limit:
+            return
+
+        name = self.name or current_handler.get() or "unknown"
+        summary = f"{name}: {self.count} SQL statements, budget {self.limit}"
+        if self.strict:
+            statements = "\n".join(f"  {i}. {s}" for i, s in enumerate(self.statements, 1))
+            raise QueryBudgetExceeded(f"{summary}\n{statements}")
+
+        logger.warning(
+            f"Превышен бюджет запросов — {summary}\n"
+            + "\n".join(f"Запрос #{self.limit + i}:\n{stack}" for i, stack in enumerate(self.overflow_stacks, 1))
+        )
+
+
+def query_budget(session: AsyncSession, limit: int, name: Optional[str] = None,
+                 strict: bool = True) -> QueryBudget:
+    """Count statements the session's engine executes inside the ``with`` block."""
+    query_tracking.install(session.bind)
+    return QueryBudget(limit, name=name, strict=strict)
+
+
+class QueryBudgetMiddleware(BaseMiddleware):
+    """
+    Staging mode: logs handlers that go over their query budget instead of failing.
+
+    Budgets are looked up by handler name, with ``default`` for the rest.
+    """
+
+    def __init__(self, default: int, budgets: Optional[Dict[str, int]] = None):
+        self.default = default
+        self.budgets = budgets or {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        name = handler_name(data)
+        with QueryBudget(self.budgets.get(name, self.default), name=name, strict=False):
+            return await handler(event, data)
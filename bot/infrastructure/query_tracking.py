@@ -0,0 +1,70 @@
+import traceback
+from contextvars import ContextVar
+from typing import List, Tuple
+
+import greenlet
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+_active_counters: ContextVar[Tuple["QueryCounter", ...]] = ContextVar("active_query_counters", default=())
+
+
+class QueryCounter:
+    """
+    Counts SQL statements executed in the current context.
+
+    Counters nest: every counter entered in the current task sees the
+    statements issued while it is active.
+    """
+
+    def __init__(self, keep_statements: bool = False):
+        self.count = 0
+        self.keep_statements = keep_statements
+        self.statements: List[str] = []
+        self._token = None
+
+    def record(self, statement: str) -> None:
+        self.count += 1
+        if self.keep_statements:
+            self.statements.append(statement)
+
+    def __enter__(self) -> "QueryCounter":
+        self._token = _active_counters.set(_active_counters.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _active_counters.reset(self._token)
+
+
+def install(engine: AsyncEngine) -> None:
+    """Attach statement counting to the engine, once per engine."""
+    sync_engine = engine.sync_engine
+    if not event.contains(sync_engine, "before_cursor_execute", _on_before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _on_before_cursor_execute)
+
+
+_TRANSACTION_CONTROL = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+def _on_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # COMMIT и ROLLBACK идут мимо курсора; точки сохранения считаем так же,
+    # иначе тесты внутри SAVEPOINT насчитывают лишние запросы
+    if statement.startswith(_TRANSACTION_CONTROL):
+        return
+    for counter in _active_counters.get():
+        counter.record(statement)
+
+
+def caller_stack(limit: int = 25) -> str:
+    """
+    Stack of the code that issued the current statement.
+
+    Engine events run inside SQLAlchemy's greenlet, whose own stack ends at
+    ``greenlet_spawn``; the awaiting coroutines live in the parent greenlet.
+    """
+    parent = getattr(greenlet.getcurrent(), "parent", None)
+    frame = parent.gr_frame if parent is not None and parent.gr_frame is not None else None
+    if frame is None:
+        return "".join(traceback.format_stack(limit=limit)[:-1])
+    return "".join(traceback.format_stack(frame, limit=limit))
@@ -0,0 +1,15 @@
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+
+# Имя обработчика, который сейчас обслуживает обновление (для метрик и логов запросов)
+current_handler: ContextVar[Optional[str]] = ContextVar("current_handler", default=None)
+
+
+def handler_name(data: Dict[str, Any]) -> str:
+    """Name of the handler chosen for the update, resolving reply-keyboard text commands."""
+    handler = data.get("text_command") or data.get("handler")
+    callback = getattr(handler, "callback", None)
+    if callback is None:
+        return "unknown"
+    return getattr(callback, "__name__", type(callback).__name__)
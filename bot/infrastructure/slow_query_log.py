@@ -0,0 +1,84 @@
+import time
+from typing import Any, List, Optional
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from bot.infrastructure.request_context import current_handler
+
+
+SLOW_QUERY_EXTRA = "slow_query"
+
+
+class SlowQueryLog:
+    """
+    Logs statements slower than ``threshold_ms`` with their parameters,
+    the handler that issued them and, on SQLite, ``EXPLAIN QUERY PLAN``.
+    """
+
+    def __init__(self, threshold_ms: float, explain: bool = True):
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self._logger = logger.bind(**{SLOW_QUERY_EXTRA: True})
+
+    def install(self, engine: AsyncEngine) -> None:
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Время храним в контексте выполнения: при ошибке он просто отбрасывается
+        if context is not None:
+            context.slow_query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "slow_query_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        if elapsed < self.threshold:
+            return
+
+        plan = None
+        if self.explain and not executemany and conn.dialect.name == "sqlite" \
+                and statement.lstrip().upper().startswith("SELECT"):
+            plan = self._explain(conn, statement, parameters)
+
+        self._logger.warning(
+            "{elapsed:.1f} ms | handler={handler}\n{statement}\nparameters: {parameters}{plan}",
+            elapsed=elapsed * 1000,
+            handler=current_handler.get() or "-",
+            statement=statement,
+            parameters=parameters,
+            plan=f"\nplan:\n{plan}" if plan else "",
+        )
+
+    @staticmethod
+    def _explain(conn, statement: str, parameters: Any) -> Optional[str]:
+        # Сырой DBAPI-курсор, чтобы EXPLAIN не проходил через события движка
+        try:
+            cursor = conn.connection.dbapi_connection.cursor()
+            try:
+                cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                rows: List[tuple] = cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception as e:
+            return f"<EXPLAIN failed: {e}>"
+        return "\n".join(f"  {row[-1]}" for row in rows)
+
+
+def setup_slow_query_log(engine: AsyncEngine, path: str, threshold_ms: float, rotation: str) -> SlowQueryLog:
+    """Write slow statements to their own rotating file, apart from the main log."""
+    logger.add(
+        path,
+        format="{time:YYYY-MM-DD at HH:mm:ss} | {message}",
+        level="WARNING",
+        rotation=rotation,
+        enqueue=True,
+        filter=lambda record: record["extra"].get(SLOW_QUERY_EXTRA, False),
+    )
+    slow_query_log = SlowQueryLog(threshold_ms)
+    slow_query_log.install(engine)
+    return slow_query_log
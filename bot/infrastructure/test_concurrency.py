@@ -0,0 +1,146 @@
+import asyncio
+import random
+
+import pytest
+from aiogram.types import Chat
+
+from bot.infrastructure.concurrency import ChatOrderedConcurrencyMiddleware
+
+
+def chat_data(chat_id: int) -> dict:
+    return {"event_chat": Chat(id=chat_id, type="private")}
+
+
+@pytest.mark.asyncio
+async def test_updates_of_one_chat_keep_order_under_interleaving():
+    middleware = ChatOrderedConcurrencyMiddleware(limit=8)
+    rng = random.Random(7)
+    handled = {chat_id: [] for chat_id in range(5)}
+    running = 0
+    max_running = 0
+
+    async def handler(event, data):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(rng.uniform(0, 0.005))
+        handled[data["event_chat"].id].append(event)
+        running -= 1
+
+    submitted = {chat_id: [] for chat_id in range(5)}
+    for seq in range(200):
+        chat_id = rng.randrange(5)
+        submitted[chat_id].append(seq)
+        await middleware(handler, seq, chat_data(chat_id))
+
+    await middleware.drain()
+
+    assert handled == submitted
+    assert max_running > 1
+
+
+@pytest.mark.asyncio
+async def test_limit_applies_backpressure():
+    middleware = ChatOrderedConcurrencyMiddleware(limit=2)
+    release = asyncio.Event()
+
+    async def handler(event, data):
+        await release.wait()
+
+    await middleware(handler, 1, chat_data(1))
+    await middleware(handler, 2, chat_data(2))
+    third = asyncio.create_task(middleware(handler, 3, chat_data(3)))
+
+    await asyncio.sleep(0.01)
+    assert not third.done()
+    assert middleware.in_flight == 2
+
+    release.set()
+    await asyncio.wait_for(third, timeout=1)
+    await middleware.drain()
+    assert middleware.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_update_does_not_block_chat():
+    middleware = ChatOrderedConcurrencyMiddleware(limit=4)
+    handled = []
+
+    async def handler(event, data):
+        if event == "boom":
+            raise RuntimeError(event)
+        handled.append(event)
+
+    for event in ("first", "boom", "last"):
+        await middleware(handler, event, chat_data(1))
+    await middleware.drain()
+
+    assert handled == ["first", "last"]
+
+
+@pytest.mark.asyncio
+async def test_updates_without_chat_are_not_serialized():
+    middleware = ChatOrderedConcurrencyMiddleware(limit=4)
+    started = []
+    release = asyncio.Event()
+
+    async def handler(event, data):
+        started.append(event)
+        await release.wait()
+
+    await middleware(handler, 1, {})
+    await middleware(handler, 2, {})
+    await asyncio.sleep(0)
+
+    assert started == [1, 2]
+    release.set()
+    await middleware.drain()
+
+
+@pytest.mark.asyncio
+async def test_queued_update_sees_state_set_by_previous_update():
+    from aiogram.fsm.context import FSMContext
+    from aiogram.fsm.storage.base import StorageKey
+    from aiogram.fsm.storage.memory import MemoryStorage
+
+    middleware = ChatOrderedConcurrencyMiddleware(limit=4)
+    state = FSMContext(MemoryStorage(), StorageKey(bot_id=1, chat_id=1, user_id=1))
+    seen = []
+
+    async def set_state(event, data):
+        await asyncio.sleep(0.01)
+        await data["state"].set_state("waiting_for_table_name")
+
+    async def read_state(event, data):
+        seen.append(data["raw_state"])
+
+    await middleware(set_state, 1, {**chat_data(1), "state": state, "raw_state": None})
+    await middleware(read_state, 2, {**chat_data(1), "state": state, "raw_state": None})
+    await middleware.drain()
+
+    assert seen == ["waiting_for_table_name"]
+
+
+@pytest.mark.asyncio
+async def test_update_waiting_for_a_slot_sees_fresh_state():
+    from aiogram.fsm.context import FSMContext
+    from aiogram.fsm.storage.base import StorageKey
+    from aiogram.fsm.storage.memory import MemoryStorage
+
+    middleware = ChatOrderedConcurrencyMiddleware(limit=1)
+    state = FSMContext(MemoryStorage(), StorageKey(bot_id=1, chat_id=1, user_id=1))
+    seen = []
+
+    async def set_state(event, data):
+        await asyncio.sleep(0.01)
+        await data["state"].set_state("choosing_type")
+
+    async def read_state(event, data):
+        seen.append(data["raw_state"])
+
+    await middleware(set_state, 1, {**chat_data(1), "state": state, "raw_state": None})
+    # Слот освободится только после первого обновления, которое к тому времени уйдёт из очереди чата
+    await middleware(read_state, 2, {**chat_data(1), "state": state, "raw_state": None})
+    await middleware.drain()
+
+    assert seen == ["choosing_type"]
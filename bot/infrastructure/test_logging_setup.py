@@ -0,0 +1,70 @@
+import pytest
+from loguru import logger
+
+from bot.infrastructure import logging_setup
+from bot.infrastructure.logging_setup import ModuleLevelFilter, RateLimitedLogger
+
+
+def make_record(name, level, **extra):
+    return {"name": name, "level": logger.level(level), "extra": extra}
+
+
+def test_module_levels_use_longest_prefix():
+    module_filter = ModuleLevelFilter("INFO", {"bot.dao": "WARNING", "bot.dao.dao": "DEBUG"})
+
+    assert module_filter(make_record("bot.main", "INFO"))
+    assert not module_filter(make_record("bot.dao.base", "INFO"))
+    assert module_filter(make_record("bot.dao.base", "ERROR"))
+    assert module_filter(make_record("bot.dao.dao", "DEBUG"))
+    assert not module_filter(make_record("bot.daos", "DEBUG"))
+    assert module_filter.min_level == logger.level("DEBUG").no
+
+
+def test_excluded_extra_is_filtered_out():
+    module_filter = ModuleLevelFilter("INFO", exclude_extra="slow_query")
+
+    assert not module_filter(make_record("bot.main", "WARNING", slow_query=True))
+
+
+@pytest.fixture
+def messages():
+    messages = []
+    sink_id = logger.add(lambda m: messages.append(m.record["message"]), level="INFO")
+    yield messages
+    logger.remove(sink_id)
+
+
+def test_rate_limited_logger_drops_over_budget_and_reports_it(messages, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(logging_setup.time, "monotonic", lambda: now[0])
+    hot = RateLimitedLogger(rate=1, burst=2)
+
+    for i in range(5):
+        hot.info("Поиск {} с ID: {}", "User", i)
+    now[0] += 1
+    hot.info("Поиск {} с ID: {}", "User", 5)
+
+    assert messages == [
+        "Поиск User с ID: 0",
+        "Поиск User с ID: 1",
+        "Поиск User с ID: 5 (+3 похожих пропущено)",
+    ]
+
+
+def test_rate_limited_logger_keeps_templates_apart(messages):
+    hot = RateLimitedLogger(rate=1, burst=1)
+
+    hot.info("Найдено {} записей.", 1)
+    hot.info("Найдено {} записей.", 2)
+    hot.info("Удалено {} записей.", 3)
+
+    assert messages == ["Найдено 1 записей.", "Удалено 3 записей."]
+
+
+def test_rate_limit_disabled_logs_everything(messages):
+    hot = RateLimitedLogger(rate=0)
+
+    for i in range(50):
+        hot.info("Запись с ID {} найдена.", i)
+
+    assert len(messages) == 50
@@ -0,0 +1,33 @@
+from bot.infrastructure.lru_cache import LRUCache
+from bot.infrastructure.metrics import cache_requests
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache("test_lru", maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+    cache.put("c", 3)
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_lookups_are_counted():
+    cache = LRUCache("test_lru_metrics", maxsize=1)
+    cache.put("a", 1)
+
+    cache.get("a")
+    cache.get("b")
+
+    assert cache_requests.value("test_lru_metrics", "hit") == 1
+    assert cache_requests.value("test_lru_metrics", "miss") == 1
+
+
+def test_zero_size_disables_caching():
+    cache = LRUCache("test_lru_disabled", maxsize=0)
+    cache.put("a", 1)
+
+    assert cache.get("a") is None
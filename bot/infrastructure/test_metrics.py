@@ -0,0 +1,82 @@
+import pytest
+import pytest_asyncio
+from aiogram.dispatcher.event.handler import CallableObject
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from bot.infrastructure import query_tracking
+from bot.infrastructure.metrics import MetricsMiddleware, MetricsRegistry, handler_latency, handler_sql_statements, handler_errors
+
+
+@pytest_asyncio.fixture
+async def engine():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    query_tracking.install(engine)
+    yield engine
+    await engine.dispose()
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", ("handler",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "a")
+    histogram.observe(0.5, "a")
+    histogram.observe(3, "a")
+
+    rendered = registry.render()
+
+    assert 'latency_seconds_bucket{handler="a",le="0.1"} 1' in rendered
+    assert 'latency_seconds_bucket{handler="a",le="1"} 2' in rendered
+    assert 'latency_seconds_bucket{handler="a",le="+Inf"} 3' in rendered
+    assert 'latency_seconds_count{handler="a"} 3' in rendered
+    assert "# TYPE latency_seconds histogram" in rendered
+
+
+def test_gauge_renders_last_value():
+    registry = MetricsRegistry()
+    gauge = registry.gauge("used_bytes", "Used bytes", ("db",))
+    gauge.set(10, "hot")
+    gauge.set(4096, "hot")
+
+    rendered = registry.render()
+
+    assert "# TYPE used_bytes gauge" in rendered
+    assert 'used_bytes{db="hot"} 4096' in rendered
+
+
+def test_histogram_quantile_interpolates():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("h", "h", buckets=(1.0, 2.0))
+    for _ in range(10):
+        histogram.observe(1.5)
+
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    assert registry.histogram("empty", "e").quantile(0.99) is None
+
+
+@pytest.mark.asyncio
+async def test_middleware_records_latency_and_sql_statements(engine):
+    async def view_metrics_probe(event, session_engine):
+        async with session_engine.connect() as conn:
+            for _ in range(3):
+                await conn.execute(text("select 1"))
+
+    before = handler_latency.count("view_metrics_probe")
+    data = {"handler": CallableObject(view_metrics_probe), "session_engine": engine}
+
+    await MetricsMiddleware()(lambda event, data: view_metrics_probe(event, data["session_engine"]), None, data)
+
+    assert handler_latency.count("view_metrics_probe") == before + 1
+    assert 'bot_handler_sql_statements_sum{handler="view_metrics_probe"} 3' in "\n".join(handler_sql_statements.render())
+
+
+@pytest.mark.asyncio
+async def test_middleware_counts_errors():
+    async def failing_probe(event):
+        raise RuntimeError("boom")
+
+    data = {"handler": CallableObject(failing_probe)}
+    with pytest.raises(RuntimeError):
+        await MetricsMiddleware()(lambda event, data: failing_probe(event), None, data)
+
+    assert handler_errors.value("failing_probe") == 1
@@ -0,0 +1,74 @@
+import asyncio
+import os
+import time
+
+import pytest
+from aiogram.dispatcher.event.handler import CallableObject, HandlerObject
+
+from bot.infrastructure import profiling
+from bot.infrastructure.profiling import SamplingProfiler, ProfilingMiddleware
+
+
+async def slow_handler(event, data):
+    deadline = time.perf_counter() + 0.03
+    while time.perf_counter() < deadline:
+        pass
+    await asyncio.sleep(0.03)
+
+
+def handler_data():
+    return {"handler": HandlerObject(callback=slow_handler)}
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    profiler = SamplingProfiler(str(tmp_path), threshold=0.01, interval=0.001, max_dumps_per_minute=2)
+    yield profiler
+    profiler.disable()
+
+
+@pytest.mark.asyncio
+async def test_slow_update_is_dumped_as_collapsed_stacks(profiler, tmp_path):
+    profiler.enable()
+    await ProfilingMiddleware(profiler)(slow_handler, None, handler_data())
+
+    dumps = os.listdir(tmp_path)
+    assert len(dumps) == 1
+    assert "slow_handler" in dumps[0] and dumps[0].endswith(".collapsed")
+
+    lines = (tmp_path / dumps[0]).read_text().splitlines()
+    stacks = [line.rsplit(" ", 1) for line in lines]
+    assert all(count.isdigit() for _, count in stacks)
+    assert any("slow_handler (test_profiling.py" in stack for stack, _ in stacks)
+    assert any(stack.endswith("[await]") for stack, _ in stacks)
+
+
+@pytest.mark.asyncio
+async def test_dumps_are_capped_per_minute(profiler, tmp_path):
+    profiler.enable()
+    middleware = ProfilingMiddleware(profiler)
+    for _ in range(4):
+        await middleware(slow_handler, None, handler_data())
+
+    assert len(os.listdir(tmp_path)) == 2
+
+
+@pytest.mark.asyncio
+async def test_disabled_profiler_records_nothing(profiler, tmp_path):
+    await ProfilingMiddleware(profiler)(slow_handler, None, handler_data())
+
+    assert not profiler.enabled
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_running_task_is_found_without_asyncio_registry(profiler, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "_current_tasks", None)
+    profiler.enable()
+    await ProfilingMiddleware(profiler)(slow_handler, None, handler_data())
+
+    stacks = [line.rsplit(" ", 1)[0] for line in (tmp_path / os.listdir(tmp_path)[0]).read_text().splitlines()]
+    # Стек потока цикла начинается с кода asyncio, стек await — с самой корутины
+    assert any(stack.rsplit(";", 1)[-1].startswith("slow_handler (") and "base_events.py" in stack
+               for stack in stacks)
+    assert profiler._thread.is_alive()
@@ -0,0 +1,48 @@
+import pytest
+import pytest_asyncio
+from aiogram.dispatcher.event.handler import CallableObject
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from bot.infrastructure.query_budget import QueryBudgetMiddleware, query_budget
+from bot.infrastructure import query_tracking
+
+
+@pytest_asyncio.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    query_tracking.install(engine)
+    async with AsyncSession(engine) as session:
+        yield session
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_budget_within_limit_passes(session):
+    with query_budget(session, 2) as budget:
+        await session.execute(text("select 1"))
+        await session.execute(text("select 2"))
+
+    assert budget.count == 2
+    assert budget.overflow_stacks == []
+
+
+@pytest.mark.asyncio
+async def test_staging_middleware_logs_offending_handler_with_stack(session):
+    messages = []
+    sink_id = logger.add(messages.append, level="WARNING", format="{message}")
+
+    async def chatty_handler(event, data):
+        for _ in range(3):
+            await session.execute(text("select 1"))
+
+    middleware = QueryBudgetMiddleware(default=10, budgets={"chatty_handler": 1})
+    try:
+        await middleware(chatty_handler, None, {"handler": CallableObject(chatty_handler)})
+    finally:
+        logger.remove(sink_id)
+
+    assert len(messages) == 1
+    assert "chatty_handler: 3 SQL statements, budget 1" in messages[0]
+    assert "in chatty_handler" in messages[0]
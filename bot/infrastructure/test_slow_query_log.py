@@ -0,0 +1,86 @@
+import pytest
+import pytest_asyncio
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from bot.infrastructure.request_context import current_handler
+from bot.infrastructure.slow_query_log import SlowQueryLog, SLOW_QUERY_EXTRA
+
+
+@pytest_asyncio.fixture
+async def engine():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.execute(text("create table items (id integer primary key, table_id integer)"))
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def slow_records():
+    records = []
+    sink_id = logger.add(
+        records.append, format="{message}",
+        filter=lambda record: record["extra"].get(SLOW_QUERY_EXTRA, False)
+    )
+    yield records
+    logger.remove(sink_id)
+
+
+@pytest.mark.asyncio
+async def test_logs_slow_select_with_parameters_handler_and_plan(engine, slow_records):
+    SlowQueryLog(threshold_ms=0).install(engine)
+
+    token = current_handler.set("view_balance")
+    try:
+        async with AsyncSession(engine) as session:
+            await session.execute(text("select * from items where table_id = :table_id"), {"table_id": 7})
+    finally:
+        current_handler.reset(token)
+
+    assert len(slow_records) == 1
+    message = slow_records[0]
+    assert "handler=view_balance" in message
+    assert "select * from items where table_id = ?" in message
+    assert "parameters: (7,)" in message
+    assert "SCAN items" in message
+
+
+@pytest.mark.asyncio
+async def test_fast_statements_are_not_logged(engine, slow_records):
+    SlowQueryLog(threshold_ms=10_000).install(engine)
+
+    async with AsyncSession(engine) as session:
+        await session.execute(text("select 1"))
+
+    assert slow_records == []
+
+
+@pytest.mark.asyncio
+async def test_plan_is_only_requested_for_selects(engine, slow_records):
+    SlowQueryLog(threshold_ms=0).install(engine)
+
+    async with AsyncSession(engine) as session:
+        await session.execute(text("insert into items (table_id) values (:table_id)"), {"table_id": 1})
+        await session.commit()
+
+    assert len(slow_records) == 1
+    assert "plan:" not in slow_records[0]
+
+
+@pytest.mark.asyncio
+async def test_failed_statement_leaves_no_timing_behind(engine, slow_records):
+    SlowQueryLog(threshold_ms=0).install(engine)
+
+    async with engine.connect() as conn:
+        await conn.execute(text("insert into items (id, table_id) values (1, 1)"))
+        with pytest.raises(IntegrityError):
+            await conn.execute(text("insert into items (id, table_id) values (1, 2)"))
+        await conn.execute(text("select * from items"))
+
+        assert "slow_query_started" not in conn.sync_connection.info
+
+    assert len(slow_records) == 2
+    assert "select * from items" in slow_records[1]
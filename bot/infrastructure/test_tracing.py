@@ -0,0 +1,104 @@
+import json
+from datetime import datetime
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Update, Message, Chat, User
+
+from bot.dao.dao import UserDao
+from bot.infrastructure.tracing import (
+    Tracer, JsonFileExporter, TracingMiddleware, STATUS_ERROR, current_span, trace_methods, tracer
+)
+
+
+@pytest.fixture
+def exported(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    exporter = JsonFileExporter(str(path))
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+    monkeypatch.setattr(tracer, "exporter", exporter)
+
+    def read():
+        exporter.close()
+        lines = path.read_text().splitlines() if path.exists() else []
+        return [
+            span
+            for line in lines
+            for span in json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        ]
+
+    return read
+
+
+@trace_methods
+class SampleUseCase:
+    async def compute(self, value: int) -> int:
+        return value * 2
+
+    async def explode(self):
+        raise ValueError("boom")
+
+
+@pytest.mark.asyncio
+async def test_spans_nest_under_the_update_root(exported):
+    with tracer.start_trace("update", **{"update.id": 42}):
+        assert await SampleUseCase().compute(21) == 42
+
+    root, = [span for span in exported() if "parentSpanId" not in span]
+    child, = [span for span in exported() if span.get("parentSpanId") == root["spanId"]]
+    assert child["name"] == "SampleUseCase.compute"
+    assert child["traceId"] == root["traceId"]
+    assert {"key": "update.id", "value": {"intValue": "42"}} in root["attributes"]
+
+
+@pytest.mark.asyncio
+async def test_dao_classmethod_spans_use_concrete_class_name(exported):
+    class FakeSession:
+        async def execute(self, query):
+            raise RuntimeError("no db")
+
+    with tracer.start_trace("update"):
+        with pytest.raises(RuntimeError):
+            await UserDao.count(FakeSession())
+
+    dao_span, = [span for span in exported() if span["name"].endswith(".count")]
+    assert dao_span["name"] == "UserDao.count"
+    assert dao_span["status"]["code"] == STATUS_ERROR
+
+
+@pytest.mark.asyncio
+async def test_unsampled_update_records_nothing(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    local = Tracer(sample_rate=0.0, exporter=JsonFileExporter(str(path)))
+
+    with local.start_trace("update"):
+        assert current_span() is None
+        with local.span("child") as child:
+            child.set_attribute("ignored", True)
+
+    assert not path.exists()
+
+
+@pytest.mark.asyncio
+async def test_tracing_middleware_wraps_dispatched_update(exported):
+    router = Router()
+
+    @router.message()
+    async def echo(message: Message):
+        with pytest.raises(ValueError):
+            await SampleUseCase().explode()
+
+    dp = Dispatcher()
+    dp.update.outer_middleware(TracingMiddleware())
+    dp.include_router(router)
+
+    update = Update(update_id=7, message=Message(
+        message_id=1, date=datetime.now(), chat=Chat(id=1, type="private"),
+        from_user=User(id=1, is_bot=False, first_name="A"), text="hi"
+    ))
+    await dp.feed_update(bot=Bot("42:TEST"), update=update)
+
+    spans = exported()
+    assert [span["name"] for span in spans] == ["SampleUseCase.explode", "update"]
+    assert spans[0]["status"] == {"code": STATUS_ERROR, "message": "ValueError: boom"}
+    assert {"key": "update.type", "value": {"stringValue": "message"}} in spans[1]["attributes"]
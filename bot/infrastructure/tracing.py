@@ -0,0 +1,253 @@
+import functools
+import inspect
+import json
+import os
+import random
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TextIO
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+
+from bot.infrastructure.request_context import handler_name
+
+
+SERVICE_NAME = "bill-separator-bot"
+
+# OTLP: SPAN_KIND_INTERNAL / SPAN_KIND_SERVER / SPAN_KIND_CLIENT, STATUS_CODE_OK / STATUS_CODE_ERROR
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class _NoopSpan:
+    """Returned when the update is not sampled; entering it costs nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        return None
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Trace:
+    __slots__ = ("trace_id", "spans", "exporter", "closed")
+
+    def __init__(self, exporter: Optional["JsonFileExporter"]):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List["Span"] = []
+        self.exporter = exporter
+        self.closed = False
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "attributes",
+                 "start_ns", "end_ns", "error", "_token")
+
+    def __init__(self, trace: _Trace, name: str, parent_id: Optional[str], kind: int,
+                 attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = 0
+        self.end_ns = 0
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end_ns = time.time_ns()
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+
+        trace = self.trace
+        # Спаны фоновых задач, завершившиеся после корневого, отбрасываются
+        if trace.closed:
+            return
+        trace.spans.append(self)
+        if self.parent_id is None:
+            trace.closed = True
+            if trace.exporter is not None:
+                trace.exporter.export(trace.spans)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": STATUS_ERROR, "message": self.error} if self.error else {"code": STATUS_OK},
+        }
+        if self.parent_id is not None:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+class JsonFileExporter:
+    """
+    Appends every finished trace to a file as one OTLP/JSON ``ExportTraceServiceRequest``
+    per line, the layout the OpenTelemetry Collector file exporter/receiver uses.
+    """
+
+    def __init__(self, path: str, service_name: str = SERVICE_NAME):
+        self.path = path
+        self.service_name = service_name
+        self._file: Optional[TextIO] = None
+
+    def export(self, spans: List[Span]) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "bot.infrastructure.tracing"},
+                    "spans": [span.to_otlp() for span in spans],
+                }],
+            }]
+        }
+        self._file.write(json.dumps(request, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Tracer:
+    """
+    Per-update tracing with head sampling.
+
+    The sampling decision is made once, when the root span opens. Child
+    spans of an unsampled update are a single context variable lookup.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, exporter: Optional[JsonFileExporter] = None):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    def configure(self, sample_rate: float, exporter: Optional[JsonFileExporter]) -> None:
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    def start_trace(self, name: str, kind: int = KIND_SERVER, **attributes: Any):
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return NOOP_SPAN
+        return Span(_Trace(self.exporter), name, None, kind, attributes)
+
+    def span(self, name: str, kind: int = KIND_INTERNAL, **attributes: Any):
+        parent = _current_span.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(parent.trace, name, parent.span_id, kind, attributes)
+
+
+tracer = Tracer()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def _traced(func: Callable[..., Awaitable[Any]], name: Optional[str]) -> Callable[..., Awaitable[Any]]:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if _current_span.get() is None:
+            return await func(*args, **kwargs)
+        # Для classmethod имя берётся от фактического класса (UserDao, а не BaseDAO)
+        span_name = name or f"{args[0].__name__}.{func.__name__}"
+        with tracer.span(span_name):
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+def trace_methods(cls: type) -> type:
+    """Class decorator: open a span around each public coroutine method and classmethod."""
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith("_"):
+            continue
+        if isinstance(value, classmethod) and inspect.iscoroutinefunction(value.__func__):
+            setattr(cls, attr, classmethod(_traced(value.__func__, None)))
+        elif inspect.iscoroutinefunction(value):
+            setattr(cls, attr, _traced(value, f"{cls.__name__}.{attr}"))
+    return cls
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Outer update middleware opening the root span of every sampled update."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        attributes = {}
+        if isinstance(event, Update):
+            attributes = {"update.id": event.update_id, "update.type": event.event_type}
+        with tracer.start_trace("update", **attributes):
+            return await handler(event, data)
+
+
+def traced_middleware(name: str) -> Callable:
+    """Wrap an inner middleware's ``__call__`` in a span named after it."""
+
+    def decorator(call: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(call)
+        async def wrapper(self, handler, event, data):
+            span = tracer.span(name)
+            with span:
+                span.set_attribute("handler", handler_name(data))
+                return await call(self, handler, event, data)
+
+        return wrapper
+
+    return decorator
+
+
+class TelegramTracingMiddleware(BaseRequestMiddleware):
+    """Bot session middleware: a client span per Telegram API call."""
+
+    async def __call__(self, make_request, bot, method):
+        api_method = getattr(method, "__api_method__", type(method).__name__)
+        with tracer.span(f"telegram.{api_method}", kind=KIND_CLIENT):
+            return await make_request(bot, method)
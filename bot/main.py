@@ -1,29 +1,121 @@
 import asyncio
 import sys
+from datetime import timedelta
+from typing import Optional
 from loguru import logger
 
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.exceptions import TelegramNetworkError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from bot.config import settings
-from bot.dao.database import engine, Base
+from bot.config import settings, slow_query_log_path, traces_file_path, profiles_dir
+from bot.dao.database import engine, Base, async_session_maker, archive_engine, archive_session_maker
 from bot.infrastructure.database_middleware import DatabaseMiddleware
-from bot.adapters.handlers import start_handler, table_handler, expense_handler
+from bot.infrastructure.concurrency import ChatOrderedConcurrencyMiddleware
+from bot.infrastructure import query_tracking
+from bot.infrastructure.metrics import MetricsMiddleware, start_metrics_server
+from bot.infrastructure.query_budget import QueryBudgetMiddleware
+from bot.infrastructure.profiling import SamplingProfiler, ProfilingMiddleware
+from bot.infrastructure.slow_query_log import setup_slow_query_log
+from bot.infrastructure.tracing import tracer, JsonFileExporter, TracingMiddleware, TelegramTracingMiddleware
+from bot.adapters.closed_tables import ClosedTableMiddleware
+from bot.adapters.handlers import admin_handler, start_handler, table_handler, expense_handler, settlement_handler
+from bot.adapters.text_commands import text_commands
+from bot.use_cases.archive_use_cases import archive_inactive_tables, create_archive_tables, ensure_monotonic_ids
+from bot.use_cases.table_use_cases import ensure_unique_membership
 
 
 async def create_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(ensure_unique_membership)
+    if archive_engine is not None:
+        await create_archive_tables(archive_engine)
+    await ensure_monotonic_ids(engine, archive_engine)
     logger.info("Database tables created successfully")
 
 
+async def archive_periodically():
+    """Move tables without activity to the archive database, in batches, every ARCHIVE_INTERVAL_MINUTES."""
+    inactive_for = timedelta(days=settings.ARCHIVE_INACTIVE_DAYS)
+    while True:
+        try:
+            await archive_inactive_tables(
+                async_session_maker, archive_session_maker, inactive_for, settings.ARCHIVE_BATCH_SIZE
+            )
+        except Exception as e:
+            logger.error(f"Archiving failed: {e}")
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL_MINUTES * 60)
+
+
+def build_dispatcher(
+    session_maker: async_sessionmaker[AsyncSession] = async_session_maker,
+    storage: Optional[BaseStorage] = None,
+    concurrency: Optional[ChatOrderedConcurrencyMiddleware] = None,
+    profiler: Optional[SamplingProfiler] = None
+) -> Dispatcher:
+    """
+    Dispatcher with every middleware and router the bot runs with.
+
+    The routers are module-level, so it can be built once per process.
+    """
+    dp = Dispatcher(storage=storage or MemoryStorage())
+    if profiler is not None:
+        dp["profiler"] = profiler
+    
+    if concurrency is not None:
+        dp.update.outer_middleware(concurrency)
+    dp.update.outer_middleware(TracingMiddleware())
+    
+    budget = None
+    if settings.QUERY_BUDGET_DEFAULT:
+        budget = QueryBudgetMiddleware(settings.QUERY_BUDGET_DEFAULT, settings.QUERY_BUDGETS)
+    for observer in (dp.message, dp.callback_query):
+        observer.middleware(MetricsMiddleware())
+        if budget is not None:
+            observer.middleware(budget)
+        if profiler is not None:
+            observer.middleware(ProfilingMiddleware(profiler))
+        observer.middleware(ClosedTableMiddleware())
+        observer.middleware(DatabaseMiddleware(session_maker))
+    
+    dp.include_router(admin_handler.router)
+    dp.include_router(text_commands)
+    dp.include_router(start_handler.router)
+    dp.include_router(table_handler.router)
+    dp.include_router(expense_handler.router)
+    dp.include_router(settlement_handler.router)
+    return dp
+
+
 async def main():    
     await create_tables()
     
+    query_tracking.install(engine)
+    if settings.SLOW_QUERY_THRESHOLD_MS:
+        setup_slow_query_log(
+            engine, slow_query_log_path, settings.SLOW_QUERY_THRESHOLD_MS, settings.SLOW_QUERY_LOG_ROTATION
+        )
+    
+    trace_exporter = None
+    if settings.TRACING_SAMPLE_RATE > 0:
+        trace_exporter = JsonFileExporter(traces_file_path)
+        tracer.configure(settings.TRACING_SAMPLE_RATE, trace_exporter)
+    
     bot = None
+    concurrency = None
+    metrics_runner = None
+    archiver = None
+    profiler = SamplingProfiler(
+        profiles_dir,
+        threshold=settings.PROFILE_THRESHOLD_MS / 1000,
+        interval=settings.PROFILE_SAMPLE_INTERVAL_MS / 1000,
+        max_dumps_per_minute=settings.PROFILE_MAX_DUMPS_PER_MINUTE
+    )
     try:
         logger.info("Starting bot...")
         
@@ -31,24 +123,32 @@ async def main():
             token=settings.BOT_TOKEN,
             default=DefaultBotProperties(parse_mode=ParseMode.HTML)
         )
+        bot.session.middleware(TelegramTracingMiddleware())
         
         await bot.delete_webhook(drop_pending_updates=True)
         logger.info("Dropped pending updates")
         
-        dp = Dispatcher(storage=MemoryStorage())
+        me = await bot.me()
+        logger.info(f"Bot identity: @{me.username}")
         
-        dp.message.middleware(DatabaseMiddleware())
-        dp.callback_query.middleware(DatabaseMiddleware())
+        if settings.UPDATES_CONCURRENCY_LIMIT > 0:
+            concurrency = ChatOrderedConcurrencyMiddleware(settings.UPDATES_CONCURRENCY_LIMIT)
+            logger.info(f"Concurrent update handling enabled, limit {concurrency.limit}")
         
-        dp.include_router(start_handler.router)
-        dp.include_router(table_handler.router)
-        dp.include_router(expense_handler.router)
+        dp = build_dispatcher(concurrency=concurrency, profiler=profiler)
+        
+        if settings.METRICS_PORT:
+            metrics_runner = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+        
+        if archive_engine is not None:
+            archiver = asyncio.create_task(archive_periodically())
         
         logger.info("Bot started successfully")
         
         await dp.start_polling(
             bot,
-            allowed_updates=dp.resolve_used_update_types()
+            allowed_updates=dp.resolve_used_update_types(),
+            handle_as_tasks=concurrency is None
         )
 
     except KeyboardInterrupt:
@@ -58,6 +158,15 @@ async def main():
         logger.error(f"Unexpected error: {e}. Retrying in {retry_delay} seconds...")
         
     finally:
+        profiler.disable()
+        if concurrency:
+            await concurrency.drain()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        if archiver:
+            archiver.cancel()
+        if trace_exporter:
+            trace_exporter.close()
         if bot:
             try:
                 await bot.session.close()
@@ -67,9 +176,13 @@ async def main():
     
     try:
         await engine.dispose()
+        if archive_engine is not None:
+            await archive_engine.dispose()
         logger.info("Database engine disposed")
     except:
         pass
+    
+    await logger.complete()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,286 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+from loguru import logger
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy import select, delete, insert, func, text
+from sqlalchemy.orm import aliased
+from bot.dao import database
+from bot.dao.dao import ArchivedTableDao
+from bot.dao.database import Base
+from bot.dao.models import (
+    ArchivedTable, BalanceSnapshot, DiningTable, Item, TableEvent, TableItem, Transaction, UserItemConsumption
+)
+from bot.domain.entities import ArchiveReport
+from bot.infrastructure.metrics import archive_rows, archive_tables, hot_database_bytes
+from bot.infrastructure.tracing import trace_methods
+from bot.use_cases.ledger_use_cases import LedgerUseCase
+from pydantic import BaseModel
+
+
+# Таблицы, строки которых уезжают в архив, в порядке вставки
+ARCHIVED_MODELS = (Item, TableItem, UserItemConsumption, Transaction, TableEvent, BalanceSnapshot)
+
+# Не больше стольких id в одном IN: лимит переменных SQLite
+_CHUNK = 500
+
+
+class CreateArchivedTableInput(BaseModel):
+    table_id: int
+    rows: int
+
+
+def _chunks(values: Sequence[Any], size: int = _CHUNK):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _latest_snapshot_for(table_id_column):
+    inner = aliased(BalanceSnapshot)
+    return (
+        select(func.max(inner.last_event_id))
+        .filter(inner.table_id == table_id_column)
+        .scalar_subquery()
+    )
+
+
+def _rows_filter(model, table_ids, keep_latest: bool):
+    """Rows of ``model`` that belong to the tables; with ``keep_latest`` the ledger tail stays."""
+    item_ids = select(TableItem.item_id).filter(TableItem.table_id.in_(table_ids))
+    if model is Item:
+        return Item.id.in_(item_ids)
+    if model is UserItemConsumption:
+        return UserItemConsumption.item_id.in_(item_ids)
+    if model is TableEvent and keep_latest:
+        return TableEvent.table_id.in_(table_ids) & (TableEvent.id <= _latest_snapshot_for(TableEvent.table_id))
+    if model is BalanceSnapshot and keep_latest:
+        inner = aliased(BalanceSnapshot)
+        newest_id = select(func.max(inner.id)).filter(inner.table_id == BalanceSnapshot.table_id).scalar_subquery()
+        return BalanceSnapshot.table_id.in_(table_ids) & (BalanceSnapshot.id < newest_id)
+    return model.table_id.in_(table_ids)
+
+
+async def create_archive_tables(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[model.__table__ for model in ARCHIVED_MODELS])
+
+
+def _rebuild_with_autoincrement(conn: Connection) -> None:
+    for model in ARCHIVED_MODELS:
+        table = model.__table__
+        sql = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+        ).scalar()
+        if sql is None or "AUTOINCREMENT" in sql.upper():
+            continue
+        old_name = f"{table.name}_without_autoincrement"
+        # Со старым поведением RENAME не переписывает внешние ключи других таблиц на old_name
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+        try:
+            conn.exec_driver_sql(f'ALTER TABLE "{table.name}" RENAME TO "{old_name}"')
+        finally:
+            conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+        for index in table.indexes:
+            conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{index.name}"')
+        table.create(conn)
+        columns = ", ".join(f'"{column.name}"' for column in table.columns)
+        conn.exec_driver_sql(f'INSERT INTO "{table.name}" ({columns}) SELECT {columns} FROM "{old_name}"')
+        conn.exec_driver_sql(f'DROP TABLE "{old_name}"')
+        logger.info("Таблица {} пересоздана с AUTOINCREMENT", table.name)
+
+
+async def ensure_monotonic_ids(engine: AsyncEngine, archive_engine: Optional[AsyncEngine] = None) -> None:
+    """
+    Make sure the main SQLite database never hands out an id that is in the archive.
+
+    Tables created before they were AUTOINCREMENT are rebuilt, and their
+    sequences are raised above the largest archived id: rows archived
+    before the rebuild may hold ids above the current maximum.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    async with engine.begin() as conn:
+        await conn.run_sync(_rebuild_with_autoincrement)
+    if archive_engine is None:
+        return
+
+    async with archive_engine.connect() as archive:
+        floors = {
+            model.__tablename__: await archive.scalar(select(func.max(model.__table__.c.id)))
+            for model in ARCHIVED_MODELS
+        }
+    async with engine.begin() as conn:
+        for name, floor in floors.items():
+            if floor is None:
+                continue
+            params = {"name": name, "floor": floor}
+            await conn.execute(text("UPDATE sqlite_sequence SET seq = :floor WHERE name = :name AND seq < :floor"),
+                               params)
+            await conn.execute(text(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT :name, :floor "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+            ), params)
+
+
+async def used_bytes(session: AsyncSession) -> Optional[int]:
+    """Bytes taken by live pages of a SQLite database; freed pages are reused, not returned to the OS."""
+    if session.get_bind().dialect.name != "sqlite":
+        return None
+    page_count = await session.scalar(text("PRAGMA page_count"))
+    freelist_count = await session.scalar(text("PRAGMA freelist_count"))
+    page_size = await session.scalar(text("PRAGMA page_size"))
+    return (page_count - freelist_count) * page_size
+
+
+@trace_methods
+class ArchiveUseCase:
+    """
+    Move inactive tables to a separate archive database and back.
+
+    An archived table keeps its row, members and latest balance snapshot in
+    the main database, so balances, the dashboard and settlement keep
+    working. Its items, consumptions, repayments and the events and
+    snapshots behind the latest snapshot move to the archive and come back
+    when someone opens the table.
+
+    Rows keep their ids both ways, so the archived tables never reuse ids:
+    they are AUTOINCREMENT on SQLite (see ``ensure_monotonic_ids``).
+    """
+
+    def __init__(self, session: AsyncSession,
+                 archive_session_maker: Optional[async_sessionmaker[AsyncSession]] = None):
+        self.session = session
+        self.archive_session_maker = archive_session_maker or database.archive_session_maker
+        self.ledger = LedgerUseCase(session)
+
+    async def find_inactive_tables(self, inactive_for: timedelta, limit: int) -> List[int]:
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - inactive_for
+        last_event_at = (
+            select(func.max(TableEvent.created_at))
+            .filter(TableEvent.table_id == DiningTable.id)
+            .scalar_subquery()
+        )
+        result = await self.session.execute(
+            select(DiningTable.id)
+            .filter(func.coalesce(last_event_at, DiningTable.created_at) < cutoff,
+                    DiningTable.id.notin_(select(ArchivedTable.table_id)))
+            .order_by(DiningTable.id)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def archive_batch(self, inactive_for: timedelta, batch_size: int) -> ArchiveReport:
+        """Archive up to ``batch_size`` tables without activity for ``inactive_for``."""
+        table_ids = await self.find_inactive_tables(inactive_for, batch_size)
+        report = ArchiveReport(tables=table_ids, rows={})
+        if not table_ids:
+            return report
+
+        report.used_bytes_before = await used_bytes(self.session)
+        for table_id in table_ids:
+            # Последний снимок покрывает все события: ленте стола в основной базе хватает его
+            await self.ledger.take_snapshot(table_id)
+
+        moved: Dict[Any, List[Dict[str, Any]]] = {}
+        for model in ARCHIVED_MODELS:
+            result = await self.session.execute(
+                select(model.__table__).where(_rows_filter(model, table_ids, keep_latest=True))
+            )
+            moved[model] = [dict(row) for row in result.mappings().all()]
+
+        async with self.archive_session_maker() as archive:
+            for model, rows in moved.items():
+                ids = [row['id'] for row in rows]
+                # Повторный перенос после сбоя перезаписывает прежнюю копию
+                for chunk in _chunks(ids):
+                    await archive.execute(delete(model.__table__).where(model.__table__.c.id.in_(chunk)))
+                for chunk in _chunks(rows):
+                    await archive.execute(insert(model.__table__), chunk)
+            await archive.commit()
+
+        item_tables = {row['item_id']: row['table_id'] for row in moved[TableItem]}
+        rows_by_table: Dict[int, int] = dict.fromkeys(table_ids, 0)
+        for model in reversed(ARCHIVED_MODELS):
+            rows = moved[model]
+            for chunk in _chunks([row['id'] for row in rows]):
+                await self.session.execute(delete(model.__table__).where(model.__table__.c.id.in_(chunk)))
+            report.rows[model.__tablename__] = len(rows)
+            archive_rows.inc("archive", model.__tablename__, amount=len(rows))
+            for row in rows:
+                if model is Item:
+                    rows_by_table[item_tables[row['id']]] += 1
+                elif model is UserItemConsumption:
+                    rows_by_table[item_tables[row['item_id']]] += 1
+                else:
+                    rows_by_table[row['table_id']] += 1
+        for table_id, rows in rows_by_table.items():
+            await ArchivedTableDao.add(self.session, CreateArchivedTableInput(table_id=table_id, rows=rows))
+        await self.session.commit()
+
+        report.used_bytes_after = await used_bytes(self.session)
+        if report.used_bytes_after is not None:
+            hot_database_bytes.set(report.used_bytes_after)
+        archive_tables.inc("archive", amount=len(table_ids))
+        return report
+
+    async def restore(self, table_id: int) -> int:
+        """Bring an archived table back to the main database; returns the number of restored rows."""
+        result = await self.session.execute(
+            select(ArchivedTable.id).filter(ArchivedTable.table_id == table_id)
+        )
+        marker_id = result.scalar_one_or_none()
+        if marker_id is None:
+            return 0
+        if self.archive_session_maker is None:
+            logger.warning("Стол {} в архиве, но архивная база не настроена", table_id)
+            return 0
+
+        async with self.archive_session_maker() as archive:
+            restored = {}
+            for model in ARCHIVED_MODELS:
+                result = await archive.execute(
+                    select(model.__table__).where(_rows_filter(model, [table_id], keep_latest=False))
+                )
+                restored[model] = [dict(row) for row in result.mappings().all()]
+
+            for model, rows in restored.items():
+                for chunk in _chunks(rows):
+                    await self.session.execute(insert(model.__table__), chunk)
+                archive_rows.inc("restore", model.__tablename__, amount=len(rows))
+            await self.session.execute(delete(ArchivedTable).filter(ArchivedTable.id == marker_id))
+            await self.session.commit()
+
+            for model in reversed(ARCHIVED_MODELS):
+                ids = [row['id'] for row in restored[model]]
+                for chunk in _chunks(ids):
+                    await archive.execute(delete(model.__table__).where(model.__table__.c.id.in_(chunk)))
+            await archive.commit()
+
+        archive_tables.inc("restore")
+        return sum(len(rows) for rows in restored.values())
+
+
+async def archive_inactive_tables(session_maker: async_sessionmaker[AsyncSession],
+                                  archive_session_maker: async_sessionmaker[AsyncSession],
+                                  inactive_for: timedelta, batch_size: int) -> ArchiveReport:
+    """Archive inactive tables batch by batch, each in its own session, until none are left."""
+    total = ArchiveReport(tables=[], rows={})
+    while True:
+        async with session_maker() as session:
+            report = await ArchiveUseCase(session, archive_session_maker).archive_batch(inactive_for, batch_size)
+        if not report.tables:
+            break
+        total.tables.extend(report.tables)
+        for name, count in report.rows.items():
+            total.rows[name] = total.rows.get(name, 0) + count
+        if total.used_bytes_before is None:
+            total.used_bytes_before = report.used_bytes_before
+        total.used_bytes_after = report.used_bytes_after
+        if len(report.tables) < batch_size:
+            break
+    if total.tables:
+        logger.info(
+            "В архив перенесено столов: {}, строк: {}, основная база: {} → {} байт",
+            len(total.tables), sum(total.rows.values()), total.used_bytes_before, total.used_bytes_after
+        )
+    return total
@@ -0,0 +1,133 @@
+from typing import Any, Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, update, func, case
+from bot.dao.dao import TableSettlementDao
+from bot.dao.models import (
+    BalanceSnapshot, DiningTable, Item, TableItem, TableSettlement, TableUser, Transaction, UserItemConsumption
+)
+from bot.domain.entities import CloseVote
+from bot.infrastructure.tracing import trace_methods
+from bot.use_cases.invite_code_use_cases import InviteCodeUseCase
+from bot.use_cases.ledger_use_cases import TABLE_CLOSED, LedgerUseCase, TableClosedError, balance
+from pydantic import BaseModel
+
+
+class CreateSettlementInput(BaseModel):
+    table_id: int
+    last_event_id: int
+    balances: Dict[str, Dict[str, int]]
+    history: List[Dict[str, Any]]
+
+
+@trace_methods
+class TableClosingUseCase:
+    """
+    Close a table once every member agrees.
+
+    Closing freezes the members' amounts into a ``TableSettlement`` together
+    with a compact copy of the table's items, consumptions and repayments,
+    then deletes those rows, so finished tables do not weigh on the hot
+    tables and their indexes. The event log of the table is kept.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.ledger = LedgerUseCase(session)
+
+    async def agree_to_close(self, table_id: int, user_id: int) -> Optional[CloseVote]:
+        """
+        Record the member's agreement and close the table if it was the last one missing.
+
+        Raises TableClosedError if the table is already closed.
+        """
+        if await self.session.scalar(
+            select(TableSettlement.id).filter(TableSettlement.table_id == table_id).exists().select()
+        ):
+            raise TableClosedError("Стол закрыт")
+
+        result = await self.session.execute(
+            update(TableUser)
+            .filter(TableUser.table_id == table_id, TableUser.user_id == user_id)
+            .values(agree_to_close=True)
+        )
+        if result.rowcount == 0:
+            return None
+
+        result = await self.session.execute(
+            select(func.count(), func.sum(case((TableUser.agree_to_close.is_(True), 1), else_=0)))
+            .filter(TableUser.table_id == table_id)
+        )
+        total, agreed = result.one()
+        vote = CloseVote(agreed=agreed, total=total)
+        if agreed == total:
+            vote.balances = await self.close_table(table_id, actor_id=user_id)
+        await self.session.commit()
+        return vote
+
+    async def close_table(self, table_id: int, actor_id: Optional[int] = None) -> Dict[int, int]:
+        """
+        Freeze the table and move its history out of the hot tables; the caller commits.
+
+        Returns the final balance of every member.
+        """
+        # Событие закрытия блокирует стол: после него новые события не пишутся
+        await self.ledger.append(table_id, TABLE_CLOSED, {}, actor_id=actor_id)
+        amounts, last_event_id = await self.ledger.get_amounts(table_id)
+
+        item_ids = select(TableItem.item_id).filter(TableItem.table_id == table_id)
+        result = await self.session.execute(
+            select(Item.id, Item.name, Item.price, Item.is_income, Item.created_by_id, Item.created_at,
+                   UserItemConsumption.user_id, UserItemConsumption.ratio)
+            .outerjoin(UserItemConsumption, UserItemConsumption.item_id == Item.id)
+            .filter(Item.id.in_(item_ids))
+            .order_by(Item.id, UserItemConsumption.id)
+        )
+        items: Dict[int, Dict[str, Any]] = {}
+        for item_id, name, price, is_income, created_by_id, created_at, user_id, ratio in result.all():
+            item = items.setdefault(item_id, {
+                'kind': 'item', 'id': item_id, 'name': name, 'price': price, 'is_income': is_income,
+                'created_by_id': created_by_id, 'created_at': created_at.isoformat() if created_at else None,
+                'consumers': [],
+            })
+            if user_id is not None:
+                item['consumers'].append([user_id, ratio])
+
+        result = await self.session.execute(
+            select(Transaction).filter(Transaction.table_id == table_id).order_by(Transaction.id)
+        )
+        repayments = [
+            {'kind': 'repayment', 'id': t.id, 'from': t.user_id_from, 'to': t.user_id_to, 'amount': t.amount,
+             'created_at': t.created_at.isoformat() if t.created_at else None}
+            for t in result.scalars().all()
+        ]
+
+        await TableSettlementDao.add(self.session, CreateSettlementInput(
+            table_id=table_id,
+            last_event_id=last_event_id,
+            balances={str(user_id): dict(user_amounts) for user_id, user_amounts in amounts.items()},
+            history=list(items.values()) + repayments,
+        ))
+
+        ids = list(items)
+        await self.session.execute(delete(UserItemConsumption).filter(UserItemConsumption.item_id.in_(ids)))
+        await self.session.execute(delete(TableItem).filter(TableItem.table_id == table_id))
+        await self.session.execute(delete(Item).filter(Item.id.in_(ids)))
+        await self.session.execute(delete(Transaction).filter(Transaction.table_id == table_id))
+        # Читается только последний снимок: остальные больше не нужны
+        await self.session.execute(
+            delete(BalanceSnapshot).filter(
+                BalanceSnapshot.table_id == table_id,
+                BalanceSnapshot.last_event_id < self.ledger._latest_snapshot_event_id(table_id)
+            )
+        )
+
+        InviteCodeUseCase.forget(
+            await self.session.scalar(select(DiningTable.invite_code).filter(DiningTable.id == table_id))
+        )
+        return {user_id: balance(user_amounts) for user_id, user_amounts in amounts.items()}
+
+    async def get_settlement(self, table_id: int) -> Optional[TableSettlement]:
+        result = await self.session.execute(
+            select(TableSettlement).filter(TableSettlement.table_id == table_id)
+        )
+        return result.scalar_one_or_none()
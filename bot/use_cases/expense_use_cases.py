@@ -1,10 +1,16 @@
 from typing import List, Optional, Dict, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from bot.dao.dao import ItemDao, TableItemDao, UserItemConsumptionDao
-from bot.dao.models import User, Item, TableItem, UserItemConsumption, TableUser
+from sqlalchemy import select, func, literal, literal_column, null, true, union_all
+from sqlalchemy.orm import aliased
+from bot.dao.dao import ItemDao, TableItemDao, TransactionDao, UserItemConsumptionDao
+from bot.dao.models import User, Item, TableItem, TableSettlement, Transaction, UserItemConsumption, TableUser
+from bot.infrastructure.tracing import trace_methods
+from bot.use_cases.ledger_use_cases import (
+    Amounts, EXPENSE_ADDED, REPAYMENT, LedgerUseCase, balance, expense_payload
+)
 from pydantic import BaseModel
 from collections import defaultdict
+from datetime import datetime
 
 
 class CreateItemInput(BaseModel):
@@ -25,9 +31,22 @@ class CreateConsumptionInput(BaseModel):
     ratio: float
 
 
+class CreateTransactionInput(BaseModel):
+    table_id: int
+    user_id_from: int
+    user_id_to: int
+    amount: int
+
+
+# Источник строки в get_table_operations
+_ITEM, _REPAYMENT = 0, 1
+
+
+@trace_methods
 class ExpenseUseCase:
     def __init__(self, session: AsyncSession):
         self.session = session
+        self.ledger = LedgerUseCase(session)
 
     async def add_expense(self, table_id: int, item_name: str, price: int,
                          user_ids: List[int], ratios: Optional[List[float]] = None,
@@ -46,9 +65,32 @@ class ExpenseUseCase:
             consumption_data = CreateConsumptionInput(user_id=user_id, item_id=item_id, ratio=ratio)
             await UserItemConsumptionDao.add(self.session, consumption_data)
         
+        await self.ledger.append(
+            table_id, EXPENSE_ADDED,
+            expense_payload(item_id, item_name, price, is_income, user_ids, ratios),
+            actor_id=created_by_id
+        )
         await self.session.commit()
         return item_id
 
+    async def add_repayment(self, table_id: int, from_user_id: int, to_user_id: int, amount: int) -> int:
+        """Record that ``from_user_id`` paid ``amount`` back to ``to_user_id``."""
+        transaction_id = await self.record_repayment(table_id, from_user_id, to_user_id, amount)
+        await self.session.commit()
+        return transaction_id
+
+    async def record_repayment(self, table_id: int, from_user_id: int, to_user_id: int, amount: int,
+                               actor_id: Optional[int] = None) -> int:
+        """Write the repayment and its ledger event in the caller's transaction."""
+        transaction = await TransactionDao.add(self.session, CreateTransactionInput(
+            table_id=table_id, user_id_from=from_user_id, user_id_to=to_user_id, amount=amount
+        ))
+        transaction_id = transaction.id
+        await self.ledger.append(table_id, REPAYMENT, {
+            'transaction_id': transaction_id, 'from': from_user_id, 'to': to_user_id, 'amount': amount
+        }, actor_id=actor_id or from_user_id)
+        return transaction_id
+
     async def calculate_debts(self, table_id: int) -> List[Tuple[int, int, int]]:
         result = await self.session.execute(
             select(TableUser.user_id).filter(TableUser.table_id == table_id)
@@ -58,13 +100,9 @@ class ExpenseUseCase:
         if len(user_ids) < 2:
             return []
         
-        balances = {}
+        amounts = await self._calculate_amounts(table_id)
         
-        for user_id in user_ids:
-            expenses = await self._calculate_user_amount(user_id, table_id, is_income=False)
-            income = await self._calculate_user_amount(user_id, table_id, is_income=True)
-            
-            balances[user_id] = int(income - expenses)
+        balances = {user_id: balance(amounts.get(user_id)) for user_id in user_ids}
         
         return self._minimize_transfers(balances)
     
@@ -97,6 +135,64 @@ class ExpenseUseCase:
         
         return transfers
 
+    async def _get_archived_operations(self, table_id: int, limit: Optional[int],
+                                       offset: int) -> List[Dict]:
+        """Operations of a closed table from its settlement, in the shape of get_table_operations."""
+        result = await self.session.execute(
+            select(TableSettlement.history).filter(TableSettlement.table_id == table_id)
+        )
+        history = result.scalar_one_or_none()
+        if not history:
+            return []
+
+        history = sorted(
+            history,
+            key=lambda op: (op['created_at'] or '', op['kind'] == 'item', op['id']),
+            reverse=True
+        )
+        end = None if limit is None else offset + limit
+        history = history[offset:end]
+
+        user_ids = set()
+        for op in history:
+            if op['kind'] == 'item':
+                user_ids.update(user_id for user_id, _ in op['consumers'])
+                user_ids.add(op['created_by_id'])
+            else:
+                user_ids.update((op['from'], op['to']))
+        result = await self.session.execute(select(User).filter(User.id.in_(user_ids - {None})))
+        names = {
+            user.id: user.first_name or user.username or f"User {user.telegram_id}"
+            for user in result.scalars().all()
+        }
+
+        operations = []
+        for op in history:
+            created_at = datetime.fromisoformat(op['created_at']) if op['created_at'] else None
+            if op['kind'] == 'item':
+                operations.append({
+                    'id': op['id'], 'kind': 'item', 'name': op['name'], 'price': op['price'],
+                    'is_income': op['is_income'], 'created_at': created_at,
+                    'created_by': names.get(op['created_by_id']),
+                    'participants': [{'name': names.get(user_id), 'ratio': ratio}
+                                     for user_id, ratio in op['consumers']],
+                })
+            else:
+                operations.append({
+                    'id': op['id'], 'kind': 'repayment',
+                    'name': f"Погашение долга → {names.get(op['to'])}", 'price': op['amount'],
+                    'is_income': True, 'created_at': created_at, 'created_by': names.get(op['from']),
+                    'participants': [],
+                })
+        return operations
+
+    async def _calculate_amounts(self, table_id: int) -> Amounts:
+        """Amounts of every member: the latest ledger snapshot plus the events after it."""
+        folded = await self.ledger.get_amounts(table_id)
+        if folded is None:
+            return await self.ledger.aggregate_amounts(table_id)
+        return folded[0]
+
     async def _calculate_user_amount(self, user_id: int, table_id: int, is_income: bool) -> int:
         result = await self.session.execute(
             select(Item.id, Item.price)
@@ -135,57 +231,91 @@ class ExpenseUseCase:
         return total_amount
 
     async def get_user_balance(self, table_id: int, user_id: int) -> Dict[str, int]:
-        expenses = await self._calculate_user_amount(user_id, table_id, is_income=False)
-        income = await self._calculate_user_amount(user_id, table_id, is_income=True)
+        amounts = await self._calculate_amounts(table_id)
+        user_amounts = amounts.get(user_id)
         
         return {
-            'expenses': expenses,
-            'income': income,
-            'balance': income - expenses
+            'expenses': user_amounts['expenses'] if user_amounts else 0,
+            'income': user_amounts['income'] if user_amounts else 0,
+            'repaid': user_amounts['repaid'] if user_amounts else 0,
+            'received': user_amounts['received'] if user_amounts else 0,
+            'balance': balance(user_amounts)
         }
 
-    async def get_table_operations(self, table_id: int) -> List[Dict]:
-        result = await self.session.execute(
-            select(Item, TableItem)
+    async def get_table_operations(self, table_id: int, limit: Optional[int] = None,
+                                   offset: int = 0) -> List[Dict]:
+        """Items and repayments of the table, newest first, as one paginated query."""
+        creator = aliased(User)
+        recipient = aliased(User)
+        items_query = (
+            select(literal(_ITEM).label("kind"), Item.id.label("id"), Item.name.label("name"),
+                   Item.price.label("price"), Item.is_income.label("is_income"),
+                   Item.created_at.label("created_at"), creator.first_name.label("creator_first_name"),
+                   creator.username.label("creator_username"), creator.telegram_id.label("creator_telegram_id"),
+                   null().label("recipient_first_name"), null().label("recipient_username"),
+                   null().label("recipient_telegram_id"))
             .join(TableItem, TableItem.item_id == Item.id)
+            .outerjoin(creator, creator.id == Item.created_by_id)
             .filter(TableItem.table_id == table_id)
-            .order_by(Item.created_at.desc())
         )
-        items_data = result.all()
+        repayments_query = (
+            select(literal(_REPAYMENT), Transaction.id, literal("Погашение долга"), Transaction.amount, true(),
+                   Transaction.created_at, creator.first_name, creator.username, creator.telegram_id,
+                   recipient.first_name, recipient.username, recipient.telegram_id)
+            .outerjoin(creator, creator.id == Transaction.user_id_from)
+            .outerjoin(recipient, recipient.id == Transaction.user_id_to)
+            .filter(Transaction.table_id == table_id)
+        )
+        query = (
+            union_all(items_query, repayments_query)
+            .order_by(literal_column("created_at").desc(), literal_column("kind"), literal_column("id").desc())
+            .offset(offset)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        result = await self.session.execute(query)
+        rows = result.all()
         
-        operations = []
-        for item, table_item in items_data:
-            creator_name = None
-            if item.created_by_id:
-                result_creator = await self.session.execute(
-                    select(User).filter(User.id == item.created_by_id)
-                )
-                creator = result_creator.scalar_one_or_none()
-                if creator:
-                    creator_name = creator.first_name or creator.username or f"User {creator.telegram_id}"
-            
+        if not rows:
+            # Позиции закрытого стола перенесены в архив
+            return await self._get_archived_operations(table_id, limit, offset)
+        
+        item_ids = [row.id for row in rows if row.kind == _ITEM]
+        participants_by_item = defaultdict(list)
+        if item_ids:
             result = await self.session.execute(
-                select(User, UserItemConsumption)
-                .join(UserItemConsumption, UserItemConsumption.user_id == User.id)
-                .filter(UserItemConsumption.item_id == item.id)
+                select(UserItemConsumption.item_id, UserItemConsumption.ratio, User)
+                .join(User, UserItemConsumption.user_id == User.id)
+                .filter(UserItemConsumption.item_id.in_(item_ids))
+                .order_by(UserItemConsumption.id)
             )
-            participants_data = result.all()
-            
-            participants = []
-            for user, consumption in participants_data:
-                participants.append({
+            for item_id, ratio, user in result.all():
+                participants_by_item[item_id].append({
                     'name': user.first_name or user.username or f"User {user.telegram_id}",
-                    'ratio': consumption.ratio
+                    'ratio': ratio
                 })
+        
+        operations = []
+        for row in rows:
+            creator_name = None
+            if row.creator_telegram_id is not None:
+                creator_name = row.creator_first_name or row.creator_username or f"User {row.creator_telegram_id}"
+            
+            if row.kind == _ITEM:
+                name, participants = row.name, participants_by_item[row.id]
+            else:
+                recipient_name = row.recipient_first_name or row.recipient_username or f"User {row.recipient_telegram_id}"
+                name, participants = f"{row.name} → {recipient_name}", []
             
             operations.append({
-                'id': item.id,
-                'name': item.name,
-                'price': item.price,
-                'is_income': item.is_income,
-                'created_at': item.created_at,
+                'id': row.id,
+                'kind': 'item' if row.kind == _ITEM else 'repayment',
+                'name': name,
+                'price': row.price,
+                'is_income': bool(row.is_income),
+                'created_at': row.created_at,
                 'created_by': creator_name,
                 'participants': participants
             })
         
-        return operations
\ No newline at end of file
+        return operations
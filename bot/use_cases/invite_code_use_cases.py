@@ -0,0 +1,154 @@
+import secrets
+import string
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional, Tuple, TypeVar
+from loguru import logger
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete
+from bot.config import settings
+from bot.dao.dao import InviteCodeExpiryDao
+from bot.dao.models import DiningTable, InviteCodeExpiry, TableSettlement
+from bot.domain.entities import TableEntity
+from bot.infrastructure.lru_cache import LRUCache
+from bot.infrastructure.tracing import trace_methods
+from pydantic import BaseModel
+
+
+INVITE_CODE_ALPHABET = string.ascii_uppercase + string.digits
+INVITE_CODE_LENGTH = 8
+
+T = TypeVar("T")
+
+
+class CreateInviteCodeExpiryInput(BaseModel):
+    table_id: int
+    expires_at: datetime
+
+
+@dataclass(frozen=True)
+class _InviteTarget:
+    table_id: int
+    name: str
+    expires_at: Optional[datetime]
+
+
+# Код приглашения → стол, для диплинков /start join_<код>
+_targets: LRUCache[_InviteTarget] = LRUCache("invite_codes", settings.INVITE_CODE_CACHE_SIZE)
+
+
+def generate_invite_code(length: int = INVITE_CODE_LENGTH) -> str:
+    return ''.join(secrets.choice(INVITE_CODE_ALPHABET) for _ in range(length))
+
+
+def _utcnow() -> datetime:
+    # created_at и expires_at хранятся в UTC без часового пояса
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+@trace_methods
+class InviteCodeUseCase:
+    """
+    Issue, resolve, rotate and expire table invite codes.
+
+    Codes are not checked for uniqueness up front: a write with a random
+    code is committed as one transaction, and if it hits the unique index
+    on ``tables.invite_code`` the whole transaction is rolled back and run
+    again with a new code. Resolved codes are kept in a bounded per-process
+    LRU cache; rotating or closing a table drops its old code from it.
+    """
+
+    max_attempts = 10
+
+    def __init__(self, session: AsyncSession, ttl: Optional[timedelta] = None):
+        self.session = session
+        if ttl is None and settings.INVITE_CODE_TTL_DAYS:
+            ttl = timedelta(days=settings.INVITE_CODE_TTL_DAYS)
+        self.ttl = ttl
+
+    async def create_table(
+        self, name: str, fill: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> Tuple[int, str]:
+        """
+        Insert a table with a fresh invite code and commit it; returns its id and code.
+
+        ``fill`` gets the new table's id and adds the rest of its first
+        transaction (the creator's membership, say). A taken code rolls back
+        everything done in the session since its last commit, so there must
+        be nothing pending in it when this is called.
+        """
+        async def insert(code: str) -> int:
+            table = DiningTable(name=name, invite_code=code)
+            self.session.add(table)
+            await self.session.flush()
+            await self._set_expiry(table.id)
+            if fill is not None:
+                await fill(table.id)
+            return table.id
+
+        return await self._with_unique_code(insert)
+
+    async def rotate(self, table_id: int) -> str:
+        """Give the table a new invite code; the old one stops working at once."""
+        old_code = await self.session.scalar(select(DiningTable.invite_code).filter(DiningTable.id == table_id))
+
+        async def set_code(code: str) -> None:
+            await self.session.execute(
+                update(DiningTable).filter(DiningTable.id == table_id).values(invite_code=code)
+            )
+            await self.session.execute(delete(InviteCodeExpiry).filter(InviteCodeExpiry.table_id == table_id))
+            await self._set_expiry(table_id)
+
+        _, code = await self._with_unique_code(set_code)
+        self.forget(old_code)
+        return code
+
+    async def resolve(self, code: str) -> Optional[TableEntity]:
+        """The open table the code invites to, or None if the code is unknown or expired."""
+        target = _targets.get(code)
+        if target is None:
+            result = await self.session.execute(
+                select(DiningTable.id, DiningTable.name, InviteCodeExpiry.expires_at)
+                .outerjoin(InviteCodeExpiry, InviteCodeExpiry.table_id == DiningTable.id)
+                .filter(DiningTable.invite_code == code,
+                        DiningTable.id.notin_(select(TableSettlement.table_id)))
+            )
+            row = result.one_or_none()
+            if row is None:
+                return None
+            target = _InviteTarget(table_id=row.id, name=row.name, expires_at=row.expires_at)
+            _targets.put(code, target)
+
+        if target.expires_at is not None and target.expires_at <= _utcnow():
+            return None
+        return TableEntity(name=target.name, id=target.table_id)
+
+    @staticmethod
+    def forget(code: Optional[str]) -> None:
+        if code is not None:
+            _targets.pop(code)
+
+    async def _with_unique_code(self, write: Callable[[str], Awaitable[T]]) -> Tuple[T, str]:
+        # Не SAVEPOINT: на SQLite он требует явного BEGIN на каждом соединении,
+        # а значит и блокировок на чтение во всех обработчиках. Совпадение
+        # кодов почти невозможно, так что проще повторить транзакцию целиком
+        for _ in range(self.max_attempts):
+            code = generate_invite_code()
+            try:
+                result = await write(code)
+                await self.session.commit()
+            except IntegrityError as exc:
+                await self.session.rollback()
+                if "invite_code" not in str(exc.orig):
+                    raise
+                logger.warning("Код приглашения {} уже занят, выбираем другой", code)
+                continue
+            return result, code
+        raise RuntimeError("Не удалось подобрать свободный код приглашения")
+
+    async def _set_expiry(self, table_id: int) -> None:
+        if self.ttl is not None:
+            await InviteCodeExpiryDao.add(self.session, CreateInviteCodeExpiryInput(
+                table_id=table_id, expires_at=_utcnow() + self.ttl
+            ))
@@ -0,0 +1,392 @@
+from collections import defaultdict, namedtuple
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, literal, null, true, union_all, update
+from sqlalchemy.orm import aliased
+from bot.dao.dao import BalanceSnapshotDao, TableEventDao
+from bot.dao.models import (
+    BalanceSnapshot, DiningTable, Item, TableEvent, TableItem, TableSettlement, TableUser, Transaction,
+    UserItemConsumption,
+)
+from bot.domain.entities import TableBalanceEntity, TableEntity
+from bot.infrastructure.tracing import trace_methods
+from pydantic import BaseModel
+
+
+EXPENSE_ADDED = "expense_added"
+REPAYMENT = "repayment"
+MEMBER_JOINED = "member_joined"
+MEMBER_LEFT = "member_left"
+TABLE_CLOSED = "table_closed"
+
+# user_id -> {'expenses', 'income', 'repaid', 'received'}
+Amounts = Dict[int, Dict[str, int]]
+
+_Event = namedtuple("_Event", "kind payload")
+
+# Источник строки в aggregate_amounts
+_ITEM, _REPAID, _RECEIVED = 0, 1, 2
+# Источник строки в _fold_tables
+_SNAPSHOT, _EVENT, _EXTRA = 0, 1, 2
+
+
+class CreateEventInput(BaseModel):
+    table_id: int
+    kind: str
+    payload: Dict[str, Any]
+    actor_id: Optional[int] = None
+
+
+class CreateSnapshotInput(BaseModel):
+    table_id: int
+    last_event_id: int
+    balances: Dict[str, Dict[str, int]]
+
+
+class TableClosedError(ValueError):
+    pass
+
+
+def open_user_tables(user_id: int):
+    """Ids of the tables the user belongs to, without the closed ones."""
+    return (
+        select(TableUser.table_id)
+        .filter(TableUser.user_id == user_id,
+                TableUser.table_id.notin_(select(TableSettlement.table_id)))
+    )
+
+
+def empty_amounts() -> Amounts:
+    return defaultdict(lambda: {'expenses': 0, 'income': 0, 'repaid': 0, 'received': 0})
+
+
+def expense_payload(item_id: int, name: str, price: int, is_income: bool,
+                    user_ids: List[int], ratios: List[float]) -> Dict[str, Any]:
+    """Event payload with each participant's share, truncated the way the aggregate does it."""
+    total_ratio = sum(ratios)
+    shares: Dict[str, int] = {}
+    if total_ratio > 0:
+        for user_id, ratio in zip(user_ids, ratios):
+            shares[str(user_id)] = shares.get(str(user_id), 0) + int(price * (ratio / total_ratio))
+    return {'item_id': item_id, 'name': name, 'price': price, 'is_income': is_income, 'shares': shares}
+
+
+def apply_event(amounts: Amounts, kind: str, payload: Dict[str, Any]) -> None:
+    if kind == EXPENSE_ADDED:
+        key = 'income' if payload['is_income'] else 'expenses'
+        for user_id, share in payload['shares'].items():
+            amounts[int(user_id)][key] += share
+    elif kind == REPAYMENT:
+        amounts[payload['from']]['repaid'] += payload['amount']
+        amounts[payload['to']]['received'] += payload['amount']
+
+
+def balance(amounts: Optional[Dict[str, int]]) -> int:
+    """Positive when the member is owed money: paid and repaid minus consumed and received."""
+    if not amounts:
+        return 0
+    return int(amounts['income'] + amounts['repaid'] - amounts['expenses'] - amounts['received'])
+
+
+def _fold(snapshot: Dict[str, Dict[str, int]], events: Iterable[Any]) -> Amounts:
+    amounts = empty_amounts()
+    for user_id, user_amounts in snapshot.items():
+        amounts[int(user_id)].update(user_amounts)
+    for event in events:
+        apply_event(amounts, event.kind, event.payload)
+    return amounts
+
+
+@trace_methods
+class LedgerUseCase:
+    """
+    Per-table event log with balance snapshots.
+
+    Every state change is appended as a ``TableEvent``. A ``BalanceSnapshot``
+    holds the members' amounts up to some event, and a read folds only the
+    events after the latest snapshot, so its cost does not grow with the age
+    of the table. A new snapshot is taken every ``snapshot_every`` events.
+    Tables created before the log existed get their first snapshot from the
+    items and transactions on the first appended event.
+    """
+
+    snapshot_every = 100
+
+    def __init__(self, session: AsyncSession, snapshot_every: Optional[int] = None):
+        self.session = session
+        if snapshot_every is not None:
+            self.snapshot_every = snapshot_every
+
+    async def append(self, table_id: int, kind: str, payload: Dict[str, Any],
+                     actor_id: Optional[int] = None) -> int:
+        """
+        Append an event in the caller's transaction; the caller commits.
+
+        Raises TableClosedError for a closed table.
+        """
+        latest = self._latest_snapshot_event_id(table_id)
+        # Запись событий одного стола упорядочивается записью в строку стола
+        # до чтения: иначе снимок может пропустить ещё не зафиксированное
+        # событие. SELECT ... FOR UPDATE не подходит: SQLite его игнорирует,
+        # а UPDATE там сразу берёт блокировку записи базы (в PostgreSQL —
+        # блокировку строки)
+        result = await self.session.execute(
+            update(DiningTable)
+            .filter(DiningTable.id == table_id)
+            .values(updated_at=func.now())
+            .returning(
+                latest,
+                select(func.count()).select_from(TableEvent)
+                .filter(TableEvent.table_id == table_id, TableEvent.id > func.coalesce(latest, 0))
+                .scalar_subquery(),
+                select(TableSettlement.id).filter(TableSettlement.table_id == table_id).exists()
+            )
+            .execution_options(synchronize_session=False)
+        )
+        snapshot_event_id, pending, closed = result.one_or_none() or (None, 0, False)
+        if closed:
+            raise TableClosedError("Стол закрыт")
+
+        event = await TableEventDao.add(self.session, CreateEventInput(
+            table_id=table_id, kind=kind, payload=payload, actor_id=actor_id
+        ))
+        if snapshot_event_id is None:
+            # Событие уже учтено в позициях и переводах: снимок включает его
+            await self._save_snapshot(table_id, event.id, await self.aggregate_amounts(table_id))
+        elif pending + 1 >= self.snapshot_every:
+            await self.take_snapshot(table_id)
+        return event.id
+
+    async def get_amounts(self, table_id: int) -> Optional[Tuple[Amounts, int]]:
+        """
+        Amounts from the latest snapshot plus later events, in one query.
+
+        Returns the amounts and the id of the last folded event, or None if
+        the table has no snapshot yet.
+        """
+        latest_id = (
+            select(BalanceSnapshot.id)
+            .filter(BalanceSnapshot.table_id == table_id)
+            .order_by(BalanceSnapshot.last_event_id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        snapshot_query = (
+            select(literal("snapshot").label("kind"), BalanceSnapshot.last_event_id.label("id"),
+                   BalanceSnapshot.balances.label("payload"))
+            .filter(BalanceSnapshot.id == latest_id)
+        )
+        events_query = (
+            select(TableEvent.kind, TableEvent.id, TableEvent.payload)
+            .filter(TableEvent.table_id == table_id,
+                    TableEvent.id > func.coalesce(self._latest_snapshot_event_id(table_id), 0))
+        )
+        result = await self.session.execute(
+            union_all(snapshot_query, events_query).order_by("id", "kind")
+        )
+        rows = result.all()
+        if not rows or rows[0].kind != "snapshot":
+            return None
+
+        amounts = _fold(rows[0].payload, rows[1:])
+        return amounts, rows[-1].id
+
+    async def get_user_tables_amounts(self, user_id: int) -> Dict[int, Tuple[Amounts, Set[int]]]:
+        """
+        Amounts and current members of every open table the user belongs to, in one query.
+
+        Tables without a snapshot fall back to the item aggregate, one query each.
+        """
+        user_tables = open_user_tables(user_id)
+        amounts, rows = await self._fold_tables(user_tables, (
+            select(TableUser.table_id, literal(_EXTRA), TableUser.user_id, null(), null())
+            .filter(TableUser.table_id.in_(user_tables))
+        ))
+
+        members: Dict[int, Set[int]] = defaultdict(set)
+        for row in rows:
+            members[row.table_id].add(row.id)
+        return {table_id: (amounts[table_id], table_members) for table_id, table_members in members.items()}
+
+    async def get_user_balances(self, user_id: int) -> List[TableBalanceEntity]:
+        """
+        The user's balance in every open table they belong to, in one query.
+
+        Each table costs its latest snapshot plus at most ``snapshot_every``
+        events, however long its history is.
+        """
+        user_tables = open_user_tables(user_id)
+        amounts, rows = await self._fold_tables(user_tables, (
+            select(DiningTable.id, literal(_EXTRA), literal(0), DiningTable.name, null())
+            .filter(DiningTable.id.in_(user_tables))
+        ))
+        return [
+            TableBalanceEntity(table=TableEntity(name=row.text, id=row.table_id),
+                               balance=balance(amounts[row.table_id].get(user_id)))
+            for row in rows
+        ]
+
+    async def _fold_tables(self, table_ids, extra_query) -> Tuple[Dict[int, Amounts], List[Any]]:
+        """
+        Fold the latest snapshot and later events of every table in ``table_ids``.
+
+        ``extra_query`` selects (table_id, _EXTRA, id, text, payload) rows; they
+        are fetched in the same query and returned ordered by table, and every
+        table they mention is folded.
+        """
+        inner = aliased(BalanceSnapshot)
+
+        def latest_for(table_id_column):
+            return (
+                select(func.max(inner.last_event_id))
+                .filter(inner.table_id == table_id_column)
+                .scalar_subquery()
+            )
+
+        snapshots_query = (
+            select(BalanceSnapshot.table_id.label("table_id"), literal(_SNAPSHOT).label("source"),
+                   BalanceSnapshot.last_event_id.label("id"), null().label("text"),
+                   BalanceSnapshot.balances.label("payload"))
+            .filter(BalanceSnapshot.table_id.in_(table_ids),
+                    BalanceSnapshot.last_event_id == latest_for(BalanceSnapshot.table_id))
+        )
+        events_query = (
+            select(TableEvent.table_id, literal(_EVENT), TableEvent.id, TableEvent.kind, TableEvent.payload)
+            .filter(TableEvent.table_id.in_(table_ids),
+                    TableEvent.id > func.coalesce(latest_for(TableEvent.table_id), 0))
+        )
+        result = await self.session.execute(
+            union_all(snapshots_query, events_query, extra_query).order_by("table_id", "source", "id")
+        )
+
+        snapshots: Dict[int, Dict[str, Dict[str, int]]] = {}
+        events: Dict[int, list] = defaultdict(list)
+        extra = []
+        for row in result.all():
+            if row.source == _SNAPSHOT:
+                # Два снимка на одном событии одинаковы: берём первый
+                snapshots.setdefault(row.table_id, row.payload)
+            elif row.source == _EVENT:
+                if row.table_id in snapshots:
+                    events[row.table_id].append(_Event(row.text, row.payload))
+            else:
+                extra.append(row)
+
+        tables: Dict[int, Amounts] = {}
+        for table_id in dict.fromkeys(row.table_id for row in extra):
+            if table_id in snapshots:
+                tables[table_id] = _fold(snapshots[table_id], events[table_id])
+            else:
+                tables[table_id] = await self.aggregate_amounts(table_id)
+        return tables, extra
+
+    async def take_snapshot(self, table_id: int) -> int:
+        """Store the current amounts as a snapshot; returns the id of the last event it covers."""
+        folded = await self.get_amounts(table_id)
+        if folded is None:
+            result = await self.session.execute(
+                select(func.coalesce(func.max(TableEvent.id), 0)).filter(TableEvent.table_id == table_id)
+            )
+            folded = await self.aggregate_amounts(table_id), result.scalar()
+        amounts, last_event_id = folded
+        await self._save_snapshot(table_id, last_event_id, amounts)
+        return last_event_id
+
+    async def get_events(self, table_id: int, after_event_id: int = 0,
+                         limit: Optional[int] = None) -> List[TableEvent]:
+        """The audit trail of the table in order of appending."""
+        query = (
+            select(TableEvent)
+            .filter(TableEvent.table_id == table_id, TableEvent.id > after_event_id)
+            .order_by(TableEvent.id)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        result = await self.session.execute(query)
+        return list(result.scalars().all())
+
+    async def replay(self, table_id: int, until_event_id: Optional[int] = None
+                     ) -> List[Tuple[TableEvent, Dict[int, int]]]:
+        """
+        Every event with the members' balances right after it.
+
+        Starts from the earliest snapshot, so events of a table that predates
+        the log are replayed from the state the log first saw.
+        """
+        result = await self.session.execute(
+            select(BalanceSnapshot)
+            .filter(BalanceSnapshot.table_id == table_id)
+            .order_by(BalanceSnapshot.last_event_id)
+            .limit(1)
+        )
+        first = result.scalar_one_or_none()
+        if first is None:
+            return []
+
+        amounts = _fold(first.balances, ())
+        history = []
+        for event in await self.get_events(table_id, after_event_id=first.last_event_id):
+            if until_event_id is not None and event.id > until_event_id:
+                break
+            apply_event(amounts, event.kind, event.payload)
+            history.append((event, {user_id: balance(a) for user_id, a in amounts.items()}))
+        return history
+
+    async def _save_snapshot(self, table_id: int, last_event_id: int, amounts: Amounts) -> None:
+        await BalanceSnapshotDao.add(self.session, CreateSnapshotInput(
+            table_id=table_id,
+            last_event_id=last_event_id,
+            balances={str(user_id): dict(user_amounts) for user_id, user_amounts in amounts.items()}
+        ))
+
+    @staticmethod
+    def _latest_snapshot_event_id(table_id: int):
+        return (
+            select(func.max(BalanceSnapshot.last_event_id))
+            .filter(BalanceSnapshot.table_id == table_id)
+            .scalar_subquery()
+        )
+
+    async def aggregate_amounts(self, table_id: int) -> Amounts:
+        """
+        Amounts computed from items and transactions directly, in a single query.
+
+        Items come with one row per consumer; every repayment adds a row for
+        the payer and one for the recipient.
+        """
+        items_query = (
+            select(literal(_ITEM).label("kind"), Item.id.label("source_id"), UserItemConsumption.id.label("row_id"),
+                   Item.price.label("amount"), Item.is_income.label("is_income"),
+                   UserItemConsumption.user_id.label("user_id"), UserItemConsumption.ratio.label("ratio"))
+            .join(TableItem, TableItem.item_id == Item.id)
+            .join(UserItemConsumption, UserItemConsumption.item_id == Item.id)
+            .filter(TableItem.table_id == table_id)
+        )
+        repayments_query = [
+            select(literal(kind), Transaction.id, Transaction.id, Transaction.amount, true(), user_id, literal(1.0))
+            .filter(Transaction.table_id == table_id)
+            for kind, user_id in ((_REPAID, Transaction.user_id_from), (_RECEIVED, Transaction.user_id_to))
+        ]
+        result = await self.session.execute(
+            union_all(items_query, *repayments_query).order_by("kind", "source_id", "row_id")
+        )
+
+        amounts = empty_amounts()
+        items = defaultdict(list)
+        for kind, source_id, _, price, is_income, user_id, ratio in result.all():
+            if kind == _REPAID:
+                amounts[user_id]['repaid'] += price
+            elif kind == _RECEIVED:
+                amounts[user_id]['received'] += price
+            else:
+                items[(source_id, price, is_income)].append((user_id, ratio))
+
+        for (item_id, price, is_income), consumers in items.items():
+            total_ratio = sum(ratio for _, ratio in consumers)
+            if total_ratio <= 0:
+                continue
+            key = 'income' if is_income else 'expenses'
+            for user_id, ratio in consumers:
+                amounts[user_id][key] += int(price * (ratio / total_ratio))
+
+        return amounts
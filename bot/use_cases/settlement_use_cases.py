@@ -0,0 +1,84 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from bot.domain.entities import SettlementPlan
+from bot.infrastructure.tracing import trace_methods
+from bot.use_cases.expense_use_cases import ExpenseUseCase
+from bot.use_cases.ledger_use_cases import balance
+
+
+@trace_methods
+class SettlementUseCase:
+    """
+    Settle a user's debts across all their tables at once.
+
+    Every table is settled the way ``calculate_debts`` does it; the debts
+    between the user and each other member are then netted over all
+    tables, so the user makes or receives at most one transfer per person.
+    Every transfer involves the user, so debts between other members are
+    never rerouted. Debts that cancel out exactly are settled without any
+    transfer.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.expenses = ExpenseUseCase(session)
+
+    async def get_plan(self, user_id: int) -> SettlementPlan:
+        tables = await self.expenses.ledger.get_user_tables_amounts(user_id)
+
+        table_debts: Dict[int, List[Tuple[int, int, int]]] = {}
+        # Сколько собеседник должен пользователю (отрицательное — наоборот)
+        net: Dict[int, int] = defaultdict(int)
+        for table_id, (amounts, members) in sorted(tables.items()):
+            if len(members) < 2:
+                continue
+            balances = {member: balance(amounts.get(member)) for member in members}
+            debts = [
+                (debtor, creditor, amount)
+                for debtor, creditor, amount in self.expenses._minimize_transfers(balances)
+                if user_id in (debtor, creditor)
+            ]
+            if not debts:
+                continue
+            table_debts[table_id] = debts
+            for debtor, creditor, amount in debts:
+                if creditor == user_id:
+                    net[debtor] += amount
+                else:
+                    net[creditor] -= amount
+
+        transfers = []
+        for other_id, amount in sorted(net.items()):
+            if amount > 0:
+                transfers.append((other_id, user_id, amount))
+            elif amount < 0:
+                transfers.append((user_id, other_id, -amount))
+        return SettlementPlan(user_id=user_id, transfers=transfers, table_debts=table_debts)
+
+    async def settle_all(self, user_id: int, received: bool,
+                         expected_repayments: Optional[Sequence[Sequence[int]]] = None
+                         ) -> Optional[SettlementPlan]:
+        """
+        Record one part of the plan (see ``SettlementPlan.part``) as repayments in a single transaction.
+
+        The user confirms what they paid and what they received separately,
+        so nobody is marked as having paid the user unless the user says
+        the money arrived. With ``expected_repayments`` (the plan the user
+        confirmed) nothing is written and None is returned if the plan has
+        changed meanwhile.
+        """
+        plan = await self.get_plan(user_id)
+        if expected_repayments is not None and [tuple(r) for r in expected_repayments] != plan.repayments:
+            return None
+
+        part = plan.part(received)
+        try:
+            for table_id, debts in part.table_debts.items():
+                for debtor, creditor, amount in debts:
+                    await self.expenses.record_repayment(table_id, debtor, creditor, amount, actor_id=user_id)
+            await self.session.commit()
+        except Exception:
+            await self.session.rollback()
+            raise
+        return part
@@ -1,91 +1,120 @@
 from typing import Optional, List
-import secrets
-import string
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from bot.dao.dao import DiningTableDao, TableUserDao, UserDao
+from sqlalchemy import delete, func, inspect, literal, select
+from bot.dao.base import upsert
+from bot.dao.dao import TableUserDao, UserDao
 from bot.dao.models import DiningTable, TableUser, User
-from bot.domain.entities import TableEntity, UserEntity
+from bot.domain.entities import JoinResult, JoinStatus, TableBalanceEntity, TableEntity, UserEntity
+from bot.infrastructure.tracing import trace_methods
+from bot.use_cases.invite_code_use_cases import InviteCodeUseCase
+from bot.use_cases.ledger_use_cases import (
+    LedgerUseCase, MEMBER_JOINED, MEMBER_LEFT, TableClosedError, open_user_tables,
+)
 from pydantic import BaseModel
 
 
-class CreateTableInput(BaseModel):
-    name: str
-    invite_code: str
-
-
 class JoinTableInput(BaseModel):
     table_id: int
     user_id: int
 
 
+def ensure_unique_membership(conn: Connection) -> None:
+    """
+    Build the unique (table_id, user_id) index on databases created before it.
+
+    create_all skips tables that already exist, so their index is made here,
+    after dropping duplicate memberships left by racing joins.
+    """
+    index = next(i for i in TableUser.__table__.indexes if i.unique)
+    if index.name in {i["name"] for i in inspect(conn).get_indexes(TableUser.__tablename__)}:
+        return
+    first_rows = select(func.min(TableUser.id)).group_by(TableUser.table_id, TableUser.user_id)
+    conn.execute(delete(TableUser).filter(TableUser.id.notin_(first_rows)))
+    index.create(conn)
+
+
+@trace_methods
 class TableUseCase:
     def __init__(self, session: AsyncSession):
         self.session = session
-
-    def _generate_invite_code(self, length: int = 8) -> str:
-        characters = string.ascii_uppercase + string.digits
-        return ''.join(secrets.choice(characters) for _ in range(length))
-
-    async def _is_invite_code_unique(self, invite_code: str) -> bool:
-        result = await self.session.execute(
-            select(DiningTable).filter(DiningTable.invite_code == invite_code)
-        )
-        return len(result.scalars().all()) == 0
+        self.ledger = LedgerUseCase(session)
+        self.invites = InviteCodeUseCase(session)
 
     async def create_table(self, name: str, creator_id: int) -> tuple[int, str]:
-        invite_code = self._generate_invite_code()
-        while not await self._is_invite_code_unique(invite_code):
-            invite_code = self._generate_invite_code()
-        
-        table_data = CreateTableInput(name=name, invite_code=invite_code)
-        table = await DiningTableDao.add(self.session, table_data)
-        table_id = table.id
-        
-        join_data = JoinTableInput(table_id=table_id, user_id=creator_id)
-        await TableUserDao.add(self.session, join_data)
-        
-        await self.session.commit()
-        return table_id, invite_code
+        async def add_creator(table_id: int) -> None:
+            join_data = JoinTableInput(table_id=table_id, user_id=creator_id)
+            await TableUserDao.add(self.session, join_data)
+            await self.ledger.append(table_id, MEMBER_JOINED, {'user_id': creator_id}, actor_id=creator_id)
+
+        return await self.invites.create_table(name, add_creator)
 
     async def join_table(self, table_id: int, user_id: int) -> bool:
         join_data = JoinTableInput(table_id=table_id, user_id=user_id)
         await TableUserDao.add(self.session, join_data)
+        await self.ledger.append(table_id, MEMBER_JOINED, {'user_id': user_id}, actor_id=user_id)
         await self.session.commit()
         return True
 
     async def join_table_by_code(self, invite_code: str, user_id: int) -> Optional[int]:
-        result = await self.session.execute(
-            select(DiningTable).filter(DiningTable.invite_code == invite_code)
-        )
-        table = result.scalar_one_or_none()
-        
+        result = await self._join(invite_code, User.id == user_id)
+        return result.table.id if result.status in (JoinStatus.JOINED, JoinStatus.ALREADY_MEMBER) else None
+
+    async def join_by_code(self, invite_code: str, telegram_id: int) -> JoinResult:
+        """
+        Add the Telegram user to the table the code invites to, in one transaction.
+
+        Membership is written with INSERT ... ON CONFLICT DO NOTHING on the
+        unique (table_id, user_id) index, so concurrent joins cannot create
+        duplicate rows and a repeated join reports ALREADY_MEMBER.
+        """
+        return await self._join(invite_code, User.telegram_id == telegram_id)
+
+    async def _join(self, invite_code: str, user_filter) -> JoinResult:
+        table = await self.invites.resolve(invite_code)
         if not table:
-            return None
-        
-        join_data = JoinTableInput(table_id=table.id, user_id=user_id)
-        await TableUserDao.add(self.session, join_data)
-        await self.session.commit()
-        return table.id
+            return JoinResult(JoinStatus.TABLE_NOT_FOUND)
 
-    async def get_table_by_code(self, invite_code: str) -> Optional[DiningTable]:
-        result = await self.session.execute(
-            select(DiningTable).filter(DiningTable.invite_code == invite_code)
+        user_id = await self.session.scalar(
+            upsert(self.session, TableUser)
+            .from_select(["table_id", "user_id"], select(literal(table.id), User.id).filter(user_filter))
+            .on_conflict_do_nothing(index_elements=["table_id", "user_id"])
+            .returning(TableUser.user_id)
         )
-        return result.scalar_one_or_none()
+        if user_id is None:
+            # Вставка пропущена: пользователь уже в столе или не зарегистрирован
+            registered = await self.session.scalar(select(User.id).filter(user_filter).exists().select())
+            status = JoinStatus.ALREADY_MEMBER if registered else JoinStatus.USER_NOT_FOUND
+            await self.session.rollback()
+            return JoinResult(status, table)
+
+        try:
+            await self.ledger.append(table.id, MEMBER_JOINED, {'user_id': user_id}, actor_id=user_id)
+        except TableClosedError:
+            # Стол закрыли после того, как код попал в кэш
+            await self.session.rollback()
+            self.invites.forget(invite_code)
+            return JoinResult(JoinStatus.TABLE_NOT_FOUND)
+        await self.session.commit()
+        return JoinResult(JoinStatus.JOINED, table)
+
+    async def get_table_by_code(self, invite_code: str) -> Optional[TableEntity]:
+        return await self.invites.resolve(invite_code)
 
     async def get_user_tables(self, user_id: int) -> List[TableEntity]:
         from sqlalchemy import select
         from bot.dao.models import TableUser, DiningTable
         
         result = await self.session.execute(
-            select(DiningTable)
-            .join(TableUser, TableUser.table_id == DiningTable.id)
-            .filter(TableUser.user_id == user_id)
+            select(DiningTable).filter(DiningTable.id.in_(open_user_tables(user_id)))
         )
         tables = result.scalars().all()
         return [TableEntity(name=table.name, id=table.id) for table in tables]
 
+    async def get_user_tables_balances(self, user_id: int) -> List[TableBalanceEntity]:
+        """The user's tables with their balance in each, for the tables dashboard."""
+        return await self.ledger.get_user_balances(user_id)
+
     async def leave_table(self, table_id: int, user_id: int) -> bool:
         from sqlalchemy import delete
         
@@ -95,5 +124,7 @@ class TableUseCase:
                 TableUser.user_id == user_id
             )
         )
+        if result.rowcount > 0:
+            await self.ledger.append(table_id, MEMBER_LEFT, {'user_id': user_id}, actor_id=user_id)
         await self.session.commit()
         return result.rowcount > 0
\ No newline at end of file
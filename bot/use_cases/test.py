@@ -1,39 +1,19 @@
 import pytest
 import pytest_asyncio
-from sqlalchemy.ext.asyncio import (
-    create_async_engine,
-    async_sessionmaker,
-    AsyncSession,
-)
-from bot.dao.database import Base
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from bot.dao.database import Base
 from bot.dao.models import User, DiningTable, TableUser, UserItemConsumption, Item
+from bot.use_cases.invite_code_use_cases import generate_invite_code
 from bot.use_cases.table_use_cases import TableUseCase
 from bot.use_cases.expense_use_cases import ExpenseUseCase
-from bot.use_cases.user_use_cases import UserUseCase
+from bot.use_cases.user_use_cases import CreateUserInput, UserUseCase
 from bot.domain.entities import TableEntity
+from bot.infrastructure.query_budget import query_budget, QueryBudgetExceeded
 
 pytestmark = pytest.mark.asyncio
 
-DATABASE_URL = "sqlite+aiosqlite:///:memory:"
-
-
-@pytest_asyncio.fixture
-async def db_session() -> AsyncSession:
-    engine = create_async_engine(DATABASE_URL, echo=False)
-
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-    Session = async_sessionmaker(engine, expire_on_commit=False)
-
-    async with Session() as session:
-        yield session
-
-    await engine.dispose()
-
 
 @pytest_asyncio.fixture
 async def user(db_session: AsyncSession) -> User:
@@ -62,34 +42,12 @@ async def other_user(db_session: AsyncSession) -> User:
 
 
 def test_generate_invite_code_length_and_charset():
-    usecase = TableUseCase(None)
-
-    code = usecase._generate_invite_code(length=12)
+    code = generate_invite_code(length=12)
 
     assert len(code) == 12
     assert all(c.isupper() or c.isdigit() for c in code)
 
 
-@pytest.mark.asyncio
-async def test_is_invite_code_unique_true(db_session, user):
-    usecase = TableUseCase(db_session)
-
-    result = await usecase._is_invite_code_unique("UNIQUE123")
-    assert result is True
-
-
-@pytest.mark.asyncio
-async def test_is_invite_code_unique_false(db_session, user):
-    table = DiningTable(name="Table", invite_code="DUPLICATE")
-    db_session.add(table)
-    await db_session.commit()
-
-    usecase = TableUseCase(db_session)
-    result = await usecase._is_invite_code_unique("DUPLICATE")
-
-    assert result is False
-
-
 @pytest.mark.asyncio
 async def test_create_table_creates_table_and_creator_link(db_session, user):
     usecase = TableUseCase(db_session)
@@ -451,6 +409,116 @@ async def test_get_table_operations(db_session, table, users):
     assert len(op["participants"]) == 2
 
 
+@pytest.mark.asyncio
+async def test_calculate_debts_query_budget(db_session, table, users):
+    usecase = ExpenseUseCase(db_session)
+    for i in range(10):
+        await usecase.add_expense(
+            table_id=table.id,
+            item_name=f"Item {i}",
+            price=300 + i,
+            user_ids=[u.id for u in users],
+            ratios=[1.0, 2.0, 1.0],
+        )
+    await usecase.add_expense(table.id, "Bill", 3045, [users[0].id], is_income=True)
+
+    with query_budget(db_session, 2, "calculate_debts"):
+        debts = await usecase.calculate_debts(table.id)
+
+    assert debts
+
+
+@pytest.mark.asyncio
+async def test_get_table_operations_query_budget_per_page(db_session, table, users):
+    usecase = ExpenseUseCase(db_session)
+    for i in range(7):
+        await usecase.add_expense(
+            table_id=table.id,
+            item_name=f"Item {i}",
+            price=100,
+            user_ids=[u.id for u in users],
+            created_by_id=users[i % 3].id,
+        )
+
+    pages = []
+    for offset in (0, 5):
+        with query_budget(db_session, 3, "get_table_operations"):
+            pages.append(await usecase.get_table_operations(table.id, limit=5, offset=offset))
+
+    assert [len(page) for page in pages] == [5, 2]
+    assert len({op["id"] for page in pages for op in page}) == 7
+    assert all(len(op["participants"]) == 3 for page in pages for op in page)
+
+
+@pytest.mark.asyncio
+async def test_calculate_debts_matches_per_user_reference(db_session, table, users):
+    usecase = ExpenseUseCase(db_session)
+    await usecase.add_expense(table.id, "Wine", 1000, [users[0].id, users[1].id], ratios=[2.0, 1.0])
+    await usecase.add_expense(table.id, "Taxi", 777, [u.id for u in users], is_income=False)
+    await usecase.add_expense(table.id, "Bill", 1777, [users[2].id], is_income=True)
+
+    amounts = await usecase._calculate_amounts(table.id)
+
+    for user in users:
+        assert amounts[user.id]["expenses"] == await usecase._calculate_user_amount(user.id, table.id, False)
+        assert amounts[user.id]["income"] == await usecase._calculate_user_amount(user.id, table.id, True)
+
+
+@pytest.mark.asyncio
+async def test_add_repayment_lowers_both_balances(db_session, table, users):
+    usecase = ExpenseUseCase(db_session)
+    await usecase.add_expense(table.id, "Dinner", 300, [u.id for u in users])
+    await usecase.add_expense(table.id, "Bill", 300, [users[0].id], is_income=True)
+
+    await usecase.add_repayment(table.id, users[1].id, users[0].id, 100)
+
+    alice = await usecase.get_user_balance(table.id, users[0].id)
+    bob = await usecase.get_user_balance(table.id, users[1].id)
+    assert alice["received"] == 100 and alice["balance"] == 100
+    assert bob["repaid"] == 100 and bob["balance"] == 0
+    assert await usecase.calculate_debts(table.id) == [(users[2].id, users[0].id, 100)]
+
+
+@pytest.mark.asyncio
+async def test_calculate_debts_with_repayment_history_in_one_aggregate_query(db_session, table, users):
+    usecase = ExpenseUseCase(db_session)
+    await usecase.add_expense(table.id, "Dinner", 3000, [u.id for u in users])
+    await usecase.add_expense(table.id, "Bill", 3000, [users[0].id], is_income=True)
+    for _ in range(10):
+        await usecase.add_repayment(table.id, users[1].id, users[0].id, 50)
+        await usecase.add_repayment(table.id, users[2].id, users[0].id, 50)
+
+    with query_budget(db_session, 2, "calculate_debts"):
+        debts = await usecase.calculate_debts(table.id)
+
+    assert sorted(debts) == [(users[1].id, users[0].id, 500), (users[2].id, users[0].id, 500)]
+
+
+@pytest.mark.asyncio
+async def test_get_table_operations_includes_repayments(db_session, table, users):
+    usecase = ExpenseUseCase(db_session)
+    await usecase.add_expense(table.id, "Pizza", 300, [u.id for u in users], created_by_id=users[0].id)
+    await usecase.add_repayment(table.id, users[1].id, users[0].id, 100)
+
+    operations = await usecase.get_table_operations(table.id)
+
+    assert sorted(op["kind"] for op in operations) == ["item", "repayment"]
+    repayment, item = sorted(operations, key=lambda op: op["kind"] == "item")
+    assert repayment["name"] == "Погашение долга → Alice"
+    assert repayment["price"] == 100 and repayment["is_income"] is True
+    assert repayment["created_by"] == "Bob"
+    assert repayment["participants"] == []
+    assert len(item["participants"]) == 3
+
+
+@pytest.mark.asyncio
+async def test_query_budget_fails_when_exceeded(db_session, user):
+    with pytest.raises(QueryBudgetExceeded):
+        with query_budget(db_session, 1, "two_selects"):
+            await db_session.execute(select(User))
+            await db_session.execute(select(DiningTable))
+
+
 @pytest_asyncio.fixture
 async def usecase(db_session):
     return UserUseCase(db_session)
@@ -520,3 +588,38 @@ async def test_get_or_create_user_commit(db_session, usecase):
     users = result.scalars().all()
     assert len(users) == 1
     assert users[0].telegram_id == 555
+
+
+@pytest.mark.asyncio
+async def test_get_or_create_user_refreshes_profile(db_session, usecase):
+    user_id = await usecase.get_or_create_user(telegram_id=777, username="old", first_name="Old")
+
+    assert await usecase.get_or_create_user(telegram_id=777, username="new", first_name="New") == user_id
+
+    user = await db_session.get(User, user_id, populate_existing=True)
+    assert (user.username, user.first_name, user.timezone) == ("new", "New", "Europe/Moscow")
+
+
+@pytest.mark.asyncio
+async def test_get_or_create_user_skips_unchanged_profile(db_session, usecase):
+    user_id = await usecase.get_or_create_user(telegram_id=777, username="alice")
+
+    with query_budget(db_session, 0, "unchanged profile"):
+        assert await usecase.get_or_create_user(telegram_id=777, username="alice") == user_id
+
+
+@pytest.mark.asyncio
+async def test_get_or_create_users_in_bulk(db_session, usecase, user):
+    with query_budget(db_session, 1, "bulk upsert"):
+        user_ids = await usecase.get_or_create_users([
+            CreateUserInput(telegram_id=user.telegram_id, username="renamed"),
+            CreateUserInput(telegram_id=1, first_name="One"),
+            CreateUserInput(telegram_id=1, first_name="Uno"),
+        ])
+
+    assert user_ids[user.telegram_id] == user.id
+    result = await db_session.execute(
+        select(User.telegram_id, User.username, User.first_name).order_by(User.telegram_id)
+        .execution_options(populate_existing=True)
+    )
+    assert result.all() == [(1, None, "Uno"), (user.telegram_id, "renamed", None)]
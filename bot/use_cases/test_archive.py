@@ -0,0 +1,159 @@
+from datetime import timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from bot.dao.database import Base
+from bot.dao.models import ArchivedTable, BalanceSnapshot, Item, TableEvent, Transaction, User
+from bot.infrastructure.metrics import archive_rows
+from bot.use_cases.archive_use_cases import ArchiveUseCase, create_archive_tables, ensure_monotonic_ids
+from bot.use_cases.closing_use_cases import TableClosingUseCase
+from bot.use_cases.expense_use_cases import ExpenseUseCase
+from bot.use_cases.table_use_cases import TableUseCase
+
+# Отрицательный срок: неактивными считаются все столы
+EVERYTHING = timedelta(days=-1)
+
+
+@pytest_asyncio.fixture
+async def archive_maker():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    await create_archive_tables(engine)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def users(db_session):
+    users = [User(telegram_id=i, first_name=name) for i, name in enumerate(("Alice", "Bob"), 1)]
+    db_session.add_all(users)
+    await db_session.commit()
+    return users
+
+
+@pytest_asyncio.fixture
+async def tables(db_session, users):
+    usecase = ExpenseUseCase(db_session)
+    table_ids = []
+    for name in ("Old dinner", "Fresh lunch"):
+        table_id, _ = await TableUseCase(db_session).create_table(name, users[0].id)
+        await TableUseCase(db_session).join_table(table_id, users[1].id)
+        await usecase.add_expense(table_id, "Pizza", 1000, [u.id for u in users])
+        await usecase.add_expense(table_id, "Bill", 1000, [users[0].id], is_income=True)
+        await usecase.add_repayment(table_id, users[1].id, users[0].id, 200)
+        table_ids.append(table_id)
+    return table_ids
+
+
+async def _count(session, model, **filters):
+    return await session.scalar(select(func.count()).select_from(model).filter_by(**filters))
+
+
+@pytest.mark.asyncio
+async def test_archive_moves_rows_but_keeps_balances(db_session, users, tables, archive_maker):
+    old, fresh = tables
+    usecase = ExpenseUseCase(db_session)
+    debts_before = await usecase.calculate_debts(old)
+    dashboard_before = await TableUseCase(db_session).get_user_tables_balances(users[0].id)
+    archived_before = archive_rows.value("archive", "items")
+
+    report = await ArchiveUseCase(db_session, archive_maker).archive_batch(EVERYTHING, batch_size=1)
+
+    assert report.tables == [old]
+    assert report.rows == {
+        "items": 2, "table_items": 2, "user_item_consumption": 3, "transactions": 1,
+        "table_events": 5, "balance_snapshots": 1,
+    }
+    assert archive_rows.value("archive", "items") == archived_before + 2
+    assert report.used_bytes_before and report.used_bytes_after
+    assert await _count(db_session, Item) == 2
+    assert await _count(db_session, Transaction, table_id=old) == 0
+    assert await _count(db_session, TableEvent, table_id=old) == 0
+    assert await _count(db_session, BalanceSnapshot, table_id=old) == 1
+    assert (await _count(db_session, ArchivedTable, table_id=old)) == 1
+    async with archive_maker() as archive:
+        assert await _count(archive, Item) == 2
+    assert await usecase.calculate_debts(old) == debts_before
+    assert await TableUseCase(db_session).get_user_tables_balances(users[0].id) == dashboard_before
+
+
+@pytest.mark.asyncio
+async def test_restore_brings_the_table_back(db_session, users, tables, archive_maker):
+    old, _ = tables
+    usecase = ExpenseUseCase(db_session)
+    operations = await usecase.get_table_operations(old)
+    events = await usecase.ledger.get_events(old)
+    archiver = ArchiveUseCase(db_session, archive_maker)
+    await archiver.archive_batch(EVERYTHING, batch_size=1)
+    # Пока стол в архиве, новые операции пишутся в основную базу
+    await usecase.add_expense(old, "Dessert", 400, [users[1].id])
+
+    restored = await archiver.restore(old)
+
+    assert restored == 14
+    assert await archiver.restore(old) == 0
+    assert await _count(db_session, ArchivedTable) == 0
+    assert [op for op in await usecase.get_table_operations(old) if op['name'] != "Dessert"] == operations
+    assert [e.id for e in await usecase.ledger.get_events(old)][:-1] == [e.id for e in events]
+    assert await usecase.ledger.aggregate_amounts(old) == (await usecase.ledger.get_amounts(old))[0]
+    async with archive_maker() as archive:
+        assert await _count(archive, Item) == 0
+        assert await _count(archive, TableEvent) == 0
+
+
+@pytest.mark.asyncio
+async def test_active_tables_are_not_archived(db_session, tables, archive_maker):
+    report = await ArchiveUseCase(db_session, archive_maker).archive_batch(timedelta(days=30), batch_size=10)
+
+    assert report.tables == [] and report.rows == {}
+
+
+@pytest.mark.asyncio
+async def test_ids_of_archived_rows_are_not_reused(db_session, users, tables, archive_maker):
+    old, fresh = tables
+    archiver = ArchiveUseCase(db_session, archive_maker)
+    await archiver.archive_batch(EVERYTHING, batch_size=1)
+    # Закрытие удаляет новейшие строки: без AUTOINCREMENT их id достались бы новым
+    await TableClosingUseCase(db_session).close_table(fresh)
+    await db_session.commit()
+    table_id, _ = await TableUseCase(db_session).create_table("Breakfast", users[0].id)
+    await ExpenseUseCase(db_session).add_expense(table_id, "Coffee", 300, [users[0].id])
+
+    assert await archiver.restore(old) == 14
+    assert await _count(db_session, Item) == 3
+
+
+@pytest.mark.asyncio
+async def test_old_schema_is_rebuilt_with_autoincrement(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.sqlite3'}")
+    archive_engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            # База, созданная до AUTOINCREMENT
+            await conn.exec_driver_sql("DROP TABLE items")
+            await conn.exec_driver_sql("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+                                       "price INTEGER NOT NULL, is_income BOOLEAN NOT NULL, created_by_id INTEGER, "
+                                       "created_at TIMESTAMP, updated_at TIMESTAMP)")
+            await conn.exec_driver_sql("INSERT INTO items (id, name, price, is_income, created_at, updated_at) "
+                                       "VALUES (1, 'Pizza', 900, 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)")
+        await create_archive_tables(archive_engine)
+        async with archive_engine.begin() as archive:
+            await archive.exec_driver_sql("INSERT INTO items (id, name, price, is_income, created_at, updated_at) "
+                                          "VALUES (7, 'Old', 100, 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)")
+
+        await ensure_monotonic_ids(engine, archive_engine)
+        await ensure_monotonic_ids(engine, archive_engine)
+
+        async with engine.begin() as conn:
+            sql = await conn.scalar(text("SELECT sql FROM sqlite_master WHERE name = 'items'"))
+            assert "AUTOINCREMENT" in sql
+            assert (await conn.execute(text("SELECT id, name FROM items"))).all() == [(1, "Pizza")]
+            await conn.execute(text("INSERT INTO items (name, price, is_income) VALUES ('Soup', 200, 0)"))
+            assert await conn.scalar(text("SELECT max(id) FROM items")) == 8
+    finally:
+        await engine.dispose()
+        await archive_engine.dispose()
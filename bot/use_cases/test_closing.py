@@ -0,0 +1,105 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+
+from bot.dao.models import BalanceSnapshot, Item, TableItem, Transaction, User, UserItemConsumption
+from bot.use_cases.closing_use_cases import TableClosingUseCase
+from bot.use_cases.expense_use_cases import ExpenseUseCase
+from bot.use_cases.ledger_use_cases import LedgerUseCase, TableClosedError
+from bot.use_cases.table_use_cases import TableUseCase
+
+
+@pytest_asyncio.fixture
+async def users(db_session):
+    users = [User(telegram_id=i, first_name=name) for i, name in enumerate(("Alice", "Bob", "Charlie"), 1)]
+    db_session.add_all(users)
+    await db_session.commit()
+    return users
+
+
+@pytest_asyncio.fixture
+async def table(db_session, users):
+    table_id, invite_code = await TableUseCase(db_session).create_table("Dinner", users[0].id)
+    for user in users[1:]:
+        await TableUseCase(db_session).join_table(table_id, user.id)
+    usecase = ExpenseUseCase(db_session)
+    await usecase.add_expense(table_id, "Pizza", 900, [u.id for u in users], created_by_id=users[0].id)
+    await usecase.add_expense(table_id, "Bill", 900, [users[0].id], is_income=True)
+    await usecase.add_repayment(table_id, users[1].id, users[0].id, 300)
+    return table_id, invite_code
+
+
+async def _count(session, model):
+    return await session.scalar(select(func.count()).select_from(model))
+
+
+@pytest.mark.asyncio
+async def test_table_closes_when_every_member_agrees(db_session, users, table):
+    table_id, _ = table
+    closing = TableClosingUseCase(db_session)
+
+    votes = [await closing.agree_to_close(table_id, user.id) for user in users]
+
+    assert [(v.agreed, v.total, v.closed) for v in votes] == [(1, 3, False), (2, 3, False), (3, 3, True)]
+    assert votes[-1].balances == {users[0].id: 300, users[1].id: 0, users[2].id: -300}
+    settlement = await closing.get_settlement(table_id)
+    assert [op["kind"] for op in settlement.history] == ["item", "item", "repayment"]
+
+
+@pytest.mark.asyncio
+async def test_closing_moves_history_out_of_hot_tables(db_session, users, table, monkeypatch):
+    monkeypatch.setattr(LedgerUseCase, "snapshot_every", 2)
+    table_id, _ = table
+    other_id, _ = await TableUseCase(db_session).create_table("Lunch", users[0].id)
+    await ExpenseUseCase(db_session).add_expense(other_id, "Soup", 200, [users[0].id])
+    operations = await ExpenseUseCase(db_session).get_table_operations(table_id)
+
+    await TableClosingUseCase(db_session).close_table(table_id)
+    await db_session.commit()
+
+    assert await _count(db_session, Item) == 1
+    assert await _count(db_session, TableItem) == 1
+    assert await _count(db_session, UserItemConsumption) == 1
+    assert await _count(db_session, Transaction) == 0
+    assert await db_session.scalar(
+        select(func.count()).select_from(BalanceSnapshot).filter(BalanceSnapshot.table_id == table_id)
+    ) == 1
+    # История закрытого стола читается из архива в прежнем виде
+    assert await ExpenseUseCase(db_session).get_table_operations(table_id) == operations
+    assert await ExpenseUseCase(db_session).get_table_operations(table_id, limit=1, offset=1) == operations[1:2]
+
+
+@pytest.mark.asyncio
+async def test_closed_table_drops_out_of_user_queries(db_session, users, table):
+    table_id, invite_code = table
+    await TableClosingUseCase(db_session).close_table(table_id)
+    await db_session.commit()
+    tables = TableUseCase(db_session)
+
+    assert await tables.get_user_tables(users[0].id) == []
+    assert await tables.get_user_tables_balances(users[0].id) == []
+    assert await LedgerUseCase(db_session).get_user_tables_amounts(users[0].id) == {}
+    assert await tables.get_table_by_code(invite_code) is None
+
+
+@pytest.mark.asyncio
+async def test_closed_table_rejects_changes(db_session, users, table):
+    table_id, _ = table
+    await TableClosingUseCase(db_session).close_table(table_id)
+    await db_session.commit()
+
+    with pytest.raises(TableClosedError):
+        await ExpenseUseCase(db_session).add_expense(table_id, "Late", 100, [users[0].id])
+    await db_session.rollback()
+    assert await TableClosingUseCase(db_session).agree_to_close(999, 999) is None
+
+
+@pytest.mark.asyncio
+async def test_vote_after_close_is_rejected(db_session, users, table):
+    table_id, _ = table
+    closing = TableClosingUseCase(db_session)
+    for user in users:
+        await closing.agree_to_close(table_id, user.id)
+
+    with pytest.raises(TableClosedError):
+        await closing.agree_to_close(table_id, users[0].id)
@@ -0,0 +1,101 @@
+from datetime import timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from bot.dao.models import DiningTable, TableEvent, TableUser, User
+from bot.infrastructure.query_budget import query_budget
+from bot.use_cases import invite_code_use_cases
+from bot.use_cases.closing_use_cases import TableClosingUseCase
+from bot.use_cases.invite_code_use_cases import InviteCodeUseCase
+from bot.use_cases.table_use_cases import TableUseCase
+
+
+@pytest_asyncio.fixture
+async def user(db_session):
+    user = User(telegram_id=1, first_name="Alice")
+    db_session.add(user)
+    await db_session.commit()
+    return user
+
+
+@pytest.mark.asyncio
+async def test_taken_code_retries_the_whole_transaction(db_session, user, monkeypatch):
+    db_session.add(DiningTable(name="Existing", invite_code="TAKEN000"))
+    await db_session.commit()
+    user_id = user.id
+    codes = iter(["TAKEN000", "TAKEN000", "FREE0000"])
+    monkeypatch.setattr(invite_code_use_cases, "generate_invite_code", lambda: next(codes))
+
+    table_id, code = await TableUseCase(db_session).create_table("Dinner", user_id)
+
+    assert code == "FREE0000"
+    assert (await db_session.get(DiningTable, table_id)).invite_code == "FREE0000"
+    # От откатанных попыток не осталось ни столов, ни участников, ни событий
+    assert await db_session.scalar(select(func.count()).select_from(DiningTable)) == 2
+    assert (await db_session.execute(select(TableUser.table_id, TableUser.user_id))).all() == [(table_id, user_id)]
+    assert await db_session.scalar(select(func.count()).select_from(TableEvent)) == 1
+
+
+@pytest.mark.asyncio
+async def test_other_integrity_errors_are_not_retried(db_session, user, monkeypatch):
+    codes = iter(["FIRST000", "SECOND00"])
+    monkeypatch.setattr(invite_code_use_cases, "generate_invite_code", lambda: next(codes))
+
+    async def broken(table_id: int) -> None:
+        db_session.add(User(telegram_id=1, first_name="Duplicate"))
+        await db_session.flush()
+
+    with pytest.raises(IntegrityError):
+        await InviteCodeUseCase(db_session).create_table("Dinner", broken)
+
+    assert await db_session.scalar(select(func.count()).select_from(DiningTable)) == 0
+
+
+@pytest.mark.asyncio
+async def test_resolved_codes_are_served_from_cache(db_session, user):
+    table_id, code = await TableUseCase(db_session).create_table("Dinner", user.id)
+    invites = InviteCodeUseCase(db_session)
+
+    assert (await invites.resolve(code)).id == table_id
+    with query_budget(db_session, 0, "cached resolve"):
+        table = await invites.resolve(code)
+
+    assert (table.id, table.name) == (table_id, "Dinner")
+    assert await invites.resolve("UNKNOWN1") is None
+
+
+@pytest.mark.asyncio
+async def test_rotation_replaces_the_code(db_session, user):
+    table_id, old_code = await TableUseCase(db_session).create_table("Dinner", user.id)
+    invites = InviteCodeUseCase(db_session)
+    await invites.resolve(old_code)
+
+    new_code = await invites.rotate(table_id)
+
+    assert new_code != old_code
+    assert await invites.resolve(old_code) is None
+    assert (await invites.resolve(new_code)).id == table_id
+
+
+@pytest.mark.asyncio
+async def test_expired_code_does_not_resolve(db_session, user, monkeypatch):
+    expiring = InviteCodeUseCase(db_session, ttl=timedelta(seconds=-1))
+    table_id, code = await expiring.create_table("Dinner")
+
+    assert await expiring.resolve(code) is None
+
+    code = await InviteCodeUseCase(db_session, ttl=timedelta(days=7)).rotate(table_id)
+    assert (await expiring.resolve(code)).id == table_id
+
+
+@pytest.mark.asyncio
+async def test_closing_a_table_drops_its_cached_code(db_session, user):
+    table_id, code = await TableUseCase(db_session).create_table("Dinner", user.id)
+    await InviteCodeUseCase(db_session).resolve(code)
+
+    await TableClosingUseCase(db_session).agree_to_close(table_id, user.id)
+
+    assert await TableUseCase(db_session).get_table_by_code(code) is None
@@ -0,0 +1,94 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import create_engine, func, insert, inspect, select
+
+from bot.dao.database import Base
+from bot.dao.models import TableEvent, TableUser, User
+from bot.domain.entities import JoinStatus
+from bot.infrastructure.query_budget import query_budget
+from bot.use_cases.ledger_use_cases import MEMBER_JOINED
+from bot.use_cases.table_use_cases import TableUseCase, ensure_unique_membership
+
+
+@pytest_asyncio.fixture
+async def users(db_session):
+    users = [User(telegram_id=i, first_name=name) for i, name in enumerate(("Alice", "Bob"), 1)]
+    db_session.add_all(users)
+    await db_session.commit()
+    return users
+
+
+@pytest_asyncio.fixture
+async def table(db_session, users):
+    return await TableUseCase(db_session).create_table("Dinner", users[0].id)
+
+
+async def _memberships(session, table_id):
+    return await session.scalar(select(func.count()).select_from(TableUser).filter(TableUser.table_id == table_id))
+
+
+@pytest.mark.asyncio
+async def test_join_by_code_adds_the_member_once(db_session, users, table):
+    table_id, code = table
+    tables = TableUseCase(db_session)
+
+    joined = await tables.join_by_code(code, users[1].telegram_id)
+    again = await tables.join_by_code(code, users[1].telegram_id)
+
+    assert (joined.status, joined.table.id, joined.table.name) == (JoinStatus.JOINED, table_id, "Dinner")
+    assert (again.status, again.table.id) == (JoinStatus.ALREADY_MEMBER, table_id)
+    assert await _memberships(db_session, table_id) == 2
+    assert await db_session.scalar(
+        select(func.count()).select_from(TableEvent)
+        .filter(TableEvent.table_id == table_id, TableEvent.kind == MEMBER_JOINED)
+    ) == 2
+
+
+@pytest.mark.asyncio
+async def test_join_by_code_reports_unknown_code_and_user(db_session, users, table):
+    _, code = table
+    tables = TableUseCase(db_session)
+
+    assert (await tables.join_by_code("UNKNOWN1", users[1].telegram_id)).status is JoinStatus.TABLE_NOT_FOUND
+    assert (await tables.join_by_code(code, 999)).status is JoinStatus.USER_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_membership_is_unique(db_session, users, table):
+    table_id, _ = table
+    # Вставка мимо use case: повторное членство отбрасывает индекс
+    with pytest.raises(Exception):
+        async with db_session.begin_nested():
+            db_session.add(TableUser(table_id=table_id, user_id=users[0].id))
+    assert await _memberships(db_session, table_id) == 1
+
+
+@pytest.mark.asyncio
+async def test_join_with_a_cached_code_is_one_insert(db_session, users, table):
+    _, code = table
+    tables = TableUseCase(db_session)
+    await tables.get_table_by_code(code)
+
+    # INSERT ... RETURNING, затем строка стола и запись события в журнал
+    with query_budget(db_session, 3, "join_by_code"):
+        result = await tables.join_by_code(code, users[1].telegram_id)
+
+    assert result.joined
+
+
+def test_unique_index_is_built_on_an_old_database():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ux_table_user_table_id_user_id")
+        conn.execute(insert(TableUser), [
+            {"table_id": 1, "user_id": 1}, {"table_id": 1, "user_id": 1}, {"table_id": 1, "user_id": 2},
+        ])
+
+        ensure_unique_membership(conn)
+        ensure_unique_membership(conn)
+
+        assert "ux_table_user_table_id_user_id" in {i["name"] for i in inspect(conn).get_indexes("table_user")}
+        assert conn.execute(select(TableUser.table_id, TableUser.user_id).order_by(TableUser.id)).all() == [
+            (1, 1), (1, 2)
+        ]
@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import func, select
+
+from benchmarks.datagen import Scenario
+from bot.dao.models import TableItem
+from bot.use_cases.expense_use_cases import ExpenseUseCase
+
+
+SCENARIO = Scenario(50, 2_000, "skewed")
+
+
+async def _item_count(session, table_id):
+    return await session.scalar(
+        select(func.count()).select_from(TableItem).where(TableItem.table_id == table_id)
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("run", range(2))
+async def test_snapshot_is_restored_for_every_test(dataset_session, run):
+    session, dataset = await dataset_session(SCENARIO)
+    assert await _item_count(session, dataset.table_id) == SCENARIO.items
+
+    await ExpenseUseCase(session).add_expense(
+        dataset.table_id, "Лишний расход", 1_000, dataset.user_ids[:2], created_by_id=dataset.user_ids[0]
+    )
+    assert await _item_count(session, dataset.table_id) == SCENARIO.items + 1
+
+
+@pytest.mark.asyncio
+async def test_debts_settle_every_balance(dataset_session):
+    session, dataset = await dataset_session(SCENARIO)
+    usecase = ExpenseUseCase(session)
+    amounts = await usecase._calculate_amounts(dataset.table_id)
+
+    balances = {user_id: a["income"] - a["expenses"] for user_id, a in amounts.items()}
+    for debtor, creditor, amount in await usecase.calculate_debts(dataset.table_id):
+        assert amount > 0
+        balances[debtor] += amount
+        balances[creditor] -= amount
+    # Из-за округления долей баланс может не сходиться в ноль, но остаток
+    # остаётся только на одной стороне
+    assert all(b >= 0 for b in balances.values()) or all(b <= 0 for b in balances.values())
@@ -0,0 +1,184 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from bot.dao.database import Base
+
+from bot.dao.models import BalanceSnapshot, DiningTable, Item, TableEvent, TableItem, User, UserItemConsumption
+from bot.infrastructure.query_budget import query_budget
+from bot.use_cases.expense_use_cases import ExpenseUseCase
+from bot.use_cases.ledger_use_cases import LedgerUseCase, MEMBER_JOINED, balance
+from bot.use_cases.table_use_cases import TableUseCase
+
+
+@pytest_asyncio.fixture
+async def users(db_session):
+    users = [User(telegram_id=i, first_name=name) for i, name in enumerate(("Alice", "Bob", "Charlie"), 1)]
+    db_session.add_all(users)
+    await db_session.commit()
+    return users
+
+
+@pytest_asyncio.fixture
+async def table_id(db_session, users):
+    table_id, _ = await TableUseCase(db_session).create_table("Dinner", users[0].id)
+    for user in users[1:]:
+        await TableUseCase(db_session).join_table(table_id, user.id)
+    return table_id
+
+
+async def _balances(usecase, table_id, users):
+    amounts = await usecase._calculate_amounts(table_id)
+    return [balance(amounts.get(user.id)) for user in users]
+
+
+async def _aggregate_balances(usecase, table_id, users):
+    amounts = await usecase.ledger.aggregate_amounts(table_id)
+    return [balance(amounts.get(user.id)) for user in users]
+
+
+@pytest.mark.asyncio
+async def test_every_change_is_appended_to_the_log(db_session, users, table_id):
+    usecase = ExpenseUseCase(db_session)
+    await usecase.add_expense(table_id, "Pizza", 900, [u.id for u in users], created_by_id=users[0].id)
+    await usecase.add_repayment(table_id, users[1].id, users[0].id, 300)
+    await TableUseCase(db_session).leave_table(table_id, users[2].id)
+
+    events = await LedgerUseCase(db_session).get_events(table_id)
+
+    assert [e.kind for e in events] == [
+        "member_joined", "member_joined", "member_joined", "expense_added", "repayment", "member_left"
+    ]
+    assert events[3].payload["shares"] == {str(u.id): 300 for u in users}
+    assert events[4].payload == {"transaction_id": 1, "from": users[1].id, "to": users[0].id, "amount": 300}
+    assert events[5].actor_id == users[2].id
+
+
+@pytest.mark.asyncio
+async def test_reads_fold_only_events_after_the_latest_snapshot(db_session, users, table_id, monkeypatch):
+    monkeypatch.setattr(LedgerUseCase, "snapshot_every", 4)
+    usecase = ExpenseUseCase(db_session)
+    for i in range(10):
+        await usecase.add_expense(table_id, f"Item {i}", 100 + i, [u.id for u in users[:2 + i % 2]])
+    await usecase.add_repayment(table_id, users[1].id, users[0].id, 50)
+
+    snapshots = await db_session.scalar(
+        select(func.count()).select_from(BalanceSnapshot).filter(BalanceSnapshot.table_id == table_id)
+    )
+    amounts, last_event_id = await usecase.ledger.get_amounts(table_id)
+    unfolded = await usecase.ledger.get_events(table_id, after_event_id=await db_session.scalar(
+        select(func.max(BalanceSnapshot.last_event_id)).filter(BalanceSnapshot.table_id == table_id)
+    ))
+
+    assert snapshots == 4
+    assert len(unfolded) < 4 and last_event_id == unfolded[-1].id
+    assert await _balances(usecase, table_id, users) == await _aggregate_balances(usecase, table_id, users)
+    with query_budget(db_session, 2, "calculate_debts"):
+        await usecase.calculate_debts(table_id)
+
+
+@pytest.mark.asyncio
+async def test_table_without_log_gets_snapshot_from_items_on_first_event(db_session, users):
+    table = DiningTable(name="Legacy", invite_code="LEGACY01")
+    item = Item(name="Old dinner", price=600, is_income=False)
+    db_session.add_all([table, item])
+    await db_session.flush()
+    db_session.add(TableItem(table_id=table.id, item_id=item.id))
+    db_session.add_all(UserItemConsumption(user_id=u.id, item_id=item.id, ratio=1.0) for u in users)
+    await db_session.commit()
+    usecase = ExpenseUseCase(db_session)
+
+    assert await usecase.ledger.get_amounts(table.id) is None
+    assert await _balances(usecase, table.id, users) == [-200, -200, -200]
+
+    await usecase.add_expense(table.id, "Bill", 600, [users[0].id], is_income=True)
+
+    assert await usecase.ledger.get_amounts(table.id) is not None
+    assert await _balances(usecase, table.id, users) == [400, -200, -200]
+
+
+@pytest.mark.asyncio
+async def test_replay_gives_balances_after_every_event(db_session, users, table_id):
+    usecase = ExpenseUseCase(db_session)
+    await usecase.add_expense(table_id, "Pizza", 900, [u.id for u in users])
+    await usecase.add_expense(table_id, "Bill", 900, [users[0].id], is_income=True)
+    await usecase.add_repayment(table_id, users[1].id, users[0].id, 300)
+
+    history = await usecase.ledger.replay(table_id)
+
+    assert [event.kind for event, _ in history][-3:] == ["expense_added", "expense_added", "repayment"]
+    assert history[-3][1][users[0].id] == -300
+    assert history[-1][1] == dict(zip([u.id for u in users], await _balances(usecase, table_id, users)))
+    assert len(await usecase.ledger.replay(table_id, until_event_id=history[-2][0].id)) == len(history) - 1
+
+
+@pytest.mark.asyncio
+async def test_events_cannot_be_changed(db_session, users, table_id):
+    event = (await LedgerUseCase(db_session).get_events(table_id))[0]
+
+    event.kind = "member_left"
+    with pytest.raises(ValueError):
+        await db_session.flush()
+
+
+@pytest.mark.asyncio
+async def test_user_balances_cover_every_table_in_one_query(db_session, users, table_id, monkeypatch):
+    monkeypatch.setattr(LedgerUseCase, "snapshot_every", 3)
+    usecase = ExpenseUseCase(db_session)
+    table_ids = [table_id]
+    for i in range(4):
+        other_id, _ = await TableUseCase(db_session).create_table(f"Lunch {i}", users[1].id)
+        await TableUseCase(db_session).join_table(other_id, users[0].id)
+        table_ids.append(other_id)
+    for i, tid in enumerate(table_ids):
+        for j in range(i + 1):
+            await usecase.add_expense(tid, f"Item {j}", 1000 + 10 * i, [users[0].id, users[1].id])
+            await usecase.add_expense(tid, f"Bill {j}", 1000 + 10 * i, [users[i % 2].id], is_income=True)
+    await usecase.add_repayment(table_ids[1], users[0].id, users[1].id, 150)
+    await TableUseCase(db_session).create_table("Not mine", users[2].id)
+
+    with query_budget(db_session, 1, "get_user_balances"):
+        dashboard = await LedgerUseCase(db_session).get_user_balances(users[0].id)
+
+    assert [(t.table.id, t.table.name) for t in dashboard] == [
+        (tid, name) for tid, name in zip(table_ids, ["Dinner", "Lunch 0", "Lunch 1", "Lunch 2", "Lunch 3"])
+    ]
+    for entry in dashboard:
+        amounts = await usecase.ledger.aggregate_amounts(entry.table.id)
+        assert entry.balance == balance(amounts.get(users[0].id))
+    assert [t.balance for t in dashboard][:2] == [1000 - 500, -(2 * 505 - 150)]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_appends_to_one_table_are_serialized(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'ledger.sqlite3'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with session_maker() as session:
+            user = User(telegram_id=1, first_name="Alice")
+            session.add(user)
+            await session.commit()
+            table_id, _ = await TableUseCase(session).create_table("Dinner", user.id)
+
+        async with session_maker() as first, session_maker() as second:
+            await LedgerUseCase(first).append(table_id, MEMBER_JOINED, {'user_id': 2})
+            # Второй писатель ждёт фиксации первого ещё до чтения журнала
+            pending = asyncio.create_task(LedgerUseCase(second).append(table_id, MEMBER_JOINED, {'user_id': 3}))
+            await asyncio.sleep(0.1)
+            assert not pending.done()
+
+            await first.commit()
+            await pending
+            await second.commit()
+
+        async with session_maker() as session:
+            assert await session.scalar(
+                select(func.count()).select_from(TableEvent).filter(TableEvent.table_id == table_id)
+            ) == 3
+    finally:
+        await engine.dispose()
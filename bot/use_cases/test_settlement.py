@@ -0,0 +1,128 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+
+from bot.dao.models import Transaction, User
+from bot.infrastructure.query_budget import query_budget
+from bot.use_cases.expense_use_cases import ExpenseUseCase
+from bot.use_cases.settlement_use_cases import SettlementUseCase
+from bot.use_cases.table_use_cases import TableUseCase
+
+
+@pytest_asyncio.fixture
+async def users(db_session):
+    users = [User(telegram_id=i, first_name=name) for i, name in enumerate(("Alice", "Bob", "Charlie"), 1)]
+    db_session.add_all(users)
+    await db_session.commit()
+    return users
+
+
+async def _table(session, name, members):
+    table_id, _ = await TableUseCase(session).create_table(name, members[0].id)
+    for user in members[1:]:
+        await TableUseCase(session).join_table(table_id, user.id)
+    return table_id
+
+
+async def _user_debts(session, table_id, user_id):
+    debts = await ExpenseUseCase(session).calculate_debts(table_id)
+    return [d for d in debts if user_id in d[:2]]
+
+
+@pytest_asyncio.fixture
+async def tables(db_session, users):
+    alice, bob, charlie = users
+    usecase = ExpenseUseCase(db_session)
+    # Боб должен Алисе 500 за ужин, Алиса должна Бобу 200 за такси
+    dinner = await _table(db_session, "Dinner", [alice, bob])
+    await usecase.add_expense(dinner, "Pizza", 1000, [alice.id, bob.id])
+    await usecase.add_expense(dinner, "Bill", 1000, [alice.id], is_income=True)
+    taxi = await _table(db_session, "Taxi", [alice, bob, charlie])
+    await usecase.add_expense(taxi, "Ride", 600, [u.id for u in users])
+    await usecase.add_expense(taxi, "Fare", 600, [bob.id], is_income=True)
+    return dinner, taxi
+
+
+@pytest.mark.asyncio
+async def test_debts_are_netted_across_tables(db_session, users, tables):
+    alice, bob, _ = users
+
+    plan = await SettlementUseCase(db_session).get_plan(alice.id)
+
+    assert plan.transfers == [(bob.id, alice.id, 300)]
+    assert plan.table_debts == {tables[0]: [(bob.id, alice.id, 500)], tables[1]: [(alice.id, bob.id, 200)]}
+
+
+@pytest.mark.asyncio
+async def test_settle_all_records_repayments_in_every_table(db_session, users, tables):
+    alice, bob, charlie = users
+    expected = [[tables[0], bob.id, alice.id, 500], [tables[1], alice.id, bob.id, 200]]
+
+    plan = await SettlementUseCase(db_session).settle_all(alice.id, received=True, expected_repayments=expected)
+
+    assert plan.transfers == [(bob.id, alice.id, 300)]
+    for table_id in tables:
+        assert await _user_debts(db_session, table_id, alice.id) == []
+    # Долг Чарли Бобу не переносится на Алису
+    assert await _user_debts(db_session, tables[1], charlie.id) == [(charlie.id, bob.id, 200)]
+    assert (await SettlementUseCase(db_session).get_plan(alice.id)).table_debts == {}
+
+
+@pytest.mark.asyncio
+async def test_paying_does_not_mark_incoming_debts_as_received(db_session, users, tables):
+    alice, bob, charlie = users
+    usecase = SettlementUseCase(db_session)
+    assert (await usecase.get_plan(bob.id)).transfers == [(bob.id, alice.id, 300), (charlie.id, bob.id, 200)]
+
+    paid = await usecase.settle_all(bob.id, received=False)
+
+    assert paid.transfers == [(bob.id, alice.id, 300)]
+    assert await _user_debts(db_session, tables[0], alice.id) == []
+    # Чарли ещё не перевёл Бобу: это Боб подтверждает отдельно
+    rest = await usecase.get_plan(bob.id)
+    assert rest.transfers == [(charlie.id, bob.id, 200)]
+    assert rest.table_debts == {tables[1]: [(charlie.id, bob.id, 200)]}
+
+
+@pytest.mark.asyncio
+async def test_debts_that_cancel_out_are_settled_without_transfers(db_session, users):
+    alice, bob, _ = users
+    usecase = ExpenseUseCase(db_session)
+    # Боб должен Алисе 100 в одном столе, Алиса Бобу 100 в другом
+    first = await _table(db_session, "Breakfast", [alice, bob])
+    await usecase.add_expense(first, "Coffee", 200, [alice.id, bob.id])
+    await usecase.add_expense(first, "Bill", 200, [alice.id], is_income=True)
+    second = await _table(db_session, "Lunch", [alice, bob])
+    await usecase.add_expense(second, "Soup", 200, [alice.id, bob.id])
+    await usecase.add_expense(second, "Bill", 200, [bob.id], is_income=True)
+    settlement = SettlementUseCase(db_session)
+
+    plan = await settlement.get_plan(alice.id)
+    assert plan.transfers == []
+    assert plan.offsets == [bob.id]
+    assert plan.table_debts == {first: [(bob.id, alice.id, 100)], second: [(alice.id, bob.id, 100)]}
+    assert plan.part(received=True).table_debts == {}
+
+    assert await settlement.settle_all(alice.id, received=False, expected_repayments=plan.repayments)
+
+    for table_id in (first, second):
+        assert await ExpenseUseCase(db_session).calculate_debts(table_id) == []
+    assert (await settlement.get_plan(alice.id)).table_debts == {}
+
+
+@pytest.mark.asyncio
+async def test_settle_all_refuses_a_stale_plan(db_session, users, tables):
+    alice, bob, _ = users
+    await ExpenseUseCase(db_session).add_repayment(tables[0], bob.id, alice.id, 100)
+    expected = [[tables[0], bob.id, alice.id, 500], [tables[1], alice.id, bob.id, 200]]
+
+    plan = await SettlementUseCase(db_session).settle_all(alice.id, received=True, expected_repayments=expected)
+
+    assert plan is None
+    assert await db_session.scalar(select(func.count()).select_from(Transaction)) == 1
+
+
+@pytest.mark.asyncio
+async def test_plan_is_one_query(db_session, users, tables):
+    with query_budget(db_session, 1, "get_plan"):
+        await SettlementUseCase(db_session).get_plan(users[0].id)
@@ -0,0 +1,33 @@
+import random
+
+import pytest
+
+from benchmarks.settlement_check import (
+    CaseResult, Case, check_case, check_settlement, random_balances, random_case, settlement_violations,
+)
+
+
+@pytest.mark.parametrize("imbalance", [0, 1, -7])
+def test_settlement_engines_on_random_balances(imbalance):
+    rng = random.Random(imbalance)
+    for _ in range(1_000):
+        balances = random_balances(rng, rng.randint(1, 12), imbalance)
+        result = CaseResult(Case(seed=0, members=len(balances), bills=()))
+        check_settlement(balances, result)
+        assert result.violations == [], balances
+
+
+def test_settlement_violations_detects_bad_plans():
+    balances = {1: 100, 2: -60, 3: -40}
+
+    assert settlement_violations(balances, [(2, 1, 60), (3, 1, 40)]) == []
+    assert settlement_violations(balances, [(2, 1, 60)])
+    assert settlement_violations(balances, [(1, 2, 60), (3, 1, 40)])
+    assert settlement_violations(balances, [(2, 1, 60), (3, 1, 40), (2, 3, 0)])
+
+
+@pytest.mark.asyncio
+async def test_balance_engines_match_reference(db_session):
+    for seed in range(50):
+        result = await check_case(db_session, random_case(seed, max_members=5, max_bills=6))
+        assert result.violations == [], result.case
@@ -1,9 +1,12 @@
-from typing import Optional
+from typing import Dict, Optional, Sequence, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import func, select
 
-from bot.dao.dao import UserDao
+from bot.config import settings
+from bot.dao.base import upsert
 from bot.dao.models import User
+from bot.infrastructure.lru_cache import LRUCache
+from bot.infrastructure.tracing import trace_methods
 from pydantic import BaseModel
 
 
@@ -16,6 +19,18 @@ class CreateUserInput(BaseModel):
     link_to_pay: Optional[str] = None
 
 
+# Поля, которые обновляются из Telegram при каждом обращении
+PROFILE_FIELDS = ("username", "first_name", "last_name")
+
+# telegram_id → (id пользователя, хэш профиля, записанного в базу)
+_profiles: LRUCache[Tuple[int, int]] = LRUCache("user_profiles", settings.USER_PROFILE_CACHE_SIZE)
+
+
+def _profile_hash(profile: CreateUserInput) -> int:
+    return hash(tuple(getattr(profile, field) for field in PROFILE_FIELDS))
+
+
+@trace_methods
 class UserUseCase:
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -27,24 +42,48 @@ class UserUseCase:
         first_name: Optional[str] = None,
         last_name: Optional[str] = None,
 
-    ) -> User:
-
-        filter_data = CreateUserInput(telegram_id=telegram_id)
-        user = await UserDao.find_one_or_none(self.session, filter_data)
-
-        if user:
-            return user
-
-        user_data = CreateUserInput(
+    ) -> int:
+        """Id of the user, created or with the profile refreshed from Telegram."""
+        user_ids = await self.get_or_create_users([CreateUserInput(
             telegram_id=telegram_id,
             username=username,
             first_name=first_name,
             last_name=last_name,
-        )
+        )])
+        return user_ids[telegram_id]
+
+    async def get_or_create_users(self, profiles: Sequence[CreateUserInput]) -> Dict[int, int]:
+        """
+        Upsert Telegram profiles in one statement; returns telegram_id → user id.
 
-        user = await UserDao.add(self.session, user_data)
+        Profiles whose hash matches the one last written by this process are
+        not written again, so an unchanged profile costs no query at all.
+        """
+        user_ids: Dict[int, int] = {}
+        changed: Dict[int, CreateUserInput] = {}
+        for profile in profiles:
+            cached = _profiles.get(profile.telegram_id)
+            if cached is not None and cached[1] == _profile_hash(profile):
+                user_ids[profile.telegram_id] = cached[0]
+            else:
+                # Повторы одного пользователя: побеждает последний профиль
+                changed[profile.telegram_id] = profile
+        if not changed:
+            return user_ids
+
+        stmt = upsert(self.session, User).values([profile.model_dump() for profile in changed.values()])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            set_={**{field: stmt.excluded[field] for field in PROFILE_FIELDS}, "updated_at": func.now()},
+        ).returning(User.telegram_id, User.id)
+        result = await self.session.execute(stmt)
+        written = dict(result.all())
         await self.session.commit()
-        return user
+
+        for telegram_id, user_id in written.items():
+            _profiles.put(telegram_id, (user_id, _profile_hash(changed[telegram_id])))
+        user_ids.update(written)
+        return user_ids
 
     async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
         stmt = select(User).filter_by(telegram_id=telegram_id)
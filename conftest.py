@@ -0,0 +1,164 @@
+"""
+Shared database fixtures.
+
+The schema is created once per test session on a single in-memory engine.
+Every test runs inside an outer transaction that is rolled back afterwards;
+the session under test works on a SAVEPOINT, so its own ``commit()`` and
+``rollback()`` behave as usual and nothing leaks into the next test.
+
+Large synthetic tables (benchmarks/datagen.py) are generated once into the
+pytest cache, keyed by scenario, seed and schema, and restored for each run
+with the SQLite backup API instead of being inserted again.
+"""
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+from contextlib import AsyncExitStack, asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Dict, Tuple
+
+os.environ.setdefault("BOT_TOKEN", "42:TEST")
+os.environ.setdefault("ADMIN_IDS", "[1]")
+os.environ.setdefault("BANK_TOKENS", "{}")
+os.environ.setdefault("DB_URL", "sqlite+aiosqlite:///:memory:")
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateTable
+
+from benchmarks import datagen
+from benchmarks.datagen import Dataset, Scenario
+from bot.dao.database import Base, enable_savepoints
+from bot.use_cases import invite_code_use_cases, user_use_cases
+
+
+@asynccontextmanager
+async def rollback_session(engine: AsyncEngine) -> AsyncIterator[AsyncSession]:
+    """A session whose work, committed or not, is rolled back on exit."""
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        session = AsyncSession(
+            bind=connection, expire_on_commit=False, join_transaction_mode="create_savepoint"
+        )
+        try:
+            yield session
+        finally:
+            await session.close()
+            await transaction.rollback()
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def db_engine() -> AsyncIterator[AsyncEngine]:
+    engine = enable_savepoints(create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def db_session(db_engine: AsyncEngine) -> AsyncIterator[AsyncSession]:
+    async with rollback_session(db_engine) as session:
+        yield session
+    # Process-level caches may point at rows that were just rolled back
+    invite_code_use_cases._targets.clear()
+    user_use_cases._profiles.clear()
+
+
+def _schema_fingerprint() -> str:
+    digest = hashlib.sha256(inspect.getsource(datagen).encode())
+    for table in Base.metadata.sorted_tables:
+        digest.update(str(CreateTable(table)).encode())
+    return digest.hexdigest()[:12]
+
+
+class DatasetSnapshots:
+    """
+    Prebuilt synthetic databases.
+
+    A scenario is generated at most once per schema: the template lives in
+    ``cache_dir`` across runs, and each test session restores it into
+    ``work_dir`` and opens one engine on the copy.
+    """
+
+    def __init__(self, cache_dir: Path, work_dir: Path):
+        self.cache_dir = cache_dir
+        self.work_dir = work_dir
+        self.fingerprint = _schema_fingerprint()
+        self._loaded: Dict[Tuple[Scenario, int], Tuple[AsyncEngine, Dataset]] = {}
+
+    async def load(self, scenario: Scenario, seed: int = 0) -> Tuple[AsyncEngine, Dataset]:
+        key = (scenario, seed)
+        if key not in self._loaded:
+            template, dataset = await self._template(scenario, seed)
+            target = self.work_dir / template.name
+            _restore(template, target)
+            engine = enable_savepoints(create_async_engine(f"sqlite+aiosqlite:///{target}"))
+            self._loaded[key] = (engine, dataset)
+        return self._loaded[key]
+
+    async def _template(self, scenario: Scenario, seed: int) -> Tuple[Path, Dataset]:
+        name = hashlib.sha256(f"{scenario!r}:{seed}:{self.fingerprint}".encode()).hexdigest()[:16]
+        path = self.cache_dir / f"{scenario.name}-{name}.sqlite3"
+        meta = path.with_suffix(".json")
+        if path.exists() and meta.exists():
+            saved = json.loads(meta.read_text())
+            return path, Dataset(scenario=scenario, table_id=saved["table_id"], user_ids=saved["user_ids"])
+
+        # Генерируем во временный файл: прерванная генерация не оставит битый шаблон
+        building = path.with_suffix(".building")
+        building.unlink(missing_ok=True)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{building}")
+        try:
+            dataset = await datagen.generate(engine, scenario, seed=seed)
+        finally:
+            await engine.dispose()
+        os.replace(building, path)
+        meta.write_text(json.dumps({"table_id": dataset.table_id, "user_ids": dataset.user_ids}))
+        return path, dataset
+
+    async def close(self) -> None:
+        for engine, _ in self._loaded.values():
+            await engine.dispose()
+        self._loaded.clear()
+
+
+def _restore(template: Path, target: Path) -> None:
+    source = sqlite3.connect(template)
+    destination = sqlite3.connect(target)
+    try:
+        source.backup(destination)
+    finally:
+        destination.close()
+        source.close()
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def dataset_snapshots(request: pytest.FixtureRequest,
+                            tmp_path_factory: pytest.TempPathFactory) -> AsyncIterator[DatasetSnapshots]:
+    snapshots = DatasetSnapshots(
+        cache_dir=request.config.cache.mkdir("dataset_snapshots"),
+        work_dir=tmp_path_factory.mktemp("datasets"),
+    )
+    yield snapshots
+    await snapshots.close()
+
+
+@pytest_asyncio.fixture
+async def dataset_session(dataset_snapshots: DatasetSnapshots):
+    """
+    Factory: ``session, dataset = await dataset_session(Scenario(50, 10_000))``.
+
+    Each returned session is rolled back at the end of the test.
+    """
+    async with AsyncExitStack() as stack:
+        async def load(scenario: Scenario, seed: int = 0) -> Tuple[AsyncSession, Dataset]:
+            engine, dataset = await dataset_snapshots.load(scenario, seed)
+            session = await stack.enter_async_context(rollback_session(engine))
+            return session, dataset
+
+        yield load